@@ -1,22 +1,61 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_socketio import SocketIO, emit, join_room, leave_room
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 import os
+import sys
 from dotenv import load_dotenv
-import phonenumbers
 import uuid
+from collections import namedtuple
+
+# Shared server modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import assets
+import contacts_io
+import db_profile
+import schema
+from data_versions import CONTACTS, HISTORY, VersionStore
+from history_writer import HistoryWriter, utcnow
+from identity_cache import IdentityCache
+from ice_coalescer import IceCoalescer
+from phone_normalizer import PhoneNormalizer
+from presence import PresenceRegistry, presence_room
 
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///site.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 'wal' (WAL journal, relaxed sync, bigger cache, mmap) or 'legacy' SQLite defaults
+app.config['SQLITE_PROFILE'] = os.getenv('SQLITE_PROFILE', 'wal')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_profile.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.getenv('SQLITE_POOL_SIZE', 20)),
+    busy_timeout=float(os.getenv('SQLITE_BUSY_TIMEOUT', 5)))
+# Batch trickled ICE candidates for up to this many ms (0 relays each one)
+app.config['ICE_COALESCE_MS'] = int(os.getenv('ICE_COALESCE_MS', 0))
+# Region assumed for numbers typed without a +country code, and how many
+# normalized numbers to keep memoized
+app.config['PHONE_DEFAULT_REGION'] = os.getenv('PHONE_DEFAULT_REGION', 'US')
+app.config['PHONE_CACHE_SIZE'] = int(os.getenv('PHONE_CACHE_SIZE', 65536))
+# Bulk contact uploads are refused beyond this many entries
+app.config['CONTACTS_IMPORT_MAX_ROWS'] = int(os.getenv('CONTACTS_IMPORT_MAX_ROWS', 100000))
+# Call history is written behind in batches of up to FLUSH_SIZE rows, at
+# most FLUSH_INTERVAL seconds after the signaling event
+app.config['CALL_HISTORY_FLUSH_SIZE'] = int(os.getenv('CALL_HISTORY_FLUSH_SIZE', 200))
+app.config['CALL_HISTORY_FLUSH_INTERVAL'] = float(os.getenv('CALL_HISTORY_FLUSH_INTERVAL', 0.2))
+# Logged-in users' rows are reused for this many seconds instead of being
+# loaded on every request (0 always queries)
+app.config['IDENTITY_CACHE_TTL'] = float(os.getenv('IDENTITY_CACHE_TTL', 30))
+app.config['IDENTITY_CACHE_SIZE'] = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
 db = SQLAlchemy(app)
+db_profile.install(app, db, app.config['SQLITE_PROFILE'])
 socketio = SocketIO(app, cors_allowed_origins="*")
+# Hashed, precompressed static files once build_assets.py has run
+assets.install(app)
 
 # Twilio Configuration
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
@@ -50,6 +89,9 @@ class Contact(db.Model):
     name = db.Column(db.String(100), nullable=False)
     mobile_number = db.Column(db.String(20), nullable=False)
 
+    # Dashboard lists a user's contacts by name
+    __table_args__ = (db.Index('ix_contact_user_name', 'user_id', 'name'),)
+
     def __repr__(self):
         return f"Contact('{self.name}', '{self.mobile_number}')"
 
@@ -60,28 +102,52 @@ class CallHistory(db.Model):
     call_type = db.Column(db.String(10), nullable=False) # e.g., 'outgoing', 'incoming', 'missed'
     timestamp = db.Column(db.DateTime, default=db.func.current_timestamp())
 
+    # Dashboard shows a user's latest calls
+    __table_args__ = (db.Index('ix_call_history_user_timestamp', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return f"CallHistory('{self.user_id}', '{self.contact_number}', '{self.call_type}')"
 
+# Applied once at startup, in order; append new steps, never edit old ones.
+# User.mobile_number needs no extra index: its unique constraint already has one.
+MIGRATIONS = [
+    schema.create_tables(db),
+    schema.create_indexes(Contact, CallHistory),
+]
+schema.upgrade(app, db, MIGRATIONS)
+
+identity_cache = IdentityCache(db, User, ttl=app.config['IDENTITY_CACHE_TTL'],
+                               max_entries=app.config['IDENTITY_CACHE_SIZE'])
+
+# Bumped after every commit that changes a user's contacts or call history,
+# so an unchanged dashboard is answered with 304 without querying either
+data_versions = VersionStore()
+
+def write_call_history(rows):
+    with app.app_context():
+        db.session.execute(db.insert(CallHistory), rows)
+        db.session.commit()
+        data_versions.bump_many((row['user_id'] for row in rows), HISTORY)
+
+history_writer = HistoryWriter(write_call_history, socketio.start_background_task, socketio.sleep,
+                               flush_size=app.config['CALL_HISTORY_FLUSH_SIZE'],
+                               flush_interval=app.config['CALL_HISTORY_FLUSH_INTERVAL'])
+
+def log_call(user_id, contact_number, call_type):
+    # Queued so signaling replies never wait on a commit
+    history_writer.add(user_id=user_id, contact_number=contact_number, call_type=call_type, timestamp=utcnow())
+
 # Helper function to format phone numbers
+phone_normalizer = PhoneNormalizer(app.config['PHONE_DEFAULT_REGION'], app.config['PHONE_CACHE_SIZE'])
+
 def format_phone_number(number):
-    try:
-        parsed_number = phonenumbers.parse(number, "US") # Assume US for now, could be dynamic
-        if not phonenumbers.is_valid_number(parsed_number):
-            return None
-        return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
-    except phonenumbers.NumberParseException:
-        return None
+    return phone_normalizer.normalize(number)
 
 # Routes
-@app.before_request
-def create_tables():
-    db.create_all()
-
 @app.route('/')
 def index():
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
+        user = identity_cache.get(session['user_id'])
         if user and user.is_verified:
             return redirect(url_for('dashboard'))
         elif user and not user.is_verified:
@@ -191,7 +257,7 @@ def verify_otp():
 
     user_id = session['user_id']
     mobile_number = session['temp_mobile_number']
-    user = User.query.get(user_id)
+    user = identity_cache.get(user_id)
 
     if not user or user.mobile_number != mobile_number:
         flash('User or mobile number mismatch.', 'danger')
@@ -232,7 +298,7 @@ def resend_otp():
 
     mobile_number = session['temp_mobile_number']
     user_id = session['user_id']
-    user = User.query.get(user_id)
+    user = identity_cache.get(user_id)
 
     if not user or user.mobile_number != mobile_number or user.is_verified:
         return jsonify({'success': False, 'message': 'Invalid request or already verified.'}), 400
@@ -251,15 +317,24 @@ def dashboard():
         flash('Please log in to access the dashboard.', 'warning')
         return redirect(url_for('login'))
 
-    user = User.query.get(session['user_id'])
+    user = identity_cache.get(session['user_id'])
     if not user or not user.is_verified:
         flash('Please verify your mobile number.', 'warning')
         return redirect(url_for('verify_otp'))
 
-    contacts = Contact.query.filter_by(user_id=user.id).order_by(Contact.name).all()
-    call_history = CallHistory.query.filter_by(user_id=user.id).order_by(CallHistory.timestamp.desc()).limit(10).all()
-
-    return render_template('dashboard.html', user=user, contacts=contacts, call_history=call_history)
+    # A page carrying flashed messages is a one-off; never let it be revalidated
+    etag = None if session.get('_flashes') else data_versions.etag(user.id, CONTACTS, HISTORY)
+    if etag is not None and etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        contacts = Contact.query.filter_by(user_id=user.id).order_by(Contact.name).all()
+        call_history = CallHistory.query.filter_by(user_id=user.id).order_by(CallHistory.timestamp.desc()).limit(10).all()
+        response = app.response_class(render_template('dashboard.html', user=user, contacts=contacts,
+                                                      call_history=call_history))
+    if etag is not None:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/add_contact', methods=['POST'])
 def add_contact():
@@ -288,9 +363,68 @@ def add_contact():
     new_contact = Contact(user_id=user_id, name=name, mobile_number=formatted_number)
     db.session.add(new_contact)
     db.session.commit()
+    data_versions.bump(user_id, CONTACTS)
+    subscribe_presence(user_id, [formatted_number])
     flash('Contact added successfully!', 'success')
     return redirect(url_for('dashboard'))
 
+@app.route('/import_contacts', methods=['POST'])
+def import_contacts():
+    if 'user_id' not in session:
+        flash('Please log in to add contacts.', 'danger')
+        return redirect(url_for('login'))
+
+    upload = request.files.get('contacts_file')
+    if upload is None or not upload.filename:
+        flash('Choose a CSV or vCard file to import.', 'danger')
+        return redirect(url_for('dashboard'))
+
+    user_id = session['user_id']
+    # One query for the numbers the user already has, instead of one per contact
+    existing = {m for (m,) in db.session.query(Contact.mobile_number).filter_by(user_id=user_id)}
+
+    added = []
+
+    def insert(rows):
+        db.session.execute(db.insert(Contact), [{'user_id': user_id, 'name': name, 'mobile_number': number}
+                                                for name, number in rows])
+        added.extend(number for _, number in rows)
+
+    try:
+        result = contacts_io.import_contacts(
+            contacts_io.read_contacts(contacts_io.text_stream(upload.stream),
+                                      contacts_io.detect_kind(upload.filename, upload.mimetype)),
+            phone_normalizer.normalize_many,
+            existing, insert, max_rows=app.config['CONTACTS_IMPORT_MAX_ROWS'])
+    except contacts_io.ContactImportError as e:
+        db.session.rollback()
+        flash(str(e), 'danger')
+        return redirect(url_for('dashboard'))
+    db.session.commit()
+    if added:
+        data_versions.bump(user_id, CONTACTS)
+    subscribe_presence(user_id, added)
+    flash(f"Imported {result['imported']} contacts ({result['duplicates']} duplicates, "
+          f"{result['invalid']} invalid numbers skipped).", 'success')
+    return redirect(url_for('dashboard'))
+
+@app.route('/export_contacts')
+def export_contacts():
+    if 'user_id' not in session:
+        flash('Please log in to export contacts.', 'danger')
+        return redirect(url_for('login'))
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in contacts_io.EXPORT_FORMATS:
+        flash('Export format must be csv or vcf.', 'danger')
+        return redirect(url_for('dashboard'))
+    mimetype, extension = contacts_io.EXPORT_FORMATS[fmt]
+    rows = db.session.query(Contact.name, Contact.mobile_number).filter_by(user_id=session['user_id']) \
+        .order_by(Contact.name).execution_options(yield_per=1000)
+    return app.response_class(stream_with_context(contacts_io.export_contacts(rows, fmt, 'mobile_number')),
+                              mimetype=mimetype,
+                              headers={'Content-Disposition': f'attachment; filename=contacts.{extension}'})
+
 @app.route('/delete_contact/<int:contact_id>', methods=['POST'])
 def delete_contact(contact_id):
     if 'user_id' not in session:
@@ -303,8 +437,13 @@ def delete_contact(contact_id):
         flash('Contact not found or you do not have permission to delete it.', 'danger')
         return redirect(url_for('dashboard'))
 
+    user_id, number = contact.user_id, contact.mobile_number
     db.session.delete(contact)
     db.session.commit()
+    data_versions.bump(user_id, CONTACTS)
+    # Stay subscribed if the same number is saved under another name
+    if not Contact.query.filter_by(user_id=user_id, mobile_number=number).first():
+        subscribe_presence(user_id, [number], subscribe=False)
     flash('Contact deleted successfully.', 'success')
     return redirect(url_for('dashboard'))
 
@@ -317,18 +456,44 @@ def logout():
 
 
 # WebRTC signaling and SocketIO events
-active_users = {}
+active_users = PresenceRegistry()
+# Who is behind each socket, looked up once at connect so signaling
+# handlers don't load the user again for every event
+SocketIdentity = namedtuple('SocketIdentity', 'id mobile_number')
+socket_identities = {}
+
+# Presence is published per number: each socket joins presence_room(n) for
+# every contact n of its user, and a status change is emitted to that one
+# room instead of broadcast to every connected client.
+def contact_numbers(user_id):
+    return [number for (number,) in db.session.query(Contact.mobile_number).filter_by(user_id=user_id)]
+
+def subscribe_presence(user_id, numbers, subscribe=True):
+    """Join (or leave) presence rooms on the sockets the user already has open."""
+    user = identity_cache.get(user_id)
+    if user is None or not numbers:
+        return
+    change = socketio.server.enter_room if subscribe else socketio.server.leave_room
+    for sid in active_users.sids(user.mobile_number):
+        for number in numbers:
+            change(sid, presence_room(number), namespace='/')
 
 @socketio.on('connect')
 def handle_connect():
     if 'user_id' in session:
-        user = User.query.get(session['user_id'])
+        user = identity_cache.get(session['user_id'])
         if user and user.is_verified:
-            active_users[user.mobile_number] = request.sid
-            print(f"User {user.mobile_number} connected with SID {request.sid}")
-            emit('user_status', {'mobile_number': user.mobile_number, 'status': 'online'}, broadcast=True)
-            # send existing active users to the newly connected user
-            online_users = [{'mobile_number': num, 'status': 'online'} for num in active_users.keys()]
+            socket_identities[request.sid] = SocketIdentity(user.id, user.mobile_number)
+            numbers = contact_numbers(user.id)
+            for number in numbers:
+                join_room(presence_room(number))
+            came_online = active_users.add(user.mobile_number, request.sid)
+            print(f"User {user.mobile_number} connected with SID {request.sid} ({len(active_users)} online)")
+            if came_online:
+                emit('user_status', {'mobile_number': user.mobile_number, 'status': 'online'},
+                     to=presence_room(user.mobile_number))
+            # send the newly connected user which of their contacts are online
+            online_users = [{'mobile_number': num, 'status': 'online'} for num in numbers if num in active_users]
             emit('online_users_list', online_users)
         else:
             # If user is not logged in or not verified, disconnect them
@@ -342,22 +507,20 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    user_mobile_number = None
-    for num, sid in active_users.items():
-        if sid == request.sid:
-            user_mobile_number = num
-            break
+    socket_identities.pop(request.sid, None)
+    user_mobile_number = active_users.remove_sid(request.sid)
 
     if user_mobile_number:
-        del active_users[user_mobile_number]
-        print(f"User {user_mobile_number} disconnected from SID {request.sid}")
-        emit('user_status', {'mobile_number': user_mobile_number, 'status': 'offline'}, broadcast=True)
+        print(f"User {user_mobile_number} disconnected from SID {request.sid} ({len(active_users)} online)")
+        # Only announce offline once the user's last device is gone
+        if user_mobile_number not in active_users:
+            emit('user_status', {'mobile_number': user_mobile_number, 'status': 'offline'},
+                 to=presence_room(user_mobile_number))
 
 @socketio.on('call_user')
 def call_user(data):
-    caller_id = session.get('user_id')
-    caller = User.query.get(caller_id)
-    if not caller or not caller.is_verified:
+    caller = socket_identities.get(request.sid)
+    if caller is None:
         emit('call_failed', {'message': 'Unauthorized to make calls.'}, room=request.sid)
         return
 
@@ -373,9 +536,7 @@ def call_user(data):
     if target_sid:
         print(f"Calling {target_number} from {caller.mobile_number}")
         # Add to call history for caller
-        call_record = CallHistory(user_id=caller.id, contact_number=target_number, call_type='outgoing')
-        db.session.add(call_record)
-        db.session.commit()
+        log_call(caller.id, target_number, 'outgoing')
         emit('incoming_call', {'caller_number': caller.mobile_number, 'offer': offer}, room=target_sid)
         emit('call_initiated', {'target_number': target_number, 'message': 'Calling...'}, room=request.sid)
     else:
@@ -383,17 +544,14 @@ def call_user(data):
         # Log missed call for the target if they exist in the DB
         target_user_obj = User.query.filter_by(mobile_number=target_number).first()
         if target_user_obj:
-            missed_call = CallHistory(user_id=target_user_obj.id, contact_number=caller.mobile_number, call_type='missed')
-            db.session.add(missed_call)
-            db.session.commit()
+            log_call(target_user_obj.id, caller.mobile_number, 'missed')
 
         emit('call_failed', {'message': f'User {target_number} is offline or not found.'}, room=request.sid)
 
 @socketio.on('answer_call')
 def answer_call(data):
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
-    if not current_user or not current_user.is_verified:
+    current_user = socket_identities.get(request.sid)
+    if current_user is None:
         emit('call_failed', {'message': 'Unauthorized to answer calls.'}, room=request.sid)
         return
 
@@ -405,18 +563,15 @@ def answer_call(data):
     if caller_sid:
         print(f"User {current_user.mobile_number} answering call from {caller_number}")
         # Add to call history for current user (receiver)
-        call_record = CallHistory(user_id=current_user.id, contact_number=caller_number, call_type='incoming')
-        db.session.add(call_record)
-        db.session.commit()
+        log_call(current_user.id, caller_number, 'incoming')
         emit('call_accepted', {'answer': answer, 'answerer_number': current_user.mobile_number}, room=caller_sid)
     else:
         emit('call_failed', {'message': 'Caller disconnected.'}, room=request.sid)
 
 @socketio.on('reject_call')
 def reject_call(data):
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
-    if not current_user or not current_user.is_verified:
+    current_user = socket_identities.get(request.sid)
+    if current_user is None:
         emit('call_failed', {'message': 'Unauthorized action.'}, room=request.sid)
         return
 
@@ -430,10 +585,18 @@ def reject_call(data):
         # Log missed call for the caller
         caller_user_obj = User.query.filter_by(mobile_number=caller_number).first()
         if caller_user_obj:
-            missed_call = CallHistory(user_id=caller_user_obj.id, contact_number=current_user.mobile_number, call_type='missed')
-            db.session.add(missed_call)
-            db.session.commit()
+            log_call(caller_user_obj.id, current_user.mobile_number, 'missed')
+
+
+def flush_ice_candidates(sender_number, target_number, candidates):
+    target_sid = active_users.get(target_number)
+    if target_sid:
+        socketio.emit('ice_candidates', {'candidates': candidates, 'sender_number': sender_number}, to=target_sid)
 
+ice_coalescer = None
+if app.config['ICE_COALESCE_MS'] > 0:
+    ice_coalescer = IceCoalescer(app.config['ICE_COALESCE_MS'] / 1000.0, flush_ice_candidates,
+                                 socketio.start_background_task, socketio.sleep)
 
 @socketio.on('ice_candidate')
 def ice_candidate(data):
@@ -441,15 +604,19 @@ def ice_candidate(data):
     candidate = data.get('candidate')
     sender_number = data.get('sender_number') # The number of the user sending the ICE candidate
 
+    if ice_coalescer is not None:
+        # A null candidate is the browser's end-of-candidates marker
+        ice_coalescer.add(sender_number, target_number, candidate)
+        return
+
     target_sid = active_users.get(target_number)
-    if target_sid:
+    if target_sid and candidate:
         emit('ice_candidate', {'candidate': candidate, 'sender_number': sender_number}, room=target_sid)
 
 @socketio.on('end_call')
 def end_call(data):
-    current_user_id = session.get('user_id')
-    current_user = User.query.get(current_user_id)
-    if not current_user or not current_user.is_verified:
+    current_user = socket_identities.get(request.sid)
+    if current_user is None:
         emit('call_failed', {'message': 'Unauthorized action.'}, room=request.sid)
         return
 
@@ -472,6 +639,4 @@ if __name__ == '__main__':
     # For development, you can use app.run(), but socketio.run() is preferred for SocketIO apps.
     # socketio.run(app, debug=True, allow_unsafe_werkzeug=True)
     # For production, use a WSGI server like Gunicorn + Eventlet/Gevent.
-    with app.app_context():
-        db.create_all()
     socketio.run(app, debug=True, port=5000)
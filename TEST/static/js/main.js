@@ -99,14 +99,14 @@ document.addEventListener('DOMContentLoaded', () => {
         };
 
         peerConnection.onicecandidate = (event) => {
-            if (event.candidate) {
-                console.log('Sending ICE candidate:', event.candidate);
-                socket.emit('ice_candidate', {
-                    target_number: currentCallTargetNumber, // Send to the person we are calling or who called us
-                    candidate: event.candidate,
-                    sender_number: '{{ user.mobile_number }}'
-                });
-            }
+            // A null candidate means gathering is done; it is still sent so the
+            // server can flush any candidates it is batching for the peer
+            console.log('Sending ICE candidate:', event.candidate);
+            socket.emit('ice_candidate', {
+                target_number: currentCallTargetNumber, // Send to the person we are calling or who called us
+                candidate: event.candidate,
+                sender_number: '{{ user.mobile_number }}'
+            });
         };
 
         peerConnection.oniceconnectionstatechange = (event) => {
@@ -345,14 +345,26 @@ document.addEventListener('DOMContentLoaded', () => {
         endCall();
     });
 
-    socket.on('ice_candidate', async (data) => {
-        console.log('Received ICE candidate from:', data.sender_number, data.candidate);
+    async function addIceCandidate(candidate) {
         try {
-            if (peerConnection && data.candidate) {
-                await peerConnection.addIceCandidate(new RTCIceCandidate(data.candidate));
+            if (peerConnection && candidate) {
+                await peerConnection.addIceCandidate(new RTCIceCandidate(candidate));
             }
         } catch (error) {
             console.error('Error adding received ICE candidate:', error);
         }
+    }
+
+    socket.on('ice_candidate', async (data) => {
+        console.log('Received ICE candidate from:', data.sender_number, data.candidate);
+        await addIceCandidate(data.candidate);
+    });
+
+    // Batched form, sent when the server coalesces trickled candidates
+    socket.on('ice_candidates', async (data) => {
+        console.log(`Received ${data.candidates.length} ICE candidates from:`, data.sender_number);
+        for (const candidate of data.candidates) {
+            await addIceCandidate(candidate);
+        }
     });
 });
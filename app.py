@@ -1,34 +1,161 @@
+# Patch the standard library before anything else imports it, so sockets,
+# locks and sleeps cooperate with the gevent loop Socket.IO runs on
+from gevent import monkey
+monkey.patch_all()
+
 import os
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+import json
+import time
+from flask import Flask, render_template, request, jsonify, redirect, url_for, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin, login_user, LoginManager, login_required, logout_user, current_user
+from flask_bcrypt import Bcrypt
 
 from flask_socketio import SocketIO, join_room, leave_room, emit
 from flask_cors import CORS
-from openai import OpenAI
+from werkzeug.exceptions import BadRequest
+
+import assets
+import contacts_io
+import db_profile
+import schema
+from cache import create_cache, symptom_cache_key
+from call_sessions import create_call_sessions
+from data_versions import CONTACTS, HISTORY, create_version_store
+from hashing import HasherBusy, PasswordHasher
+from history_writer import HistoryWriter, utcnow
+from identity_cache import IdentityCache
+from ice_coalescer import IceCoalescer
+from llm_client import LLMClient, LLMError, LLMTimeout
+from metrics import Registry, timed
+from presence import create_presence_registry
+from symptom_model import MODEL_PATH, ProfileError, load_classifier
 
 app = Flask(__name__)
 
 # Configurations
 app.config['SECRET_KEY'] = 'a_very_secret_key_that_should_be_changed'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 'wal' (WAL journal, relaxed sync, bigger cache, mmap) or 'legacy' SQLite defaults
+app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE') or 'wal'
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_profile.engine_options(
+    app.config['SQLALCHEMY_DATABASE_URI'],
+    pool_size=int(os.environ.get('SQLITE_POOL_SIZE', 20)),
+    busy_timeout=float(os.environ.get('SQLITE_BUSY_TIMEOUT', 5)))
+# Set to a redis:// URL to run several workers/nodes: Socket.IO emits are
+# relayed through it and presence is shared (PRESENCE_URL overrides the latter)
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+app.config['PRESENCE_URL'] = os.environ.get('PRESENCE_URL') or app.config['SOCKETIO_MESSAGE_QUEUE']
+# Per-user change counters behind the /api/bootstrap ETags; they must be
+# shared (redis://) as soon as more than one worker serves requests
+app.config['DATA_VERSIONS_URL'] = os.environ.get('DATA_VERSIONS_URL') or app.config['SOCKETIO_MESSAGE_QUEUE']
+# Batch trickled ICE candidates for up to this many ms (0 relays each one)
+app.config['ICE_COALESCE_MS'] = int(os.environ.get('ICE_COALESCE_MS', 0))
+# Bulk contact uploads are refused beyond this many entries
+app.config['CONTACTS_IMPORT_MAX_ROWS'] = int(os.environ.get('CONTACTS_IMPORT_MAX_ROWS', 100000))
+# GET /api/call-history page size: ?limit= defaults to and is capped at these
+app.config['CALL_HISTORY_PAGE_SIZE'] = int(os.environ.get('CALL_HISTORY_PAGE_SIZE', 50))
+app.config['CALL_HISTORY_MAX_PAGE_SIZE'] = int(os.environ.get('CALL_HISTORY_MAX_PAGE_SIZE', 500))
+# Call history is written behind in batches of up to FLUSH_SIZE rows, at
+# most FLUSH_INTERVAL seconds after it was logged
+app.config['CALL_HISTORY_FLUSH_SIZE'] = int(os.environ.get('CALL_HISTORY_FLUSH_SIZE', 200))
+app.config['CALL_HISTORY_FLUSH_INTERVAL'] = float(os.environ.get('CALL_HISTORY_FLUSH_INTERVAL', 0.2))
+# Unanswered calls end after CALL_RING_TIMEOUT seconds; connected calls are
+# closed after CALL_MAX_DURATION in case both hang-ups were lost. At most
+# CALL_MAX_SESSIONS calls per worker are tracked for history.
+app.config['CALL_RING_TIMEOUT'] = float(os.environ.get('CALL_RING_TIMEOUT', 45))
+app.config['CALL_MAX_DURATION'] = float(os.environ.get('CALL_MAX_DURATION', 4 * 3600))
+app.config['CALL_MAX_SESSIONS'] = int(os.environ.get('CALL_MAX_SESSIONS', 100000))
+# Call sessions must be shared (redis://) once answers and hang-ups can
+# reach a different worker than the offer did
+app.config['CALL_SESSIONS_URL'] = os.environ.get('CALL_SESSIONS_URL') or app.config['SOCKETIO_MESSAGE_QUEUE']
+# Symptom checker: the in-process classifier answers structured profiles,
+# the LLM is only used for free-text symptoms
+app.config['SYMPTOM_MODEL_PATH'] = os.environ.get('SYMPTOM_MODEL_PATH') or MODEL_PATH
+# Answer profiles from the artifact's precomputed prediction index ('index')
+# or always score them with the model ('model')
+app.config['SYMPTOM_CLASSIFIER_MODE'] = os.environ.get('SYMPTOM_CLASSIFIER_MODE') or 'index'
+app.config['SYMPTOM_BATCH_MAX_ROWS'] = int(os.environ.get('SYMPTOM_BATCH_MAX_ROWS', 10000))
+app.config['SYMPTOM_LLM_FALLBACK'] = os.environ.get('SYMPTOM_LLM_FALLBACK', '1') == '1'
+# LLM answers are cached by normalized symptom text: 'memory', 'sqlite' or 'none'
+app.config['SYMPTOM_CACHE_BACKEND'] = os.environ.get('SYMPTOM_CACHE_BACKEND') or 'memory'
+app.config['SYMPTOM_CACHE_PATH'] = os.environ.get('SYMPTOM_CACHE_PATH') or os.path.join(app.instance_path, 'symptom_cache.db')
+app.config['SYMPTOM_CACHE_MAX_ENTRIES'] = int(os.environ.get('SYMPTOM_CACHE_MAX_ENTRIES', 1024))
+app.config['SYMPTOM_CACHE_TTL'] = int(os.environ.get('SYMPTOM_CACHE_TTL', 6 * 3600))
+app.config['OPENROUTER_BASE_URL'] = os.environ.get('OPENROUTER_BASE_URL') or 'https://openrouter.ai/api/v1'
+# No default: free-text checks stay off until a key is configured
+app.config['OPENROUTER_API_KEY'] = os.environ.get('OPENROUTER_API_KEY') or None
+app.config['SYMPTOM_LLM_MODEL'] = os.environ.get('SYMPTOM_LLM_MODEL') or 'openai/gpt-oss-120b:free'
+app.config['SYMPTOM_LLM_MAX_CONCURRENCY'] = int(os.environ.get('SYMPTOM_LLM_MAX_CONCURRENCY', 8))
+app.config['SYMPTOM_LLM_TIMEOUT'] = float(os.environ.get('SYMPTOM_LLM_TIMEOUT', 30))
+# bcrypt cost for new password hashes; older hashes are upgraded at login.
+# Hashing runs on PASSWORD_HASH_WORKERS native threads (0 = inline), with
+# at most PASSWORD_HASH_QUEUE logins waiting before answering 503
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+# Logged-in users' rows are reused for this many seconds instead of being
+# loaded on every request (0 always queries)
+app.config['IDENTITY_CACHE_TTL'] = float(os.environ.get('IDENTITY_CACHE_TTL', 30))
+app.config['IDENTITY_CACHE_SIZE'] = int(os.environ.get('IDENTITY_CACHE_SIZE', 10000))
+# Handler latency histograms and counters, served at /metrics
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
 
 # Initialize extensions
 db = SQLAlchemy(app)
+db_profile.install(app, db, app.config['SQLITE_PROFILE'])
 bcrypt = Bcrypt(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent')
+password_hasher = PasswordHasher(bcrypt, app.config['BCRYPT_LOG_ROUNDS'],
+                                 max_workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_queue=app.config['PASSWORD_HASH_QUEUE'])
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='gevent',
+                    message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
 CORS(app)
+# Hashed, precompressed static files once build_assets.py has run
+assets.install(app)
 
 # Configure Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Load the prebuilt symptom classifier once per worker (see build_model.py)
+try:
+    symptom_classifier = load_classifier(app.config['SYMPTOM_MODEL_PATH'],
+                                         use_index=app.config['SYMPTOM_CLASSIFIER_MODE'] == 'index')
+except (ImportError, OSError, ValueError) as e:
+    print(f'Symptom classifier unavailable, using LLM only: {e}')
+    symptom_classifier = None
+
+# One pooled LLM client per worker, shared by all requests
+if app.config['OPENROUTER_API_KEY']:
+    llm_client = LLMClient(app.config['OPENROUTER_BASE_URL'], app.config['OPENROUTER_API_KEY'],
+                           app.config['SYMPTOM_LLM_MODEL'],
+                           max_concurrency=app.config['SYMPTOM_LLM_MAX_CONCURRENCY'],
+                           timeout=app.config['SYMPTOM_LLM_TIMEOUT'])
+else:
+    print('OPENROUTER_API_KEY is not set, free-text symptom checking is disabled')
+    llm_client = None
+
+symptom_cache = create_cache(app.config['SYMPTOM_CACHE_BACKEND'], app.config['SYMPTOM_CACHE_PATH'],
+                             app.config['SYMPTOM_CACHE_MAX_ENTRIES'], app.config['SYMPTOM_CACHE_TTL'])
+
+metrics_registry = Registry()
+# Looked up on each scrape; there is no client without an API key
+metrics_registry.stats('symptom_llm', 'LLM client', lambda: llm_client.stats() if llm_client is not None else {})
+metrics_registry.stats('password_hasher', 'Password hashing pool', password_hasher.stats)
+metrics_registry.stats('symptom_cache', 'Symptom result cache',
+                       lambda: symptom_cache.stats() if symptom_cache is not None else {})
+symptom_first_token_seconds = metrics_registry.histogram(
+    'symptom_stream_first_token_seconds', 'Streamed symptom check: request received to first text sent')
+symptom_streams = metrics_registry.counter(
+    'symptom_streams_total', 'Streamed symptom checks by outcome', ('outcome',))
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.get(user_id)
 
 # Database Models
 
@@ -46,6 +173,8 @@ class Contact(db.Model):
     mobile = db.Column(db.String(20), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_contact_user_name', 'user_id', 'name'),)
+
 
 class CallHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -57,6 +186,54 @@ class CallHistory(db.Model):
     status = db.Column(db.String(20), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # Serves the per-user, newest-first keyset pages of GET /api/call-history
+    __table_args__ = (db.Index('ix_call_history_user_timestamp', 'user_id', 'timestamp', 'id'),)
+
+
+# Applied once at startup, in order; append new steps, never edit old ones.
+# User.mobile needs no extra index: its unique constraint already has one.
+MIGRATIONS = [
+    schema.create_tables(db),
+    schema.create_indexes(CallHistory, Contact),
+]
+schema.upgrade(app, db, MIGRATIONS)
+
+identity_cache = IdentityCache(db, User, ttl=app.config['IDENTITY_CACHE_TTL'],
+                               max_entries=app.config['IDENTITY_CACHE_SIZE'])
+metrics_registry.stats('identity_cache', 'Logged-in user cache', identity_cache.stats)
+
+# Bumped after every commit that changes a user's contacts or call history
+data_versions = create_version_store(app.config['DATA_VERSIONS_URL'])
+metrics_registry.stats('data_versions', 'Per-user data versions', data_versions.stats)
+
+
+def write_call_history(rows):
+    with app.app_context():
+        # Rows from call sessions name their owner by number; resolve the
+        # whole batch in one query and drop numbers without an account
+        mobiles = {row['user_mobile'] for row in rows if 'user_mobile' in row}
+        if mobiles:
+            user_ids = dict(db.session.query(User.mobile, User.id).filter(User.mobile.in_(mobiles)))
+            resolved = []
+            for row in rows:
+                if 'user_mobile' in row:
+                    if row['user_mobile'] not in user_ids:
+                        continue
+                    row = dict(row, user_id=user_ids[row['user_mobile']])
+                    del row['user_mobile']
+                resolved.append(row)
+            rows = resolved
+        if rows:
+            db.session.execute(db.insert(CallHistory), rows)
+            db.session.commit()
+            data_versions.bump_many((row['user_id'] for row in rows), HISTORY)
+
+
+history_writer = HistoryWriter(write_call_history, socketio.start_background_task, socketio.sleep,
+                               flush_size=app.config['CALL_HISTORY_FLUSH_SIZE'],
+                               flush_interval=app.config['CALL_HISTORY_FLUSH_INTERVAL'])
+metrics_registry.stats('call_history_writer', 'Call history write-behind queue', history_writer.stats)
+
 
 # --- Routes ---
 
@@ -74,9 +251,18 @@ def login():
         mobile = data.get('mobile')
         password = data.get('password')
         user = User.query.filter_by(mobile=mobile).first()
-        if user and bcrypt.check_password_hash(user.password, password):
-            login_user(user)
-            return jsonify({'success': True, 'message': 'Login successful!'})
+        if user and password:
+            try:
+                matches, new_hash = password_hasher.verify_and_update(password, user.password)
+            except HasherBusy as e:
+                return jsonify({'success': False, 'message': str(e)}), 503
+            if matches:
+                if new_hash:
+                    # BCRYPT_LOG_ROUNDS changed since this hash was made
+                    user.password = new_hash
+                    db.session.commit()
+                login_user(user)
+                return jsonify({'success': True, 'message': 'Login successful!'})
         return jsonify({'success': False, 'message': 'Invalid mobile number or password.'}), 401
     return render_template('login.html')
 
@@ -93,7 +279,12 @@ def signup():
         if User.query.filter_by(mobile=mobile).first():
             return jsonify({'success': False, 'message': 'Mobile number already registered.'}), 409
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        if not password:
+            return jsonify({'success': False, 'message': 'Password is required.'}), 400
+        try:
+            hashed_password = password_hasher.hash(password)
+        except HasherBusy as e:
+            return jsonify({'success': False, 'message': str(e)}), 503
         new_user = User(name=name, mobile=mobile, password=hashed_password, account_type=account_type)
         db.session.add(new_user)
         db.session.commit()
@@ -129,12 +320,57 @@ def manage_contacts():
                               user_id=current_user.id)
         db.session.add(new_contact)
         db.session.commit()
+        data_versions.bump(current_user.id, CONTACTS)
         return jsonify({'success': True, 'message': 'Contact added.', 'contact': {'id': new_contact.id, 'name': name, 'mobile': mobile}}), 201
 
-    contacts = Contact.query.filter_by(user_id=current_user.id).all()
+    contacts = Contact.query.filter_by(user_id=current_user.id).order_by(Contact.name).all()
     return jsonify([{'id': c.id, 'name': c.name, 'mobile': c.mobile} for c in contacts])
 
 
+@app.route('/api/contacts/import', methods=['POST'])
+@login_required
+def import_contacts():
+    """Bulk-add contacts from a CSV or vCard upload (multipart `file` or raw body)."""
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, kind = upload.stream, contacts_io.detect_kind(upload.filename, upload.mimetype)
+    else:
+        stream, kind = request.stream, contacts_io.detect_kind(mimetype=request.mimetype)
+    user_id = current_user.id
+    # Numbers are stored as typed, so compare on their cleaned form
+    existing = {contacts_io.clean_number(m) for (m,) in db.session.query(Contact.mobile).filter_by(user_id=user_id)}
+
+    def insert(rows):
+        db.session.execute(db.insert(Contact), [{'name': name, 'mobile': mobile, 'user_id': user_id}
+                                                for name, mobile in rows])
+
+    try:
+        result = contacts_io.import_contacts(
+            contacts_io.read_contacts(contacts_io.text_stream(stream), kind),
+            lambda numbers: [contacts_io.clean_number(n) for n in numbers],
+            existing, insert, max_rows=app.config['CONTACTS_IMPORT_MAX_ROWS'])
+    except contacts_io.ContactImportError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), e.status
+    db.session.commit()
+    if result['imported']:
+        data_versions.bump(user_id, CONTACTS)
+    return jsonify({'success': True, 'message': f"Imported {result['imported']} contacts.", **result})
+
+
+@app.route('/api/contacts/export')
+@login_required
+def export_contacts():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in contacts_io.EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or vcf.'}), 400
+    mimetype, extension = contacts_io.EXPORT_FORMATS[fmt]
+    rows = db.session.query(Contact.name, Contact.mobile).filter_by(user_id=current_user.id) \
+        .order_by(Contact.name).execution_options(yield_per=1000)
+    return app.response_class(stream_with_context(contacts_io.export_contacts(rows, fmt)), mimetype=mimetype,
+                              headers={'Content-Disposition': f'attachment; filename=contacts.{extension}'})
+
+
 @app.route('/api/contacts/<int:contact_id>', methods=['DELETE'])
 @login_required
 def delete_contact(contact_id):
@@ -143,6 +379,7 @@ def delete_contact(contact_id):
     if contact:
         db.session.delete(contact)
         db.session.commit()
+        data_versions.bump(current_user.id, CONTACTS)
         return jsonify({'success': True, 'message': 'Contact deleted.'})
     return jsonify({'success': False, 'message': 'Contact not found.'}), 404
 
@@ -151,137 +388,479 @@ def delete_contact(contact_id):
 @login_required
 def call_history():
     if request.method == 'POST':
-        data = request.get_json()
-        new_log = CallHistory(
-            caller_mobile=data['caller_mobile'],
-            receiver_mobile=data['receiver_mobile'],
-            duration=data['duration'],
-            status=data['status'],
-            user_id=current_user.id
-        )
-        db.session.add(new_log)
-        db.session.commit()
-        return jsonify({'success': True, 'message': 'Call history logged.'}), 201
-
-    history = CallHistory.query.filter_by(user_id=current_user.id).order_by(
-        CallHistory.timestamp.desc()).all()
-    return jsonify([{
+        data = request.get_json(silent=True) or {}
+        fields = ('caller_mobile', 'receiver_mobile', 'status')
+        if not isinstance(data, dict) or not all(data.get(k) for k in fields):
+            return jsonify({'success': False, 'message': 'caller_mobile, receiver_mobile and status are required.'}), 400
+        # Checked here because a queued row that fails to insert can no longer
+        # be reported to the client; the columns are String(20)
+        if not all(isinstance(data[k], str) and len(data[k]) <= 20 for k in fields):
+            return jsonify({'success': False, 'message': 'caller_mobile, receiver_mobile and status must be strings of at most 20 characters.'}), 400
+        duration = data.get('duration') or 0
+        try:
+            duration = -1 if isinstance(duration, bool) else int(duration)
+        except (TypeError, ValueError, OverflowError):
+            duration = -1
+        if duration < 0:
+            return jsonify({'success': False, 'message': 'duration must be a non-negative integer.'}), 400
+        # Queued, not committed: it shows up in GET within CALL_HISTORY_FLUSH_INTERVAL
+        if not history_writer.add(caller_mobile=data['caller_mobile'], receiver_mobile=data['receiver_mobile'],
+                                  duration=duration, status=data['status'],
+                                  user_id=current_user.id, timestamp=utcnow()):
+            return jsonify({'success': False, 'message': 'Call history is backlogged, try again.'}), 503
+        return jsonify({'success': True, 'message': 'Call history logged.'}), 202
+
+    # Keyset pagination, newest first: ?limit=N&before=<id of the last row seen>.
+    # The next page's cursor is returned in the X-Next-Cursor header.
+    try:
+        limit = int(request.args.get('limit', app.config['CALL_HISTORY_PAGE_SIZE']))
+        before = request.args.get('before')
+        before = int(before) if before is not None else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'limit and before must be integers.'}), 400
+    limit = max(1, min(limit, app.config['CALL_HISTORY_MAX_PAGE_SIZE']))
+
+    rows, next_cursor = call_history_page(current_user.id, limit, before)
+    headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else {}
+
+    def generate():
+        yield '['
+        for i, h in enumerate(rows):
+            yield (',' if i else '') + json.dumps(call_history_row(h))
+        yield ']'
+    return app.response_class(generate(), mimetype='application/json', headers=headers)
+
+
+def call_history_page(user_id, limit, before=None):
+    """One newest-first page of a user's history: (rows, id to pass as `before` next, or None)."""
+    query = db.session.query(
+        CallHistory.id, CallHistory.caller_mobile, CallHistory.receiver_mobile,
+        CallHistory.timestamp, CallHistory.duration, CallHistory.status
+    ).filter(CallHistory.user_id == user_id)
+    if before is not None:
+        # Compare against the cursor row's stored timestamp rather than a
+        # re-encoded one, so rows sharing a second are neither skipped nor repeated
+        cursor = db.select(CallHistory.timestamp, CallHistory.id).where(
+            CallHistory.id == before, CallHistory.user_id == user_id).scalar_subquery()
+        query = query.filter(db.tuple_(CallHistory.timestamp, CallHistory.id) < cursor)
+    rows = query.order_by(CallHistory.timestamp.desc(), CallHistory.id.desc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
+
+
+def call_history_row(h):
+    return {
+        'id': h.id,
         'caller_mobile': h.caller_mobile,
         'receiver_mobile': h.receiver_mobile,
         'timestamp': h.timestamp.isoformat(),
         'duration': h.duration,
         'status': h.status
-    } for h in history])
+    }
+
+
+@app.route('/api/bootstrap')
+@login_required
+def bootstrap():
+    """Contacts and the first page of call history in one response, for page load.
+
+    Tagged with the user's data versions: a revalidation with a matching
+    If-None-Match gets 304 without either table being queried.
+    """
+    user_id = current_user.id
+    etag = data_versions.etag(user_id, CONTACTS, HISTORY)
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        contacts = db.session.query(Contact.id, Contact.name, Contact.mobile) \
+            .filter_by(user_id=user_id).order_by(Contact.name).all()
+        rows, next_cursor = call_history_page(user_id, app.config['CALL_HISTORY_PAGE_SIZE'])
+        response = jsonify({
+            'contacts': [{'id': c.id, 'name': c.name, 'mobile': c.mobile} for c in contacts],
+            'call_history': [call_history_row(h) for h in rows],
+            'call_history_cursor': next_cursor,
+        })
+    response.set_etag(etag)
+    # Stored by the browser, but revalidated on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @app.route('/api/symptom-Checker', methods=['POST'])
 @login_required
 def symptom_checker():
-    symptoms = request.args.get("symptoms")
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key="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",
-    )
-
-    completion = client.chat.completions.create(
-        extra_body={},
-        model="openai/gpt-oss-120b:free",
-        messages=[
-            {
-                "role": "user",
-                "content": f"""Symptoms:
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object.'}), 400
+
+    # Structured mode: {"profile": {"Fever": "Yes", ..., "Age": 30}}
+    profile = data.get('profile')
+    if profile is not None:
+        if symptom_classifier is None:
+            return jsonify({'success': False, 'message': 'Symptom classifier is not available.'}), 503
+        try:
+            predictions = symptom_classifier.predict(profile)
+        except ProfileError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        return jsonify({
+            'result': predictions[0][0],
+            'predictions': [{'disease': d, 'probability': p} for d, p in predictions],
+            'source': 'classifier'
+        })
+
+    # Free-text mode falls back to the LLM
+    symptoms = data.get('symptoms') or request.args.get("symptoms")
+    if not symptoms:
+        return jsonify({'success': False, 'message': 'Provide a profile or symptoms.'}), 400
+    if not isinstance(symptoms, str):
+        return jsonify({'success': False, 'message': 'Symptoms must be a string.'}), 400
+    if not app.config['SYMPTOM_LLM_FALLBACK'] or llm_client is None:
+        return jsonify({'success': False, 'message': 'Free-text symptom checking is disabled.'}), 400
+
+    cache_key = symptom_cache_key(symptoms, app.config['SYMPTOM_LLM_MODEL'])
+    if symptom_cache is not None:
+        cached = symptom_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({'result': cached, 'source': 'llm', 'cached': True})
+
+    try:
+        result = llm_client.complete(symptom_prompt(symptoms))
+    except LLMTimeout as e:
+        return jsonify({'success': False, 'message': str(e)}), 504
+    except LLMError as e:
+        return jsonify({'success': False, 'message': f'Symptom checker is unavailable: {e}'}), 502
+    if symptom_cache is not None and result:
+        symptom_cache.set(cache_key, result)
+    return jsonify({"result": result, 'source': 'llm', 'cached': False})
+
+
+def symptom_prompt(symptoms):
+    return f"""Symptoms:
 {symptoms}
 
 You are a Professional phamacist
 Classify the possible diseases based on the above symptoms and provide a single answer in layman terms
 optimize this input for tinyllama as a prompt"""
-            }
-        ]
-    )
 
-    return jsonify({"result": completion.choices[0].message.content})
+
+def sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@app.route('/api/symptom-Checker/stream', methods=['GET', 'POST'])
+@login_required
+def symptom_checker_stream():
+    """Free-text symptom check relayed as Server-Sent Events while the LLM writes it.
+
+    Events: `token` ({"text": ...}) for each piece as it arrives, then `done`
+    ({"result": full text, "cached": bool}) or `error` ({"message": ...}).
+    A client that goes away closes the upstream call at the next write.
+    """
+    started = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object.'}), 400
+    symptoms = data.get('symptoms') or request.args.get('symptoms')
+    if not symptoms:
+        return jsonify({'success': False, 'message': 'Provide symptoms.'}), 400
+    if not isinstance(symptoms, str):
+        return jsonify({'success': False, 'message': 'Symptoms must be a string.'}), 400
+    if not app.config['SYMPTOM_LLM_FALLBACK'] or llm_client is None:
+        return jsonify({'success': False, 'message': 'Free-text symptom checking is disabled.'}), 400
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    cache_key = symptom_cache_key(symptoms, app.config['SYMPTOM_LLM_MODEL'])
+    cached = symptom_cache.get(cache_key) if symptom_cache is not None else None
+    if cached is not None:
+        symptom_streams.labels('cached').inc()
+        return app.response_class(sse('token', {'text': cached}) + sse('done', {'result': cached, 'cached': True}),
+                                  mimetype='text/event-stream', headers=headers)
+
+    try:
+        tokens = llm_client.stream(symptom_prompt(symptoms))
+    except LLMTimeout as e:
+        symptom_streams.labels('timeout').inc()
+        return jsonify({'success': False, 'message': str(e)}), 504
+    except LLMError as e:
+        symptom_streams.labels('error').inc()
+        return jsonify({'success': False, 'message': f'Symptom checker is unavailable: {e}'}), 502
+
+    def generate():
+        parts = []
+        outcome = 'cancelled'  # unless the loop below gets to the end
+        try:
+            for text in tokens:
+                if not parts:
+                    symptom_first_token_seconds.observe(time.perf_counter() - started)
+                parts.append(text)
+                yield sse('token', {'text': text})
+            result = ''.join(parts)
+            if symptom_cache is not None and result:
+                symptom_cache.set(cache_key, result)
+            outcome = 'completed'
+            yield sse('done', {'result': result, 'cached': False})
+        except LLMError as e:
+            outcome = 'timeout' if isinstance(e, LLMTimeout) else 'error'
+            yield sse('error', {'message': str(e)})
+        finally:
+            # Runs on GeneratorExit too, when the server drops a gone client
+            tokens.close()
+            symptom_streams.labels(outcome).inc()
+
+    def closed():
+        # A client gone before the first write never starts generate(), so its finally never runs
+        if not tokens.closed:
+            tokens.close()
+            symptom_streams.labels('cancelled').inc()
+
+    response = app.response_class(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+    response.call_on_close(closed)
+    return response
+
+
+@app.route('/api/symptom-Checker/batch', methods=['POST'])
+@login_required
+def symptom_checker_batch():
+    if symptom_classifier is None:
+        return jsonify({'success': False, 'message': 'Symptom classifier is not available.'}), 503
+
+    # Accept a JSON list, {"profiles": [...]}, or newline-delimited JSON
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            profiles = [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        else:
+            profiles = request.get_json(force=True)
+            if isinstance(profiles, dict):
+                profiles = profiles.get('profiles')
+    # json.loads raises ValueError; Flask's own parser raises BadRequest
+    except (ValueError, BadRequest):
+        return jsonify({'success': False, 'message': 'Malformed JSON.'}), 400
+    if not isinstance(profiles, list):
+        return jsonify({'success': False, 'message': 'Expected a list of profiles.'}), 400
+    if len(profiles) > app.config['SYMPTOM_BATCH_MAX_ROWS']:
+        return jsonify({'success': False, 'message': f"At most {app.config['SYMPTOM_BATCH_MAX_ROWS']} profiles per batch."}), 413
+
+    try:
+        batch = symptom_classifier.predict_batch(profiles)
+    except ProfileError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({
+        'results': [{
+            'result': predictions[0][0],
+            'predictions': [{'disease': d, 'probability': p} for d, p in predictions]
+        } for predictions in batch],
+        'source': 'classifier'
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    if not app.config['METRICS_ENABLED']:
+        return jsonify({'success': False, 'message': 'Metrics are disabled.'}), 404
+    return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 # --- Socket.IO Events for WebRTC Signaling ---
 
 
-# In-memory store for user session IDs
-# In a real-world app, use Redis or another persistent store
-online_users = {}
+# Online users: in-process by default, shared through Redis when PRESENCE_URL
+# (or SOCKETIO_MESSAGE_QUEUE) is set so any worker can route to any user
+online_users = create_presence_registry(app.config['PRESENCE_URL'])
+
+
+def emit_to_user(mobile, event, data):
+    """Emit to every device `mobile` is connected from; False if offline.
+
+    With a message queue configured the emit reaches sids owned by other
+    workers too.
+    """
+    sids = online_users.sids(mobile)
+    for sid in sids:
+        socketio.emit(event, data, to=sid)
+    return bool(sids)
+
+
+def flush_ice_candidates(sender_sid, target_mobile, candidates):
+    emit_to_user(target_mobile, 'ice-candidates', {'candidates': candidates})
+
+
+ice_coalescer = None
+if app.config['ICE_COALESCE_MS'] > 0:
+    ice_coalescer = IceCoalescer(app.config['ICE_COALESCE_MS'] / 1000.0, flush_ice_candidates,
+                                 socketio.start_background_task, socketio.sleep)
+
+
+# --- Signaling metrics ---
+
+handler_calls = metrics_registry.counter('signaling_events_total', 'Socket.IO events handled', ('event',))
+handler_errors = metrics_registry.counter('signaling_errors_total', 'Socket.IO handlers that raised', ('event',))
+handler_seconds = metrics_registry.histogram('signaling_handler_seconds', 'Socket.IO handler latency', ('event',))
+call_outcomes = metrics_registry.counter('signaling_calls_total', 'Call offers by outcome', ('outcome',))
+call_setup_seconds = metrics_registry.histogram(
+    'signaling_call_setup_seconds', 'call-user received to call-answered sent, including ring time')
+
+
+def emit_queue_depth():
+    """Packets waiting in Engine.IO send queues across this worker's clients."""
+    eio = getattr(socketio.server, 'eio', None)
+    if eio is None:
+        return 0
+    return sum(s.queue.qsize() for s in list(eio.sockets.values()))
+
+
+metrics_registry.gauge('signaling_online_users', 'Users with at least one connected device',
+                       fn=lambda: len(online_users))
+metrics_registry.gauge('signaling_online_devices', 'Registered Socket.IO connections',
+                       fn=lambda: online_users.device_count)
+metrics_registry.gauge('signaling_emit_queue_depth', 'Packets queued for sending', fn=emit_queue_depth)
+metrics_registry.stats('signaling_presence', 'Presence registry', lambda: online_users.stats())
+metrics_registry.stats('signaling_ice', 'ICE coalescer',
+                       lambda: ice_coalescer.stats() if ice_coalescer is not None else {})
+
+
+def instrumented(event):
+    if not app.config['METRICS_ENABLED']:
+        return lambda fn: fn
+    return timed(handler_seconds.labels(event), handler_calls.labels(event), handler_errors.labels(event))
+
+
+# --- Call sessions ---
+
+def record_call(session):
+    """Queue both parties' history rows for an ended call."""
+    answered = session.answered is not None
+    row = {'caller_mobile': session.caller, 'receiver_mobile': session.callee,
+           'duration': session.duration(), 'timestamp': session.started_at}
+    history_writer.add(user_mobile=session.caller, status='outgoing' if answered else 'outgoing_unanswered', **row)
+    history_writer.add(user_mobile=session.callee, status='incoming_answered' if answered else 'incoming_missed',
+                       **row)
+
+
+call_sessions = create_call_sessions(app.config['CALL_SESSIONS_URL'], on_end=record_call,
+                                     ring_timeout=app.config['CALL_RING_TIMEOUT'],
+                                     max_duration=app.config['CALL_MAX_DURATION'],
+                                     max_sessions=app.config['CALL_MAX_SESSIONS'])
+metrics_registry.gauge('signaling_calls_ringing', 'Calls offered and not yet answered',
+                       fn=lambda: call_sessions.ringing)
+metrics_registry.gauge('signaling_calls_active', 'Connected calls',
+                       fn=lambda: len(call_sessions) - call_sessions.ringing)
+metrics_registry.stats('signaling_call_sessions', 'Call session table', call_sessions.stats)
+
+
+def expire_calls():
+    while True:
+        socketio.sleep(call_sessions.tick)
+        # Only calls still ringing (or connected) in the shared state come
+        # back: an answer handled by another worker has already moved them on
+        for session in call_sessions.expire():
+            if session.end_reason == 'no-answer':
+                emit_to_user(session.caller, 'call-failed',
+                             {'message': f'{session.callee} did not answer.', 'call_id': session.call_id})
+            else:
+                emit_to_user(session.caller, 'hang-up', {'call_id': session.call_id})
+            emit_to_user(session.callee, 'hang-up', {'call_id': session.call_id})
+
+
+socketio.start_background_task(expire_calls)
 
 
 @socketio.on('connect')
+@instrumented('connect')
 def on_connect():
     print(f'Client connected: {request.sid}')
 
 
 @socketio.on('register')
-def on_register(data):
-    mobile = data.get('mobile')
-    if mobile:
-        online_users[mobile] = request.sid
-        print(f'User {mobile} registered with SID {request.sid}')
-        print(f'Online users: {online_users}')
+@instrumented('register')
+def on_register(data=None):
+    # A socket receives calls for its logged-in account's number and no
+    # other; a client naming someone else's number is refused
+    claimed = data.get('mobile') if isinstance(data, dict) else None
+    if not current_user.is_authenticated or claimed not in (None, current_user.mobile):
+        emit('register-failed', {'message': 'Log in to receive calls for this number.'}, room=request.sid)
+        return
+    mobile = current_user.mobile
+    online_users.add(mobile, request.sid)
+    print(f'User {mobile} registered with SID {request.sid} ({len(online_users)} online)')
 
 
 @socketio.on('disconnect')
+@instrumented('disconnect')
 def on_disconnect():
-    print(f'Client disconnected: {request.sid}')
-    for mobile, sid in list(online_users.items()):
-        if sid == request.sid:
-            del online_users[mobile]
-            print(f'User {mobile} unregistered')
-            break
-    print(f'Online users: {online_users}')
+    mobile = online_users.remove_sid(request.sid)
+    if mobile:
+        print(f'User {mobile} unregistered SID {request.sid} ({len(online_users)} online)')
+        if mobile not in online_users:
+            # Their last device is gone: end their calls instead of leaving them to time out
+            for session in call_sessions.drop_user(mobile):
+                emit_to_user(session.peer_of(mobile), 'hang-up', {'call_id': session.call_id})
+    else:
+        print(f'Client disconnected: {request.sid}')
 
 
 @socketio.on('call-user')
+@instrumented('call-user')
 def on_call_user(data):
-    caller_mobile = data.get('caller_mobile')
+    # The caller is whoever registered this socket, not what the client
+    # claims: the session writes history rows to that account
+    caller_mobile = online_users.mobile_for(request.sid)
     target_mobile = data.get('target_mobile')
     offer = data.get('offer')
-
-    target_sid = online_users.get(target_mobile)
-    if target_sid:
-        print(
-            f'Forwarding call from {caller_mobile} to {target_mobile} at SID {target_sid}')
-        emit('incoming-call', {'from': caller_mobile,
-             'offer': offer}, room=target_sid)
+    if caller_mobile is None:
+        call_outcomes.labels('failed').inc()
+        emit('call-failed', {'message': 'Register before placing a call.'}, room=request.sid)
+        return
+
+    session = call_sessions.offer(caller_mobile, target_mobile)
+    call_id = session.call_id if session is not None else None
+    if emit_to_user(target_mobile, 'incoming-call', {'from': caller_mobile, 'offer': offer, 'call_id': call_id}):
+        print(f'Forwarded call from {caller_mobile} to {target_mobile}')
+        call_outcomes.labels('offered').inc()
     else:
         print(f'Call failed: User {target_mobile} is not online.')
+        if session is not None:
+            call_sessions.discard(session)
+        call_outcomes.labels('failed').inc()
         emit('call-failed',
              {'message': f'User {target_mobile} is offline or does not exist.'}, room=request.sid)
 
 
 @socketio.on('answer-call')
+@instrumented('answer-call')
 def on_answer_call(data):
     target_mobile = data.get('target_mobile')
     answer = data.get('answer')
 
-    target_sid = online_users.get(target_mobile)
-    if target_sid:
-        print(f'Forwarding answer to {target_mobile}')
-        emit('call-answered', {'answer': answer}, room=target_sid)
+    if emit_to_user(target_mobile, 'call-answered', {'answer': answer}):
+        print(f'Forwarded answer to {target_mobile}')
+        call_outcomes.labels('answered').inc()
+        session = call_sessions.answer(target_mobile, online_users.mobile_for(request.sid), data.get('call_id'))
+        if session is not None:
+            call_setup_seconds.observe(session.answered - session.created)
 
 
 @socketio.on('ice-candidate')
+@instrumented('ice-candidate')
 def on_ice_candidate(data):
     target_mobile = data.get('target_mobile')
     candidate = data.get('candidate')
 
-    target_sid = online_users.get(target_mobile)
-    if target_sid:
-        emit('ice-candidate', {'candidate': candidate}, room=target_sid)
+    if ice_coalescer is not None:
+        # A null candidate is the browser's end-of-candidates marker
+        ice_coalescer.add(request.sid, target_mobile, candidate)
+    elif candidate:
+        emit_to_user(target_mobile, 'ice-candidate', {'candidate': candidate})
 
 
 @socketio.on('hang-up')
+@instrumented('hang-up')
 def on_hang_up(data):
     target_mobile = data.get('target_mobile')
-    target_sid = online_users.get(target_mobile)
-    if target_sid:
-        emit('hang-up', {}, room=target_sid)
+    emit_to_user(target_mobile, 'hang-up', {})
+    # Ends the session whether it was connected, cancelled or declined;
+    # history for both sides is written from it
+    call_sessions.hang_up(online_users.mobile_for(request.sid), target_mobile)
 
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
-    socketio.run(app, debug=True, host='0.0.0.0')
+    socketio.run(app, debug=os.environ.get('FLASK_DEBUG', '1') == '1', host='0.0.0.0',
+                 port=int(os.environ.get('PORT', 5000)))
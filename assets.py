@@ -0,0 +1,195 @@
+"""Content-hashed, precompressed static assets and the service worker built from them.
+
+build_assets.py copies each stylesheet and script under a static folder to
+dist/ with its content hash in the name (js/main.js -> dist/js/main.1a2b3c4d5e.js),
+next to .gz and .br variants, and records the mapping in dist/assets.json.
+install() then makes url_for('static', filename='js/main.js') point at the
+hashed copy and serves it with the best variant the client accepts and
+`Cache-Control: immutable`: a changed file gets a new URL, so browsers never
+need to revalidate the old one.
+
+The service worker is served from /serviceworker.js, so that its scope is
+the whole site. Its source (js/serviceworker.js) has two placeholders filled
+from the same hashes: the asset version, which names its cache, and the list
+of URLs to precache. Until assets are built, both are computed from the
+source files at startup and served under their plain names.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # only build_assets.py needs it; .br variants are skipped without it
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'assets.json'
+HASHED_EXTENSIONS = ('.css', '.js')
+SERVICE_WORKER = 'js/serviceworker.js'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def source_files(static_folder):
+    """Relative paths (with /) of the assets to fingerprint, sorted."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        dirnames[:] = sorted(d for d in dirnames if d != DIST)
+        for name in filenames:
+            path = os.path.relpath(os.path.join(dirpath, name), static_folder).replace(os.sep, '/')
+            if name.endswith(HASHED_EXTENSIONS) and path != SERVICE_WORKER:
+                found.append(path)
+    return sorted(found)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def hashed_name(path, digest):
+    stem, extension = os.path.splitext(path)
+    return f'{stem}.{digest}{extension}'
+
+
+def asset_version(digests):
+    """One short version for a set of {path: content hash}."""
+    lines = ''.join(f'{path}:{digest}\n' for path, digest in sorted(digests.items()))
+    return hashlib.sha256(lines.encode()).hexdigest()[:12]
+
+
+def render_service_worker(source, version, precache):
+    return source.replace("'__ASSET_VERSION__'", json.dumps(version)) \
+                 .replace('[/* __PRECACHE_URLS__ */]', json.dumps(precache, indent=2))
+
+
+def compress(data, gzip_level=9, brotli_quality=11):
+    """{suffix: bytes} for each encoding that makes `data` smaller."""
+    variants = {'.gz': gzip.compress(data, gzip_level, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=brotli_quality)
+    return {suffix: body for suffix, body in variants.items() if len(body) < len(data)}
+
+
+def build(static_folder, static_url_path='/static', gzip_level=9, brotli_quality=11):
+    """(Re)write static_folder/dist; returns the manifest it saved."""
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    files, digests, sizes = {}, {}, {}
+    for path in source_files(static_folder):
+        with open(os.path.join(static_folder, path), 'rb') as f:
+            data = f.read()
+        digests[path] = content_hash(data)
+        target = f'{DIST}/{hashed_name(path, digests[path])}'
+        os.makedirs(os.path.dirname(os.path.join(static_folder, target)), exist_ok=True)
+        variants = {'': data, **compress(data, gzip_level, brotli_quality)}
+        for suffix, body in variants.items():
+            with open(os.path.join(static_folder, target + suffix), 'wb') as f:
+                f.write(body)
+        files[path] = target
+        sizes[path] = {suffix or 'identity': len(body) for suffix, body in variants.items()}
+
+    manifest = {'version': asset_version(digests), 'files': files, 'sizes': sizes}
+    if os.path.exists(os.path.join(static_folder, SERVICE_WORKER)):
+        with open(os.path.join(static_folder, SERVICE_WORKER), encoding='utf-8') as f:
+            source = f.read()
+        precache = [f'{static_url_path}/{target}' for target in files.values()]
+        with open(os.path.join(dist, 'serviceworker.js'), 'w', encoding='utf-8') as f:
+            f.write(render_service_worker(source, manifest['version'], precache))
+    with open(os.path.join(dist, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class AssetManifest:
+    """The built manifest of a static folder, or a live stand-in when it was never built."""
+
+    def __init__(self, static_folder, static_url_path='/static'):
+        self.static_folder = static_folder
+        self.static_url_path = static_url_path
+        self.dist = os.path.join(static_folder, DIST)
+        try:
+            with open(os.path.join(self.dist, MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            self.built = False
+            self.files = {}
+            digests = {}
+            for path in source_files(static_folder):
+                with open(os.path.join(static_folder, path), 'rb') as f:
+                    digests[path] = content_hash(f.read())
+            self.version = 'dev-' + asset_version(digests)
+            self._precache = [f'{static_url_path}/{path}' for path in digests]
+        else:
+            self.built = True
+            self.files = manifest['files']
+            self.version = manifest['version']
+            self._precache = [f'{static_url_path}/{target}' for target in self.files.values()]
+        self.immutable = set(self.files.values())
+        self._service_worker = None
+
+    def service_worker(self):
+        if self._service_worker is None:
+            built = os.path.join(self.dist, 'serviceworker.js')
+            if self.built and os.path.exists(built):
+                with open(built, encoding='utf-8') as f:
+                    self._service_worker = f.read()
+            else:
+                with open(os.path.join(self.static_folder, SERVICE_WORKER), encoding='utf-8') as f:
+                    self._service_worker = render_service_worker(f.read(), self.version, self._precache)
+        return self._service_worker
+
+    def send(self, target):
+        """A hashed asset, precompressed if the client accepts it, cached for good."""
+        mimetype = mimetypes.guess_type(target)[0]
+        for encoding, suffix in ENCODINGS:
+            if request.accept_encodings.quality(encoding) > 0 \
+                    and os.path.exists(os.path.join(self.static_folder, target + suffix)):
+                response = send_from_directory(self.static_folder, target + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                # send_file names the .gz/.br file; the client must not see it
+                response.headers.pop('Content-Disposition', None)
+                break
+        else:
+            response = send_from_directory(self.static_folder, target, mimetype=mimetype)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+def install(app):
+    """Serve app's static folder through its asset manifest (see the module docstring)."""
+    app.extensions['assets'] = AssetManifest(app.static_folder, app.static_url_path)
+    plain_static = app.view_functions['static']
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static':
+            target = current_app.extensions['assets'].files.get(values.get('filename'))
+            if target is not None:
+                values['filename'] = target
+
+    def static(filename):
+        manifest = current_app.extensions['assets']
+        if filename in manifest.immutable:
+            return manifest.send(filename)
+        return plain_static(filename=filename)
+
+    app.view_functions['static'] = static
+
+    if os.path.exists(os.path.join(app.static_folder, SERVICE_WORKER)):
+        def service_worker():
+            manifest = current_app.extensions['assets']
+            response = current_app.response_class(manifest.service_worker(), mimetype='application/javascript')
+            response.set_etag(manifest.version)
+            # Browsers check for a new worker on every navigation; keep that cheap
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+
+        app.add_url_rule('/serviceworker.js', 'service_worker', service_worker)
@@ -0,0 +1,179 @@
+"""Helpers shared by the benchmark scripts."""
+import http.cookiejar
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    k = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+def report(name, samples, elapsed=None):
+    """Print p50/p99 (in microseconds) and throughput for a list of seconds."""
+    line = (f'{name:<32} n={len(samples):<7} p50={percentile(samples, 50) * 1e6:10.1f}us '
+            f'p99={percentile(samples, 99) * 1e6:10.1f}us')
+    if elapsed:
+        line += f' rate={len(samples) / elapsed:10.1f}/s'
+    print(line)
+
+
+def timed(fn, n):
+    """Call fn() n times; returns (per-call seconds, total elapsed)."""
+    samples = []
+    start = time.perf_counter()
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+def wire_bytes(response):
+    """Bytes of a test-client response on the wire: status line, headers and body."""
+    head = len(f'HTTP/1.1 {response.status}\r\n') + sum(len(k) + len(v) + 4 for k, v in response.headers.to_wsgi_list())
+    return head + 2 + len(response.get_data())
+
+
+class StatementCounter:
+    """Counts the SQL statements an engine executes."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'nothing listening on port {port}')
+
+
+def patch_gevent():
+    """Patch the standard library the way app.py (and gunicorn's gevent worker) does.
+
+    Call it before starting any helper threads that the app will talk to;
+    threads started earlier keep blocking primitives and can stall the hub.
+    """
+    from gevent import monkey
+    monkey.patch_all()
+
+
+def load_app(**env):
+    """Import app.py against a throwaway SQLite database.
+
+    Environment overrides must be applied before the import because the
+    app reads its configuration at module level.
+    """
+    # Patching again inside app.py's own import would happen under the import lock
+    patch_gevent()
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'bench.db'))
+    os.environ.update(env)
+    import app as app_module
+    with app_module.app.app_context():
+        app_module.db.create_all()
+    return app_module
+
+
+def logged_in_client(app_module, mobile='5550000001', password='bench-pass'):
+    client = app_module.app.test_client()
+    client.post('/signup', json={'name': 'Bench', 'mobile': mobile,
+                                 'password': password, 'account_type': 'patient'})
+    resp = client.post('/login', json={'mobile': mobile, 'password': password})
+    assert resp.status_code == 200, resp.get_data(as_text=True)
+    return client
+
+
+def registered_socket_client(app_module, mobile, password='bench-pass'):
+    """A Socket.IO test client logged in as `mobile` and registered; app.py refuses anonymous sockets."""
+    client = app_module.socketio.test_client(app_module.app,
+                                             flask_test_client=logged_in_client(app_module, mobile, password))
+    client.emit('register', {'mobile': mobile})
+    return client
+
+
+def session_cookie(url, mobile, password='bench-pass'):
+    """Sign `mobile` up on a running app.py unless it exists, log in, and return the Cookie header."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    body = json.dumps({'name': 'Bench', 'mobile': mobile, 'password': password,
+                       'account_type': 'patient'}).encode()
+    for path in ('/signup', '/login'):
+        request = urllib.request.Request(url + path, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            opener.open(request, timeout=30).close()
+        except urllib.error.HTTPError as e:
+            if not (path == '/signup' and e.code == 409):  # 409: signed up already
+                raise
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+def load_test_app(**env):
+    """Import TEST/app.py (as module `test_app`) against a throwaway SQLite database."""
+    import importlib.util
+    patch_gevent()
+    workdir = tempfile.mkdtemp(prefix='bench-test-')
+    # The two apps have different schemas, so never share load_app's database
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(workdir, 'bench.db'))
+    env.setdefault('SECRET_KEY', 'bench')
+    saved = {key: os.environ.get(key) for key in env}
+    os.environ.update(env)
+    try:
+        spec = importlib.util.spec_from_file_location('test_app', os.path.join(ROOT, 'TEST', 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules['test_app'] = module
+        spec.loader.exec_module(module)
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+    with module.app.app_context():
+        module.db.create_all()
+    return module
+
+
+def verified_socket_client(test_module, mobile, password='bench-pass', name='Bench'):
+    """A TEST app Socket.IO client logged in as a verified user (created if needed)."""
+    with test_module.app.app_context():
+        user = test_module.User.query.filter_by(mobile_number=mobile).first()
+        if user is None:
+            user = test_module.User(name=name, mobile_number=mobile, is_verified=True)
+            user.set_password(password)
+            test_module.db.session.add(user)
+            test_module.db.session.commit()
+        user_id = user.id
+    http = test_module.app.test_client()
+    with http.session_transaction() as session:
+        session['user_id'] = user_id
+    return test_module.socketio.test_client(test_module.app, flask_test_client=http)
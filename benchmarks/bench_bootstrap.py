@@ -0,0 +1,133 @@
+"""SQL statements and bytes per dashboard load: separate lists vs /api/bootstrap with ETags.
+
+    python benchmarks/bench_bootstrap.py --contacts 200 --calls 500
+
+A user with --contacts contacts and --calls history rows loads the
+dashboard --loads times:
+
+  app.py  two requests        the old init(): GET /api/contacts and GET
+                              /api/call-history
+          bootstrap           GET /api/bootstrap without a cached copy
+          bootstrap, 304      the same with If-None-Match, as the browser
+                              sends on every load after the first
+  TEST    dashboard           GET /dashboard rendered in full
+          dashboard, 304      the same with If-None-Match
+
+Bytes are the response status line, headers and body. Before timing, it
+checks that a new contact or a flushed history row makes the old tag miss.
+"""
+import argparse
+from datetime import timedelta
+
+from _util import StatementCounter, load_app, load_test_app, logged_in_client, report, timed, wire_bytes
+
+
+def measure(label, counter, requests, n):
+    """requests() makes one dashboard load and returns its responses."""
+    statements, sent = 0, 0
+
+    def load():
+        nonlocal statements, sent
+        before = counter.count
+        responses = requests()
+        statements += counter.count - before
+        sent += sum(wire_bytes(r) for r in responses)
+
+    requests()  # warm the identity cache
+    samples, elapsed = timed(load, n)
+    report(label, samples, elapsed)
+    print(f'{"":<32} {statements / n:.2f} SQL statements, {sent / n:,.0f} bytes per load')
+
+
+def seed_app(app_module, user_id, contacts, calls):
+    now = app_module.utcnow()
+    with app_module.app.app_context():
+        db = app_module.db
+        db.session.execute(db.insert(app_module.Contact), [
+            {'name': f'Contact {i:05d}', 'mobile': f'+1202{i:07d}', 'user_id': user_id} for i in range(contacts)])
+        db.session.execute(db.insert(app_module.CallHistory), [
+            {'caller_mobile': '5550000001', 'receiver_mobile': f'+1202{i % max(contacts, 1):07d}',
+             'timestamp': now - timedelta(minutes=i), 'duration': i % 600, 'status': 'outgoing',
+             'user_id': user_id} for i in range(calls)])
+        db.session.commit()
+
+
+def seed_test_app(test_module, contacts, calls):
+    now = test_module.utcnow()
+    with test_module.app.app_context():
+        db = test_module.db
+        user = test_module.User(name='Bench', mobile_number='+12025550100', is_verified=True)
+        user.set_password('bench-pass')
+        db.session.add(user)
+        db.session.commit()
+        db.session.execute(db.insert(test_module.Contact), [
+            {'user_id': user.id, 'name': f'Contact {i:05d}', 'mobile_number': f'+1202{i:07d}'}
+            for i in range(contacts)])
+        db.session.execute(db.insert(test_module.CallHistory), [
+            {'user_id': user.id, 'contact_number': f'+1202{i % max(contacts, 1):07d}', 'call_type': 'outgoing',
+             'timestamp': now - timedelta(minutes=i)} for i in range(calls)])
+        db.session.commit()
+        return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=200)
+    parser.add_argument('--calls', type=int, default=500)
+    parser.add_argument('--loads', type=int, default=500)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    with app_module.app.app_context():
+        counter = StatementCounter(app_module.db.engine)
+        user_id = app_module.User.query.count() + 1
+    client = logged_in_client(app_module)
+    seed_app(app_module, user_id, args.contacts, args.calls)
+    print(f'app.py, {args.contacts} contacts, {args.calls} calls (first page of '
+          f'{app_module.app.config["CALL_HISTORY_PAGE_SIZE"]}):')
+
+    etag = client.get('/api/bootstrap').headers['ETag']
+    client.post('/api/contacts', json={'name': 'New', 'mobile': '+12029999999'})
+    assert client.get('/api/bootstrap', headers={'If-None-Match': etag}).status_code == 200
+    etag = client.get('/api/bootstrap').headers['ETag']
+    app_module.write_call_history([{'caller_mobile': '5550000001', 'receiver_mobile': '+12029999999',
+                                    'duration': 1, 'status': 'outgoing', 'user_id': user_id,
+                                    'timestamp': app_module.utcnow()}])
+    assert client.get('/api/bootstrap', headers={'If-None-Match': etag}).status_code == 200
+    etag = client.get('/api/bootstrap').headers['ETag']
+
+    measure('two requests', counter,
+            lambda: [client.get('/api/contacts'), client.get('/api/call-history')], args.loads)
+    measure('bootstrap', counter, lambda: [client.get('/api/bootstrap')], args.loads)
+
+    def revalidate():
+        response = client.get('/api/bootstrap', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        return [response]
+
+    measure('bootstrap, 304', counter, revalidate, args.loads)
+    app_module.history_writer.close()
+
+    test_module = load_test_app()
+    with test_module.app.app_context():
+        counter = StatementCounter(test_module.db.engine)
+    user_id = seed_test_app(test_module, args.contacts, args.calls)
+    http = test_module.app.test_client()
+    with http.session_transaction() as session:
+        session['user_id'] = user_id
+    print(f'TEST/app.py, {args.contacts} contacts, {args.calls} calls:')
+
+    etag = http.get('/dashboard').headers['ETag']
+    measure('dashboard', counter, lambda: [http.get('/dashboard')], args.loads)
+
+    def revalidate_dashboard():
+        response = http.get('/dashboard', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        return [response]
+
+    measure('dashboard, 304', counter, revalidate_dashboard, args.loads)
+    test_module.history_writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""GET /api/call-history on a seeded database: unbounded list vs keyset pages.
+
+    python benchmarks/bench_call_history.py --rows 2000000 --heavy-rows 50000
+
+Seeds --rows call records spread over --users users, with the benchmark
+user owning --heavy-rows of them. It then measures the old endpoint body
+(query every row, serialize one list), the first page, and a deep page
+(following the cursor halfway down) without the composite index and
+with it.
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import time
+
+from _util import load_app, logged_in_client, report, timed
+
+STATUSES = ('outgoing', 'incoming_answered', 'incoming_missed')
+
+
+def seed(db_path, user_id, rows, heavy_rows, users, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    def batch(n):
+        for i in range(n):
+            # Several calls per second so cursor ties on timestamp are exercised
+            ts = (start + datetime.timedelta(seconds=i // 3)).strftime('%Y-%m-%d %H:%M:%S')
+            owner = user_id if i % (rows // heavy_rows) == 0 else rng.randint(user_id + 1, user_id + users)
+            yield (f'+9199{rng.randint(0, 10 ** 8):08d}', f'+9198{rng.randint(0, 10 ** 8):08d}',
+                   ts, rng.randint(0, 3600), rng.choice(STATUSES), owner)
+
+    conn.executemany('INSERT INTO call_history (caller_mobile, receiver_mobile, timestamp, duration, status, user_id) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', batch(rows))
+    conn.commit()
+    count = conn.execute('SELECT COUNT(*) FROM call_history WHERE user_id = ?', (user_id,)).fetchone()[0]
+    conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--heavy-rows', type=int, default=50000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    client = logged_in_client(app_module)
+    CallHistory = app_module.CallHistory
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        user_id = app_module.User.query.first().id
+    started = time.perf_counter()
+    owned = seed(engine.url.database, user_id, args.rows, args.heavy_rows, args.users)
+    print(f'seeded {args.rows} rows ({owned} for the benchmark user) in {time.perf_counter() - started:.1f}s, '
+          f'{os.path.getsize(engine.url.database) / 2 ** 20:.0f} MiB')
+
+    def unbounded():
+        # The endpoint body before pagination
+        with app_module.app.app_context():
+            history = CallHistory.query.filter_by(user_id=user_id).order_by(CallHistory.timestamp.desc()).all()
+            app_module.jsonify([{'caller_mobile': h.caller_mobile, 'receiver_mobile': h.receiver_mobile,
+                                 'timestamp': h.timestamp.isoformat(), 'duration': h.duration,
+                                 'status': h.status} for h in history])
+
+    deep_cursor = None
+    for indexed in (False, True):
+        with engine.begin() as conn:
+            conn.exec_driver_sql('DROP INDEX IF EXISTS ix_call_history_user_timestamp')
+            if indexed:
+                conn.exec_driver_sql('CREATE INDEX ix_call_history_user_timestamp '
+                                     'ON call_history (user_id, timestamp, id)')
+        label = 'indexed' if indexed else 'no index'
+
+        samples, elapsed = timed(unbounded, max(3, args.requests // 10))
+        report(f'unbounded list, {label}', samples, elapsed)
+
+        samples, elapsed = timed(lambda: client.get('/api/call-history').get_data(), args.requests)
+        report(f'first page (50), {label}', samples, elapsed)
+
+        if deep_cursor is None:
+            resp = client.get('/api/call-history?limit=500')
+            for _ in range(owned // 1000):
+                resp = client.get(f'/api/call-history?limit=500&before={resp.headers["X-Next-Cursor"]}')
+            deep_cursor = resp.headers['X-Next-Cursor']
+        samples, elapsed = timed(lambda: client.get(f'/api/call-history?before={deep_cursor}').get_data(),
+                                 args.requests)
+        report(f'page at row ~{owned // 2}, {label}', samples, elapsed)
+
+    page = client.get('/api/call-history?limit=500').get_data()
+    print(f'{"":<32} unbounded body ~{len(page) * owned / 500 / 2 ** 20:.1f} MiB '
+          f'vs default page {len(client.get("/api/call-history").get_data()) / 1024:.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Call session table with 100k concurrent calls: memory, per-event cost, expiry.
+
+    python benchmarks/bench_call_sessions.py --sessions 100000
+
+Offers --sessions calls, answers half of them, then steps a fake clock
+through the ring timeout one tick at a time so the unanswered half expires
+through the timer wheel. For comparison it reports the memory of the same
+records without __slots__, a naive expiry pass that scans every session per
+tick, and one gevent timer per call (spawn_later) instead of the wheel.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from _util import report, timed
+from call_sessions import CallSession, CallSessionTable
+
+
+class DictSession:
+    """CallSession's fields without __slots__ (an instance __dict__ each)."""
+
+    def __init__(self, call_id, caller, callee, created, started_at):
+        self.call_id = call_id
+        self.caller = caller
+        self.callee = callee
+        self.state = 'ringing'
+        self.started_at = started_at
+        self.created = created
+        self.answered = None
+        self.ended = None
+        self.end_reason = None
+
+
+def allocated(build):
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, kept
+
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--ring-timeout', type=float, default=45.0)
+    args = parser.parse_args()
+    n = args.sessions
+    mobiles = [f'+1555{i:07d}' for i in range(2 * n)]
+
+    for cls in (CallSession, DictSession):
+        size, _ = allocated(lambda: [cls(str(i), mobiles[2 * i], mobiles[2 * i + 1], 0.0, None) for i in range(n)])
+        print(f'{n} bare {cls.__name__} records: {size / 2 ** 20:7.1f} MiB ({size / n:.0f} B each)')
+
+    now = [0.0]
+    ended = []
+    table = CallSessionTable(ended.append, ring_timeout=args.ring_timeout, clock=lambda: now[0],
+                             max_sessions=n, wall_clock=lambda: None)
+    it = iter(range(n))
+
+    def offer():
+        i = next(it)
+        now[0] = i * args.ring_timeout / n  # offers spread over one ring period
+        table.offer(mobiles[2 * i], mobiles[2 * i + 1])
+
+    samples, elapsed = timed(offer, n)
+    report('offer()', samples, elapsed)
+
+    def full_table():
+        sized = CallSessionTable(ring_timeout=args.ring_timeout, max_sessions=n, wall_clock=lambda: None)
+        for i in range(n):
+            sized.offer(mobiles[2 * i], mobiles[2 * i + 1])
+        return sized
+
+    size, _ = allocated(full_table)
+    print(f'{"":<32} table with {n} ringing calls: {size / 2 ** 20:.1f} MiB '
+          f'({size / n:.0f} B per call, indexes and timers included)')
+
+    sessions = list(table._sessions.values())
+
+    def scan():
+        limit = now[0] - args.ring_timeout
+        return [s for s in sessions if s.state == 'ringing' and s.created <= limit]
+
+    # What a timer-less table would pay every tick just to find the due calls
+    samples, _ = timed(scan, 20)
+    report(f'full scan of {len(sessions)} per tick', samples)
+
+    it = iter(range(0, n, 2))
+
+    def answer():
+        i = next(it)
+        table.answer(mobiles[2 * i], mobiles[2 * i + 1])
+
+    samples, elapsed = timed(answer, n // 2)
+    report('answer()', samples, elapsed)
+
+    # Step through the ring period: each tick ends the calls that fell due
+    # in it (n / ring_timeout of them, half still ringing)
+    ticks, swept = [], 0
+    end = now[0] + args.ring_timeout + 2 * table.tick
+    while now[0] < end:
+        now[0] += table.tick
+        t0 = time.perf_counter()
+        swept += len(table.expire())
+        ticks.append(time.perf_counter() - t0)
+    report('expire() per tick, with calls due', ticks)
+    print(f'{"":<32} {swept} unanswered calls expired, {len(table)} still active')
+    idle = []
+    for _ in range(100):
+        now[0] += table.tick
+        t0 = time.perf_counter()
+        table.expire()
+        idle.append(time.perf_counter() - t0)
+    report('expire() per tick, nothing due', idle)
+    sessions = list(table._sessions.values())
+
+    it = iter(sessions)
+
+    def hang_up():
+        session = next(it)
+        table.hang_up(session.caller, session.callee)
+
+    samples, elapsed = timed(hang_up, len(sessions))
+    report('hang_up()', samples, elapsed)
+    print(f'{"":<32} {len(ended)} sessions handed to on_end')
+
+    try:
+        import gevent
+    except ImportError:
+        return
+    gc.collect()
+    before, t0 = rss(), time.perf_counter()
+    timers = [gevent.spawn_later(args.ring_timeout, lambda: None) for _ in range(n)]
+    spawn = time.perf_counter() - t0
+    grown = rss() - before
+    print(f'{"one gevent timer per call":<32} {n} spawn_later(): {spawn * 1000:.0f}ms, '
+          f'RSS +{grown / 2 ** 20:.1f} MiB ({grown / n:.0f} B each)')
+    gevent.killall(timers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Bulk contact import/export vs one request per contact.
+
+    python benchmarks/bench_contacts_import.py --contacts 50000
+
+Generates a phone book (US numbers in assorted formats, with some
+duplicates and junk) as CSV and vCard. For app.py and TEST/app.py it then
+times --single per-contact requests (the old way; the total for the whole
+book is extrapolated), one bulk upload of the file, a re-upload (every row
+a duplicate), and the streaming exports.
+"""
+import argparse
+import io
+import random
+import time
+
+from werkzeug.security import generate_password_hash
+
+from _util import load_app, load_test_app, logged_in_client
+
+FORMATS = ['+1 {a} {e} {l}', '({a}) {e}-{l}', '{a}-{e}-{l}', '1{a}{e}{l}', '+1{a}{e}{l}']
+AREAS = [202, 212, 305, 312, 415, 512, 617, 702, 206, 303]
+
+
+def phone_book(n, seed=0):
+    rng = random.Random(seed)
+    book = []
+    for i in range(n):
+        roll = rng.random()
+        if roll < 0.02 and book:
+            book.append((f'Dup {i}', rng.choice(book)[1]))
+        elif roll < 0.03:
+            book.append((f'Junk {i}', 'n/a'))
+        else:
+            number = rng.choice(FORMATS).format(a=rng.choice(AREAS), e=rng.randint(201, 999),
+                                                l=f'{rng.randint(0, 9999):04d}')
+            book.append((f'Contact {i}', number))
+    return book
+
+
+def as_csv(book):
+    return ('name,phone\n' + ''.join(f'"{name}",{number}\n' for name, number in book)).encode()
+
+
+def as_vcard(book):
+    return ''.join(f'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:{name}\r\nTEL;TYPE=CELL:{number}\r\nEND:VCARD\r\n'
+                   for name, number in book).encode()
+
+
+def timed_once(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def line(label, seconds, detail=''):
+    print(f'{label:<44} {seconds * 1000:10.1f}ms  {detail}')
+
+
+def bench_app(book, single):
+    app_module = load_app()
+    client = logged_in_client(app_module, mobile='5550000001')
+    t0 = time.perf_counter()
+    for name, number in book[:single]:
+        client.post('/api/contacts', json={'name': name, 'mobile': number})
+    per = (time.perf_counter() - t0) / single
+    line(f'app.py POST /api/contacts x{single}', per * single,
+         f'{per * 1e3:.2f}ms each, ~{per * len(book):.1f}s for {len(book)}')
+
+    for fmt, body, mobile in (('csv', as_csv(book), '5550000002'), ('vcard', as_vcard(book), '5550000003')):
+        client = logged_in_client(app_module, mobile=mobile)
+        upload = lambda: client.post('/api/contacts/import', data={'file': (io.BytesIO(body), f'book.{fmt}')},
+                                     content_type='multipart/form-data').get_json()
+        seconds, result = timed_once(upload)
+        line(f'app.py bulk import, {fmt} ({len(body) / 2 ** 20:.1f} MiB)', seconds, result_summary(result))
+        seconds, result = timed_once(upload)
+        line(f'app.py re-import, {fmt}', seconds, result_summary(result))
+    for fmt in ('csv', 'vcf'):
+        seconds, resp = timed_once(lambda: client.get(f'/api/contacts/export?format={fmt}').get_data())
+        line(f'app.py export, {fmt}', seconds, f'{len(resp) / 2 ** 20:.1f} MiB')
+
+
+def bench_test_app(book, single):
+    test_module = load_test_app()
+    with test_module.app.app_context():
+        for i in range(2):
+            test_module.db.session.add(test_module.User(
+                name='Bench', mobile_number=f'+1202555010{i}', is_verified=True,
+                password_hash=generate_password_hash('x', method='pbkdf2:sha256:1000')))
+        test_module.db.session.commit()
+
+    def client_for(user_id):
+        client = test_module.app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user_id
+        return client
+
+    client = client_for(1)
+    t0 = time.perf_counter()
+    for name, number in book[:single]:
+        client.post('/add_contact', data={'contact_name': name, 'contact_mobile_number': number})
+    per = (time.perf_counter() - t0) / single
+    line(f'TEST /add_contact x{single}', per * single,
+         f'{per * 1e3:.2f}ms each, ~{per * len(book):.1f}s for {len(book)}')
+
+    client = client_for(2)
+    body = as_csv(book)
+    upload = lambda: client.post('/import_contacts', data={'contacts_file': (io.BytesIO(body), 'book.csv')},
+                                 content_type='multipart/form-data')
+    seconds, _ = timed_once(upload)
+    with test_module.app.app_context():
+        count = test_module.Contact.query.filter_by(user_id=2).count()
+    line('TEST bulk import, csv', seconds, f'{count} contacts stored')
+    seconds, _ = timed_once(upload)
+    line('TEST re-import, csv', seconds)
+    seconds, resp = timed_once(lambda: client.get('/export_contacts?format=vcf').get_data())
+    line('TEST export, vcf', seconds, f'{len(resp) / 2 ** 20:.1f} MiB')
+
+
+def result_summary(result):
+    return ', '.join(f'{k}={result[k]}' for k in ('imported', 'duplicates', 'invalid'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=50000)
+    parser.add_argument('--single', type=int, default=2000, help='per-contact requests to time')
+    args = parser.parse_args()
+
+    book = phone_book(args.contacts)
+    bench_app(book, args.single)
+    bench_test_app(book, args.single)
+
+
+if __name__ == '__main__':
+    main()
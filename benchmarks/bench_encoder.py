@@ -0,0 +1,68 @@
+"""Per-encode cost of ProfileEncoder vs the notebook's get_dummies path.
+
+    python benchmarks/bench_encoder.py --n 2000
+
+Runs build_model.verify_encoder() first, so the numbers are only printed
+for an encoder that is bit-identical to get_dummies + reindex.
+"""
+import argparse
+
+import numpy as np
+
+from _util import report, timed
+from build_model import verify_encoder
+from symptom_model import FEATURES, ProfileEncoder, SymptomClassifier
+
+PROFILE = {
+    'Fever': 'Yes', 'Cough': 'No', 'Fatigue': 'Yes', 'Difficulty Breathing': 'No',
+    'Age': 42, 'Gender': 'Male', 'Blood Pressure': 'High', 'Cholesterol Level': 'Normal'
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=2000)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    columns = SymptomClassifier.load().columns
+    print(f'parity: bit-identical on {verify_encoder(columns)} profiles')
+
+    def get_dummies_path():
+        df = pd.get_dummies(pd.DataFrame([PROFILE])[FEATURES])
+        return df.reindex(columns=columns, fill_value=0).to_numpy(dtype=np.float64)
+
+    index = {name: i for i, name in enumerate(columns)}
+
+    def column_name_path():
+        # The dict-of-column-names encoding the classifier used before ProfileEncoder
+        x = np.zeros(len(columns))
+        for feature in FEATURES:
+            value = PROFILE[feature]
+            if feature in index:
+                x[index[feature]] = float(value)
+            else:
+                x[index[f'{feature}_{value}']] = 1.0
+        return x
+
+    encoder = ProfileEncoder(columns)
+    buf = np.zeros(encoder.width)
+
+    def encoder_path():
+        buf.fill(0.0)
+        return encoder.encode_into(buf, PROFILE)
+
+    baseline = None
+    for name, fn in (('get_dummies + reindex', get_dummies_path),
+                     ('column-name dict lookup', column_name_path),
+                     ('ProfileEncoder.encode_into', encoder_path)):
+        samples, elapsed = timed(fn, args.n)
+        report(name, samples, elapsed)
+        per_call = elapsed / args.n
+        baseline = baseline or per_call
+        print(f'{"":<32} speedup vs get_dummies: {baseline / per_call:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
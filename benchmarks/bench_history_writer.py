@@ -0,0 +1,91 @@
+"""Signaling latency with synchronous vs write-behind call-history logging.
+
+    python benchmarks/bench_history_writer.py --calls 2000
+
+Drives TEST/app.py's call_user / answer_call / reject_call handlers (each
+logs a CallHistory row) and app.py's POST /api/call-history, first with a
+commit per row (the old behaviour) and then through HistoryWriter. The
+databases are files in a temp directory, so commits pay for a real sync.
+"""
+import argparse
+import time
+
+from _util import load_app, load_test_app, logged_in_client, report, verified_socket_client
+
+
+class SyncWriter:
+    """The old behaviour: one ORM insert and commit per logged call."""
+
+    def __init__(self, module):
+        self.module = module
+
+    def add(self, **row):
+        self.module.db.session.add(self.module.CallHistory(**row))
+        self.module.db.session.commit()
+        return True
+
+
+def drive_test_app(test_module, calls):
+    caller = verified_socket_client(test_module, '+12025550101')
+    callee = verified_socket_client(test_module, '+12025550102')
+    offer = {'type': 'offer', 'sdp': 'v=0'}
+    samples = {'call_user': [], 'answer_call': [], 'reject_call': []}
+    start = time.perf_counter()
+    for n in range(calls):
+        t0 = time.perf_counter()
+        caller.emit('call_user', {'target_number': '+12025550102', 'offer': offer})
+        samples['call_user'].append(time.perf_counter() - t0)
+        event = 'answer_call' if n % 2 else 'reject_call'
+        t0 = time.perf_counter()
+        callee.emit(event, {'caller_number': '+12025550101', 'answer': {'type': 'answer'}})
+        samples[event].append(time.perf_counter() - t0)
+        caller.get_received()
+        callee.get_received()
+    elapsed = time.perf_counter() - start
+    caller.disconnect()
+    callee.disconnect()
+    return samples, elapsed
+
+
+def count_rows(module):
+    with module.app.app_context():
+        return module.CallHistory.query.count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    args = parser.parse_args()
+
+    test_module = load_test_app()
+    writer = test_module.history_writer
+    for label, logger in (('sync commit', SyncWriter(test_module)), ('write-behind', writer)):
+        test_module.history_writer = logger
+        before = count_rows(test_module)
+        samples, elapsed = drive_test_app(test_module, args.calls)
+        for event, event_samples in samples.items():
+            report(f'TEST {event}, {label}', event_samples, elapsed)
+        if logger is writer:
+            test_module.socketio.sleep(writer.flush_interval * 2)
+            print(f'{"":<32} {writer.stats()}')
+        print(f'{"":<32} rows written: {count_rows(test_module) - before} (expected {args.calls * 2})')
+
+    app_module = load_app()
+    client = logged_in_client(app_module)
+    writer = app_module.history_writer
+    body = {'caller_mobile': '5550000001', 'receiver_mobile': '5550000002', 'duration': 42, 'status': 'outgoing'}
+    for label, logger in (('sync commit', SyncWriter(app_module)), ('write-behind', writer)):
+        app_module.history_writer = logger
+        samples = []
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            t0 = time.perf_counter()
+            assert client.post('/api/call-history', json=body).status_code in (201, 202)
+            samples.append(time.perf_counter() - t0)
+        report(f'POST /api/call-history, {label}', samples, time.perf_counter() - start)
+    writer.close()
+    print(f'{"":<32} {writer.stats()}')
+
+
+if __name__ == '__main__':
+    main()
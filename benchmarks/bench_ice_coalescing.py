@@ -0,0 +1,67 @@
+"""Frames saved and latency added by ICE candidate coalescing.
+
+    python benchmarks/bench_ice_coalescing.py --calls 200 --window-ms 20
+
+Each simulated call trickles candidates the way browsers do: a burst of
+host candidates, then server-reflexive ones after a STUN round trip, then
+the end-of-candidates marker. Reported per mode: frames delivered to the
+callee and the coalescer's added latency.
+"""
+import argparse
+import time
+
+from _util import load_app, registered_socket_client
+from ice_coalescer import IceCoalescer
+
+# (delay before the candidate in seconds, candidate count) per trickle phase
+TRICKLE = [(0.0, 8), (0.03, 6), (0.01, 4)]
+
+
+def run_calls(app_module, calls):
+    socketio = app_module.socketio
+    caller = registered_socket_client(app_module, '+15550000001')
+    callee = registered_socket_client(app_module, '+15550000002')
+    callee.get_received()
+
+    frames = candidates = 0
+    for _ in range(calls):
+        for delay, count in TRICKLE:
+            socketio.sleep(delay)
+            for i in range(count):
+                caller.emit('ice-candidate', {'target_mobile': '+15550000002',
+                                              'candidate': {'candidate': f'candidate:{i}', 'sdpMid': '0'}})
+        caller.emit('ice-candidate', {'target_mobile': '+15550000002', 'candidate': None})
+        socketio.sleep(0.001)
+        for packet in callee.get_received():
+            frames += 1
+            args = packet['args'][0]
+            candidates += len(args['candidates']) if packet['name'] == 'ice-candidates' else 1
+    caller.disconnect()
+    callee.disconnect()
+    return frames, candidates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--window-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    socketio = app_module.socketio
+    for label, coalescer in (('per-candidate relay', None),
+                             (f'coalesced, {args.window_ms:g}ms window',
+                              IceCoalescer(args.window_ms / 1000.0, app_module.flush_ice_candidates,
+                                           socketio.start_background_task, socketio.sleep))):
+        app_module.ice_coalescer = coalescer
+        start = time.perf_counter()
+        frames, candidates = run_calls(app_module, args.calls)
+        elapsed = time.perf_counter() - start
+        print(f'{label:<28} {candidates} candidates in {frames} frames '
+              f'({frames / args.calls:.1f} frames/call, {elapsed:.2f}s)')
+        if coalescer is not None:
+            print(f'{"":<28} {coalescer.stats()}')
+
+
+if __name__ == '__main__':
+    main()
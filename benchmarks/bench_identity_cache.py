@@ -0,0 +1,69 @@
+"""SQL statements and latency per authenticated request, with and without the identity cache.
+
+    python benchmarks/bench_identity_cache.py --requests 2000
+
+app.py: GET /api/contacts as a logged-in user (Flask-Login's user_loader
+runs on every request). TEST/app.py: GET /dashboard, and a full Socket.IO
+call (call_user, answer_call, --candidates ice_candidate relays, end_call)
+between two verified users. IDENTITY_CACHE_TTL=0 is the old behaviour of
+loading the user on every request.
+"""
+import argparse
+
+from _util import (StatementCounter, load_app, load_test_app, logged_in_client, report, timed,
+                   verified_socket_client)
+
+
+def measure(label, cache, counter, fn, n, ttl):
+    cache.ttl = ttl
+    fn()  # warm the cache
+    before = counter.count
+    samples, elapsed = timed(fn, n)
+    report(f'{label}, ttl={ttl:g}', samples, elapsed)
+    print(f'{"":<32} {(counter.count - before) / n:.2f} SQL statements per request')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--candidates', type=int, default=20)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    with app_module.app.app_context():
+        counter = StatementCounter(app_module.db.engine)
+    client = logged_in_client(app_module)
+    for ttl in (0, 30):
+        measure('app.py GET /api/contacts', app_module.identity_cache, counter,
+                lambda: client.get('/api/contacts'), args.requests, ttl)
+    print(f'{"":<32} {app_module.identity_cache.stats()}')
+
+    test_module = load_test_app()
+    with test_module.app.app_context():
+        counter = StatementCounter(test_module.db.engine)
+    caller = verified_socket_client(test_module, '+12025550101')
+    callee = verified_socket_client(test_module, '+12025550102')
+    http = test_module.app.test_client()
+    with http.session_transaction() as session:
+        session['user_id'] = 1
+
+    def call():
+        caller.emit('call_user', {'target_number': '+12025550102', 'offer': {'sdp': 'offer'}})
+        callee.emit('answer_call', {'caller_number': '+12025550101', 'answer': {'sdp': 'answer'}})
+        for i in range(args.candidates):
+            caller.emit('ice_candidate', {'target_number': '+12025550102', 'sender_number': '+12025550101',
+                                          'candidate': {'candidate': f'candidate:{i}'}})
+        caller.emit('end_call', {'target_number': '+12025550102'})
+        caller.get_received()
+        callee.get_received()
+
+    for ttl in (0, 30):
+        measure('TEST GET /dashboard', test_module.identity_cache, counter,
+                lambda: http.get('/dashboard'), args.requests, ttl)
+    test_module.history_writer.close()
+    measure(f'TEST call, {args.candidates} candidates', test_module.identity_cache, counter,
+            call, args.requests // 10, 30)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Exercise LLMClient against the local stub chat-completions server.
+
+    python benchmarks/bench_llm_client.py --callers 64 --delay 0.1
+
+Checks the properties the symptom checker relies on and prints the stub's
+view of the traffic:
+  * concurrent identical prompts are coalesced into one upstream call
+  * distinct prompts never exceed max_concurrency in flight upstream
+  * keep-alive connections are reused across sequential calls
+  * a call slower than its deadline raises LLMTimeout on time
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _util import report
+from llm_client import LLMClient, LLMTimeout
+from stub_llm import start_stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--callers', type=int, default=64)
+    parser.add_argument('--delay', type=float, default=0.1)
+    parser.add_argument('--max-concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    stub, base_url = start_stub(delay=args.delay)
+    client = LLMClient(base_url, 'stub', 'stub-model', max_concurrency=args.max_concurrency, timeout=30)
+    pool = ThreadPoolExecutor(args.callers)
+
+    def timed_call(prompt):
+        t0 = time.perf_counter()
+        client.complete(prompt)
+        return time.perf_counter() - t0
+
+    # Identical prompts: one upstream call shared by everyone
+    before = stub.requests
+    start = time.perf_counter()
+    samples = list(pool.map(timed_call, ['fever, cough'] * args.callers))
+    report('identical prompts', samples, time.perf_counter() - start)
+    print(f'{"":<32} upstream calls={stub.requests - before} coalesced={client.coalesced}')
+
+    # Distinct prompts: bounded by the semaphore
+    before = stub.requests
+    start = time.perf_counter()
+    samples = list(pool.map(timed_call, [f'symptom {i}' for i in range(args.callers)]))
+    report('distinct prompts', samples, time.perf_counter() - start)
+    print(f'{"":<32} upstream calls={stub.requests - before} '
+          f'max in flight at stub={stub.max_in_flight} (limit {args.max_concurrency})')
+
+    # Sequential calls ride the same keep-alive connection
+    stub.delay = 0.0
+    before = stub.connections
+    samples = []
+    for i in range(200):
+        samples.append(timed_call(f'sequential {i}'))
+    report('sequential, pooled client', samples)
+    print(f'{"":<32} new TCP connections={stub.connections - before}')
+
+    # Deadline shorter than the upstream delay
+    stub.delay = 1.0
+    t0 = time.perf_counter()
+    try:
+        client.complete('slow upstream', timeout=0.2)
+        print('deadline: NOT enforced')
+    except LLMTimeout as e:
+        print(f'deadline: LLMTimeout after {time.perf_counter() - t0:.3f}s (limit 0.2s): {e}')
+    print(f'client stats: {client.stats()}')
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Signaling latency during a login storm, bcrypt inline vs on the hash pool.
+
+    python benchmarks/bench_login_storm.py --logins 40 --concurrency 20 --rounds 12
+
+A probe greenlet relays an ice-candidate through the Socket.IO test client
+every 10ms and records how late each relay completes relative to its
+schedule, i.e. how long the gevent hub was unavailable. It runs alone,
+then while --concurrency greenlets perform --logins logins with bcrypt
+called inline on the hub (the old code), and then with hashing on
+PasswordHasher's native threads.
+"""
+import argparse
+import time
+
+import gevent
+
+from _util import load_app, percentile, registered_socket_client
+from hashing import PasswordHasher
+
+INTERVAL = 0.01
+
+
+def probe(app_module, stop, lags):
+    caller = registered_socket_client(app_module, '+15550000001')
+    callee = registered_socket_client(app_module, '+15550000002')
+    payload = {'target_mobile': '+15550000002', 'candidate': {'candidate': 'candidate:0', 'sdpMid': '0'}}
+    due = time.perf_counter() + INTERVAL
+    while not stop:
+        gevent.sleep(max(0.0, due - time.perf_counter()))
+        caller.emit('ice-candidate', payload)
+        lags.append(time.perf_counter() - due)
+        callee.get_received()
+        due += INTERVAL
+    caller.disconnect()
+    callee.disconnect()
+
+
+def login_storm(app_module, mobiles, logins, concurrency):
+    def one(i):
+        client = app_module.app.test_client()
+        for n in range(i, logins, concurrency):
+            resp = client.post('/login', json={'mobile': mobiles[n % len(mobiles)], 'password': 'bench-pass'})
+            assert resp.status_code == 200, resp.status_code
+    start = time.perf_counter()
+    gevent.joinall([gevent.spawn(one, i) for i in range(concurrency)])
+    return time.perf_counter() - start
+
+
+def run(app_module, label, storm):
+    stop, lags = [], []
+    prober = gevent.spawn(probe, app_module, stop, lags)
+    gevent.sleep(0.5)
+    elapsed = storm() if storm else (gevent.sleep(2.0) or None)
+    stop.append(True)
+    prober.join()
+    line = (f'{label:<28} probe lag p50={percentile(lags, 50) * 1000:7.2f}ms '
+            f'p99={percentile(lags, 99) * 1000:7.2f}ms max={max(lags) * 1000:7.2f}ms')
+    if elapsed:
+        line += f'  logins took {elapsed:.2f}s'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    app_module = load_app(BCRYPT_LOG_ROUNDS=str(args.rounds))
+    mobiles = [f'555{i:07d}' for i in range(args.concurrency)]
+    with app_module.app.app_context():
+        hashed = app_module.bcrypt.generate_password_hash('bench-pass', args.rounds).decode()
+        for mobile in mobiles:
+            app_module.db.session.add(app_module.User(name='Bench', mobile=mobile, password=hashed,
+                                                      account_type='patient'))
+        app_module.db.session.commit()
+
+    storm = lambda: login_storm(app_module, mobiles, args.logins, args.concurrency)
+    run(app_module, 'idle', None)
+    for label, workers in (('storm, bcrypt inline', 0), (f'storm, {args.workers} hash threads', args.workers)):
+        app_module.password_hasher = PasswordHasher(app_module.bcrypt, args.rounds, max_workers=workers)
+        run(app_module, label, storm)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Cost of the signaling metrics on the hot path.
+
+    python benchmarks/bench_metrics_overhead.py --events 20000
+
+Reports the raw cost of a counter increment and a histogram observation,
+the wrapper around an empty handler, an ice-candidate relay through the
+Socket.IO test client with and without instrumentation, and how long a
+/metrics scrape takes.
+"""
+import argparse
+import time
+
+from _util import load_app, logged_in_client, registered_socket_client, report, timed
+from metrics import Registry, timed as instrument
+
+
+def noop(data):
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=20000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.counter('bench_total', 'bench', ('event',)).labels('x')
+    histogram = registry.histogram('bench_seconds', 'bench', ('event',)).labels('x')
+    wrapped = instrument(histogram, counter)(noop)
+    for name, fn in (('counter.inc', counter.inc), ('histogram.observe', lambda: histogram.observe(0.0003)),
+                     ('bare handler', lambda: noop(None)), ('instrumented handler', lambda: wrapped(None))):
+        samples, elapsed = timed(fn, args.events)
+        report(name, samples, elapsed)
+
+    app_module = load_app(ICE_COALESCE_MS='0')
+    socketio = app_module.socketio
+    caller = registered_socket_client(app_module, '+15550000001')
+    callee = registered_socket_client(app_module, '+15550000002')
+    payload = {'target_mobile': '+15550000002', 'candidate': {'candidate': 'candidate:0', 'sdpMid': '0'}}
+
+    handler = app_module.on_ice_candidate
+    # Alternate so warm-up does not favour whichever variant runs second
+    for label, fn in (('ice-candidate relay, bare', handler.__wrapped__),
+                      ('ice-candidate relay, metrics', handler)) * 2:
+        socketio.on_event('ice-candidate', fn)
+        samples = []
+        start = time.perf_counter()
+        for i in range(args.events):
+            t0 = time.perf_counter()
+            caller.emit('ice-candidate', payload)
+            samples.append(time.perf_counter() - t0)
+            if i % 1000 == 0:
+                callee.get_received()
+        report(label, samples, time.perf_counter() - start)
+        callee.get_received()
+
+    client = logged_in_client(app_module)
+    samples, elapsed = timed(lambda: client.get('/metrics'), 200)
+    report('GET /metrics', samples, elapsed)
+    body = client.get('/metrics').get_data(as_text=True)
+    print(f'{"":<32} {len(body)} bytes, {body.count(chr(10))} lines')
+    for line in body.splitlines():
+        if line.startswith('signaling_handler_seconds_count') or line.startswith('signaling_online'):
+            print(f'{"":<32} {line}')
+
+
+if __name__ == '__main__':
+    main()
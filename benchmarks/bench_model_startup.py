@@ -0,0 +1,52 @@
+"""Worker cold-start cost: fitting from the CSV vs loading the .npz artifact.
+
+Each mode runs in a fresh interpreter so import time and peak RSS are those
+a new gunicorn worker would pay:
+
+    python build_model.py
+    python benchmarks/bench_model_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from _util import ROOT
+
+CHILD = r'''
+import json, resource, sys, time, warnings
+warnings.simplefilter('ignore')
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from symptom_model import SymptomClassifier
+model = SymptomClassifier.{mode}()
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed,
+                  'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  'pandas': 'pandas' in sys.modules, 'sklearn': 'sklearn' in sys.modules}}))
+'''
+
+
+def run(mode):
+    out = subprocess.check_output([sys.executable, '-c', CHILD.format(root=ROOT, mode=mode)])
+    return json.loads(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+    if not os.path.exists(os.path.join(ROOT, 'models', 'symptom_classifier.npz')):
+        sys.exit('Run build_model.py first.')
+
+    for mode in ('train', 'load'):
+        results = [run(mode) for _ in range(args.runs)]
+        seconds = sorted(r['seconds'] for r in results)[len(results) // 2]
+        rss = sorted(r['maxrss_mb'] for r in results)[len(results) // 2]
+        print(f'{mode:<6} median startup {seconds * 1000:8.1f}ms  peak RSS {rss:6.1f}MB  '
+              f'pandas={results[0]["pandas"]} sklearn={results[0]["sklearn"]}')
+
+
+if __name__ == '__main__':
+    main()
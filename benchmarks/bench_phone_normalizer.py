@@ -0,0 +1,82 @@
+"""Per-call cost of E.164 normalization with and without the memo cache.
+
+    python benchmarks/bench_phone_normalizer.py --calls 50000
+
+Workload: numbers drawn from a skewed population (a user's own number and
+frequent contacts recur, most numbers are rare), written in a few common
+formats. Also times normalize_many() on a 1000-number list, and a cold
+pass where every number is new.
+"""
+import argparse
+import random
+import time
+
+import phonenumbers
+
+from _util import report, timed
+from phone_normalizer import PhoneNormalizer
+
+
+def uncached(number, region='US'):
+    # format_phone_number() before memoization
+    try:
+        parsed = phonenumbers.parse(number, region)
+        if not phonenumbers.is_valid_number(parsed):
+            return None
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+    except phonenumbers.NumberParseException:
+        return None
+
+
+def population(n, seed=0):
+    rng = random.Random(seed)
+    formats = ['+1 {a} {e} {l}', '({a}) {e}-{l}', '{a}-{e}-{l}', '+1{a}{e}{l}']
+    return [rng.choice(formats).format(a=rng.choice([202, 212, 415, 617]), e=rng.randint(201, 999),
+                                       l=f'{rng.randint(0, 9999):04d}') for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=50000)
+    parser.add_argument('--population', type=int, default=5000)
+    args = parser.parse_args()
+
+    numbers = population(args.population)
+    rng = random.Random(1)
+    # Zipf-like: low indexes (frequent contacts) dominate
+    workload = [numbers[min(int(rng.paretovariate(1.2)) - 1, len(numbers) - 1)] for _ in range(args.calls)]
+
+    it = iter(workload)
+    samples, elapsed = timed(lambda: uncached(next(it)), len(workload))
+    report('uncached phonenumbers', samples, elapsed)
+
+    normalizer = PhoneNormalizer('US')
+    it = iter(workload)
+    samples, elapsed = timed(lambda: normalizer.normalize(next(it)), len(workload))
+    report('PhoneNormalizer.normalize', samples, elapsed)
+    print(f'{"":<32} {normalizer.stats()}')
+
+    hit = workload[0]
+    samples, elapsed = timed(lambda: normalizer.normalize(hit), len(workload))
+    report('PhoneNormalizer, cache hit', samples, elapsed)
+
+    cold = PhoneNormalizer('US')
+    it = iter(population(args.calls, seed=2))
+    samples, elapsed = timed(lambda: cold.normalize(next(it)), args.calls)
+    report('PhoneNormalizer, all misses', samples, elapsed)
+
+    batch = workload[:1000]
+    t0 = time.perf_counter()
+    [uncached(n) for n in batch]
+    print(f'{"list of 1000, uncached":<32} {(time.perf_counter() - t0) * 1000:8.2f}ms')
+    fresh = PhoneNormalizer('US')
+    t0 = time.perf_counter()
+    fresh.normalize_many(batch)
+    print(f'{"normalize_many(1000), cold":<32} {(time.perf_counter() - t0) * 1000:8.2f}ms')
+    t0 = time.perf_counter()
+    fresh.normalize_many(batch)
+    print(f'{"normalize_many(1000), warm":<32} {(time.perf_counter() - t0) * 1000:8.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Connect/disconnect storms: bare dict + linear scan vs PresenceRegistry.
+
+    python benchmarks/bench_presence.py --users 10000 50000
+
+For each population size, N users register, then a storm disconnects and
+reconnects a random 10% of them. The old handlers scanned the dict for the
+disconnecting sid and printed the whole dict on every event; the printing
+is left out here, so the baseline is, if anything, flattered.
+"""
+import argparse
+import random
+import time
+
+from _util import ROOT  # noqa: F401  (puts the repo root on sys.path)
+from presence import PresenceRegistry
+
+
+class DictPresence:
+    """The previous `online_users = {}` handling from app.py."""
+
+    def __init__(self):
+        self.users = {}
+
+    def add(self, mobile, sid):
+        self.users[mobile] = sid
+
+    def remove_sid(self, sid):
+        for mobile, s in list(self.users.items()):
+            if s == sid:
+                del self.users[mobile]
+                return mobile
+        return None
+
+
+def storm(registry, users, churn, seed=0):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    for i in range(users):
+        registry.add(f'+1555{i:07d}', f'sid-{i}')
+    connect = time.perf_counter() - start
+
+    victims = rng.sample(range(users), churn)
+    start = time.perf_counter()
+    for i in victims:
+        registry.remove_sid(f'sid-{i}')
+    for i in victims:
+        registry.add(f'+1555{i:07d}', f'sid-{i}-again')
+    return connect, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--churn', type=float, default=0.1, help='fraction of users that reconnect')
+    args = parser.parse_args()
+
+    for users in args.users:
+        churn = max(1, int(users * args.churn))
+        for registry in (DictPresence(), PresenceRegistry()):
+            connect, reconnect = storm(registry, users, churn)
+            print(f'{users:>7} users  {type(registry).__name__:<16} connect {connect * 1e6 / users:7.2f}us/op  '
+                  f'disconnect+reconnect {reconnect * 1e6 / churn:10.2f}us/op  ({churn} sockets)')
+        print(f'{"":>14}registry stats: {registry.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Presence fan-out per connect/disconnect: global broadcast vs contact rooms.
+
+    python benchmarks/bench_presence_fanout.py --users 10000 50000 --contacts 50
+
+Drives python-socketio's own room manager (the one Flask-SocketIO uses)
+with --users connected sockets. Engine.IO's send_packet is replaced by a
+counter, so the figures are the packets queued and the server-side time to
+build and address them, without any network I/O.
+
+With everyone online, --churn random users disconnect and reconnect (a
+page reload) and each event is timed:
+
+  broadcast  the old TEST handlers: user_status to every client, and the
+             full list of online users to the newcomer
+  rooms      each socket joins presence:<number> for its --contacts
+             contacts, status goes to that room, and the newcomer gets only
+             its online contacts
+
+Disconnect time includes python-socketio's own room cleanup, which walks
+every room in the namespace (each socket has a room of its own) whichever
+way presence is published.
+"""
+import argparse
+import random
+import time
+
+import socketio
+
+from _util import percentile
+from presence import presence_room
+
+
+def make_server():
+    server = socketio.Server(async_mode='threading')
+    sent = [0]
+
+    def send_packet(eio_sid, pkt):
+        sent[0] += 1
+
+    server.eio.send_packet = send_packet
+    return server, sent
+
+
+class Population:
+    def __init__(self, users, contacts, seed=0):
+        rng = random.Random(seed)
+        self.mobiles = [f'+1202{i:07d}' for i in range(users)]
+        self.contacts = [rng.sample(self.mobiles, contacts) for _ in range(users)]
+
+
+def connect_broadcast(server, online, sids, mobile, contacts):
+    sid = server.manager.connect(f'eio-{mobile}', '/')
+    sids[mobile] = sid
+    online.add(mobile)
+    server.emit('user_status', {'mobile_number': mobile, 'status': 'online'}, namespace='/')
+    server.emit('online_users_list', [{'mobile_number': m, 'status': 'online'} for m in online],
+                to=sid, namespace='/')
+
+
+def disconnect_broadcast(server, online, sids, mobile):
+    server.manager.disconnect(sids.pop(mobile), '/')
+    online.discard(mobile)
+    server.emit('user_status', {'mobile_number': mobile, 'status': 'offline'}, namespace='/')
+
+
+def connect_rooms(server, online, sids, mobile, contacts):
+    sid = server.manager.connect(f'eio-{mobile}', '/')
+    sids[mobile] = sid
+    for number in contacts:
+        server.enter_room(sid, presence_room(number), namespace='/')
+    online.add(mobile)
+    server.emit('user_status', {'mobile_number': mobile, 'status': 'online'}, to=presence_room(mobile),
+                namespace='/')
+    server.emit('online_users_list', [{'mobile_number': m, 'status': 'online'} for m in contacts if m in online],
+                to=sid, namespace='/')
+
+
+def disconnect_rooms(server, online, sids, mobile):
+    server.manager.disconnect(sids.pop(mobile), '/')
+    online.discard(mobile)
+    server.emit('user_status', {'mobile_number': mobile, 'status': 'offline'}, to=presence_room(mobile),
+                namespace='/')
+
+
+def run(label, population, connect, disconnect, churn, seed=1):
+    server, sent = make_server()
+    online, sids = set(), {}
+    t0 = time.perf_counter()
+    if connect is connect_rooms:
+        for mobile, contacts in zip(population.mobiles, population.contacts):
+            connect(server, online, sids, mobile, contacts)
+        warmup = time.perf_counter() - t0
+    else:
+        # Bringing 50k users up one broadcast at a time is O(N^2); seed the
+        # manager directly and measure the steady state only
+        for mobile in population.mobiles:
+            sids[mobile] = server.manager.connect(f'eio-{mobile}', '/')
+            online.add(mobile)
+        warmup = None
+
+    rng = random.Random(seed)
+    gone, joined, packets = [], [], 0
+    for _ in range(churn):
+        i = rng.randrange(len(population.mobiles))
+        mobile = population.mobiles[i]
+        before = sent[0]
+        t0 = time.perf_counter()
+        disconnect(server, online, sids, mobile)
+        t1 = time.perf_counter()
+        connect(server, online, sids, mobile, population.contacts[i])
+        joined.append(time.perf_counter() - t1)
+        gone.append(t1 - t0)
+        packets += sent[0] - before
+
+    print(f'  {label:<10} {packets / churn / 2:9.1f} packets/event  '
+          f'connect p50={percentile(joined, 50) * 1000:8.3f}ms p99={percentile(joined, 99) * 1000:8.3f}ms  '
+          f'disconnect p50={percentile(gone, 50) * 1000:8.3f}ms'
+          + (f'  (initial join of all {len(sids)}: {warmup:.1f}s)' if warmup is not None else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--contacts', type=int, default=50)
+    parser.add_argument('--churn', type=int, default=200, help='reloads to time at steady state')
+    args = parser.parse_args()
+
+    for users in args.users:
+        population = Population(users, args.contacts)
+        print(f'{users} users online, {args.contacts} contacts each:')
+        run('broadcast', population, connect_broadcast, disconnect_broadcast, args.churn)
+        run('rooms', population, connect_rooms, disconnect_rooms, args.churn)
+
+
+if __name__ == '__main__':
+    main()
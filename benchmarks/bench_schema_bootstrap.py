@@ -0,0 +1,96 @@
+"""TEST/app.py /login and /dashboard before and after the schema bootstrap.
+
+    python benchmarks/bench_schema_bootstrap.py --users 20000 --history-rows 500000
+
+"Before" re-creates the old setup: db.create_all() in a before_request hook
+and no indexes on contact / call_history. "After" is the startup-time
+migration path with its indexes. The benchmark user has --contacts
+contacts and a share of the seeded call history; its password uses a
+cheap pbkdf2 hash so the hash check does not swamp the request overhead.
+"""
+import argparse
+import random
+import sqlite3
+
+from werkzeug.security import generate_password_hash
+
+from _util import load_test_app, report, timed
+
+MOBILE = '+12025550101'
+PASSWORD = 'bench-pass'
+
+
+def seed(test_module, users, contacts, history_rows):
+    rng = random.Random(0)
+    with test_module.app.app_context():
+        path = test_module.db.engine.url.database
+    conn = sqlite3.connect(path)
+    conn.execute('INSERT INTO user (name, mobile_number, password_hash, is_verified) VALUES (?, ?, ?, 1)',
+                 ('Bench', MOBILE, generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')))
+    user_id = conn.execute('SELECT id FROM user WHERE mobile_number = ?', (MOBILE,)).fetchone()[0]
+    conn.executemany('INSERT INTO user (name, mobile_number, password_hash, is_verified) VALUES (?, ?, ?, 1)',
+                     ((f'User {i}', f'+1303555{i:04d}{i // 10000}', 'x') for i in range(users)))
+    conn.executemany('INSERT INTO contact (user_id, name, mobile_number) VALUES (?, ?, ?)',
+                     ((user_id if i < contacts else rng.randint(user_id + 1, user_id + users),
+                       f'Contact {rng.random():.6f}', f'+1415555{i % 10000:04d}') for i in range(contacts * 50)))
+    conn.executemany('INSERT INTO call_history (user_id, contact_number, call_type, timestamp) VALUES (?, ?, ?, ?)',
+                     ((user_id if i % 100 == 0 else rng.randint(user_id + 1, user_id + users),
+                       f'+1415555{i % 10000:04d}', rng.choice(('outgoing', 'incoming', 'missed')),
+                       f'2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}:00')
+                      for i in range(history_rows)))
+    conn.commit()
+    conn.close()
+
+
+def run(test_module, label, requests):
+    client = test_module.app.test_client()
+    samples, elapsed = timed(lambda: client.get('/login'), requests)
+    report(f'GET /login, {label}', samples, elapsed)
+
+    def login():
+        client.get('/logout')
+        resp = client.post('/login', data={'mobile_number': MOBILE, 'password': PASSWORD})
+        assert resp.status_code == 302, resp.status_code
+    samples, elapsed = timed(login, requests)
+    report(f'POST /login, {label}', samples, elapsed)
+
+    def dashboard():
+        assert client.get('/dashboard').status_code == 200
+    samples, elapsed = timed(dashboard, requests)
+    report(f'GET /dashboard, {label}', samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--contacts', type=int, default=200)
+    parser.add_argument('--history-rows', type=int, default=500000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    test_module = load_test_app()
+    seed(test_module, args.users, args.contacts, args.history_rows)
+    db = test_module.db
+    indexes = [index for model in (test_module.Contact, test_module.CallHistory)
+               for index in model.__table__.indexes]
+
+    # Before: per-request create_all and no indexes. Hooks can only be added
+    # before the first request, so this runs first.
+    with test_module.app.app_context():
+        for index in indexes:
+            index.drop(db.engine)
+
+    def create_tables():
+        db.create_all()
+    test_module.app.before_request(create_tables)
+    run(test_module, 'before', args.requests)
+
+    test_module.app.before_request_funcs[None].remove(create_tables)
+    with test_module.app.app_context():
+        for index in indexes:
+            index.create(db.engine)
+    run(test_module, 'after', args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Cross-worker call setup through the Redis message queue.
+
+    python benchmarks/bench_signaling_cluster.py --workers 3 --calls 200
+    python benchmarks/bench_signaling_cluster.py --redis-url redis://localhost:6379/0
+
+Starts N app.py processes sharing one Redis (a real server if --redis-url is
+given, otherwise fakeredis' TCP server in a subprocess) and one SQLite file.
+Callers and callees are connected to *different* workers, so every
+call-user / answer-call has to be routed by the presence backend and the
+Socket.IO message queue. Reports call-setup latency: call-user sent ->
+incoming-call received, and call-user sent -> call-answered received.
+With --workers 1 the same run gives the single-process baseline.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import socketio
+
+from _util import ROOT, free_port, percentile, session_cookie, wait_for_port
+
+FAKEREDIS_SERVER = '''
+import sys
+from fakeredis import TcpFakeServer
+server = TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis')
+server.serve_forever()
+'''
+
+
+def start_workers(n, redis_url, db_path):
+    ports, procs = [], []
+    for _ in range(n):
+        port = free_port()
+        env = dict(os.environ, PORT=str(port), FLASK_DEBUG='0', DATABASE_URL=f'sqlite:///{db_path}',
+                   BCRYPT_LOG_ROUNDS='4')
+        if redis_url:
+            env['SOCKETIO_MESSAGE_QUEUE'] = redis_url
+        procs.append(subprocess.Popen([sys.executable, os.path.join(ROOT, 'app.py')], env=env, cwd=ROOT,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        ports.append(port)
+    for port in ports:
+        wait_for_port(port)
+    return ports, procs
+
+
+class Peer:
+    def __init__(self, port, mobile):
+        self.mobile = mobile
+        self.client = socketio.Client()
+        self.events = {}
+        self.registered = threading.Event()
+        for name in ('incoming-call', 'call-answered', 'call-failed'):
+            self.client.on(name, self._recorder(name))
+        url = f'http://127.0.0.1:{port}'
+        # Registering needs a logged-in session; any worker accepts it
+        self.client.connect(url, headers={'Cookie': session_cookie(url, mobile)}, transports=['websocket'])
+        self.client.emit('register', {'mobile': mobile}, callback=None)
+
+    def _recorder(self, name):
+        def record(data):
+            self.events[name] = (time.perf_counter(), data)
+            if name == 'incoming-call':
+                # Answer straight away, as a browser would after the click
+                self.client.emit('answer-call', {'target_mobile': data['from'], 'answer': {'type': 'answer'}})
+        return record
+
+    def wait_for(self, name, timeout):
+        deadline = time.perf_counter() + timeout
+        while name not in self.events and time.perf_counter() < deadline:
+            time.sleep(0.0005)
+        return self.events.pop(name, (None, None))[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--pairs', type=int, default=10)
+    parser.add_argument('--redis-url', help='use this Redis instead of a fakeredis subprocess')
+    args = parser.parse_args()
+
+    procs = []
+    redis_url = args.redis_url
+    if not redis_url and args.workers > 1:
+        port = free_port()
+        procs.append(subprocess.Popen([sys.executable, '-c', FAKEREDIS_SERVER, str(port)]))
+        wait_for_port(port)
+        redis_url = f'redis://127.0.0.1:{port}/0'
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-cluster-'), 'cluster.db')
+    ports, workers = start_workers(args.workers, redis_url, db_path)
+    procs.extend(workers)
+    try:
+        peers = []
+        for i in range(args.pairs):
+            caller = Peer(ports[i % len(ports)], f'+1555100{i:04d}')
+            callee = Peer(ports[(i + 1) % len(ports)], f'+1555200{i:04d}')
+            peers.append((caller, callee))
+        time.sleep(1.0)  # let registrations land in the shared registry
+
+        ring, setup, dropped = [], [], 0
+        for n in range(args.calls):
+            caller, callee = peers[n % len(peers)]
+            t0 = time.perf_counter()
+            caller.client.emit('call-user', {'caller_mobile': caller.mobile, 'target_mobile': callee.mobile,
+                                             'offer': {'type': 'offer'}})
+            rang = callee.wait_for('incoming-call', 5)
+            answered = caller.wait_for('call-answered', 5)
+            if rang is None or answered is None:
+                dropped += 1
+                continue
+            ring.append(rang - t0)
+            setup.append(answered - t0)
+
+        label = f'{args.workers} worker(s)' + (' via Redis' if redis_url else '')
+        print(f'{label}: {len(setup)} calls, {dropped} dropped')
+        for name, samples in (('call-user -> incoming-call', ring), ('call-user -> call-answered', setup)):
+            print(f'  {name:<28} p50={percentile(samples, 50) * 1000:7.2f}ms '
+                  f'p99={percentile(samples, 99) * 1000:7.2f}ms')
+        for caller, callee in peers:
+            caller.client.disconnect()
+            callee.client.disconnect()
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Concurrent read/write throughput per SQLite profile.
+
+    python benchmarks/bench_sqlite_profile.py --workers 8 --seconds 10
+
+Starts --workers processes (think gunicorn workers) against one database
+file. Each logs in its own user and loops over a mix of GET /api/contacts
+(reads) and POST /api/contacts (writes, one commit each) for --seconds.
+Reported per profile: read and write throughput, p99 latency, and requests
+that failed with "database is locked".
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from _util import percentile
+
+
+def worker(url, profile, index, seconds, write_ratio, out_path, barrier):
+    from _util import load_app, logged_in_client
+    app_module = load_app(DATABASE_URL=url, SQLITE_PROFILE=profile)
+    client = logged_in_client(app_module, mobile=f'555{index:07d}')
+    rng = random.Random(index)
+    reads, writes, errors = [], [], 0
+    barrier.wait()  # start measuring only once every worker has booted
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        if rng.random() < write_ratio:
+            resp = client.post('/api/contacts', json={'name': f'Contact {rng.random()}',
+                                                      'mobile': f'+1555{rng.randint(0, 10 ** 7):07d}'})
+            samples = writes
+        else:
+            resp = client.get('/api/contacts')
+            samples = reads
+        if resp.status_code >= 500:
+            errors += 1
+        else:
+            samples.append(time.perf_counter() - t0)
+    # A file rather than a multiprocessing.Queue: its feeder thread is a
+    # greenlet once gevent has patched the child, and can hang at exit
+    with open(out_path, 'w') as f:
+        json.dump([reads, writes, errors], f)
+
+
+def init_db(url, profile):
+    from _util import load_app
+    load_app(DATABASE_URL=url, SQLITE_PROFILE=profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    for profile in ('legacy', 'wal'):
+        workdir = tempfile.mkdtemp(prefix=f'bench-{profile}-')
+        url = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+        # Create the schema once so the workers do not race on CREATE TABLE
+        init = ctx.Process(target=init_db, args=(url, profile))
+        init.start()
+        init.join()
+
+        outputs = [os.path.join(workdir, f'worker-{i}.json') for i in range(args.workers)]
+        barrier = ctx.Barrier(args.workers)
+        procs = [ctx.Process(target=worker, args=(url, profile, i, args.seconds, args.write_ratio, out, barrier))
+                 for i, out in enumerate(outputs)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        reads, writes, errors = [], [], 0
+        for out in outputs:
+            with open(out) as f:
+                r, w, e = json.load(f)
+            reads += r
+            writes += w
+            errors += e
+        print(f'{profile:<7} {args.workers} workers: '
+              f'reads {len(reads) / args.seconds:8.0f}/s p99={percentile(reads, 99) * 1000:7.2f}ms  '
+              f'writes {len(writes) / args.seconds:7.0f}/s p99={percentile(writes, 99) * 1000:7.2f}ms  '
+              f'locked errors {errors}')
+
+
+if __name__ == '__main__':
+    main()
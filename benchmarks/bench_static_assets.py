@@ -0,0 +1,96 @@
+"""First- and repeat-visit bytes and modelled time-to-interactive, plain vs built static assets.
+
+    python benchmarks/bench_static_assets.py --rtt-ms 150 --mbps 1.6
+
+A copy of static/ is served by app.py twice: as it is (Flask's own static
+view, as before build_assets.py) and after assets.build(). For /login and
+a logged-in /dashboard, a visit fetches the page and every /static URL it
+references, with Accept-Encoding: gzip, br. On the repeat visit the browser
+already holds each file:
+
+  plain  revalidates each one with If-None-Match (Flask sends an ETag but
+         no max-age) and gets 304s
+  built  sends nothing for them: the hashed URLs are immutable
+
+Time-to-interactive is modelled, not measured in a browser: one round trip
+plus transfer for the page, then the assets over --connections parallel
+connections, one round trip per batch plus their transfer at --mbps. The
+service worker can make a repeat visit faster still; it is not modelled.
+"""
+import argparse
+import math
+import os
+import re
+import shutil
+import tempfile
+
+from _util import load_app, logged_in_client, wire_bytes
+
+STATIC_URL = re.compile(r'(?:href|src)="(/static/[^"]+)"')
+ACCEPT = {'Accept-Encoding': 'gzip, br'}
+
+
+def visit(client, page, cached=None):
+    """Fetch a page and its static files; returns (requests, bytes, asset etags)."""
+    html = client.get(page, headers=ACCEPT)
+    requests, sent, etags = 1, wire_bytes(html), {}
+    for url in STATIC_URL.findall(html.get_data(as_text=True)):
+        if cached is not None and url in cached:
+            if cached[url] is None:
+                continue  # fresh in the browser cache: no request at all
+            response = client.get(url, headers={**ACCEPT, 'If-None-Match': cached[url]})
+        else:
+            response = client.get(url, headers=ACCEPT)
+        requests += 1
+        sent += wire_bytes(response)
+        immutable = 'immutable' in response.headers.get('Cache-Control', '')
+        etags[url] = None if immutable else response.headers.get('ETag')
+        response.close()
+    return requests, sent, etags
+
+
+def tti(requests, sent, rtt, bytes_per_second, connections):
+    if requests == 0:
+        return 0.0
+    batches = math.ceil((requests - 1) / connections)
+    return (1 + batches) * rtt + sent / bytes_per_second
+
+
+def run(label, client, pages, args):
+    rtt, bandwidth = args.rtt_ms / 1000, args.mbps * 1e6 / 8
+    for page in pages:
+        first = visit(client, page)
+        repeat = visit(client, page, first[2])
+        for name, (requests, sent, _) in (('first visit', first), ('repeat visit', repeat)):
+            print(f'  {label:<6} {page:<11} {name:<13} {requests:>2} requests {sent:>8,} B  '
+                  f'TTI ~{tti(requests, sent, rtt, bandwidth, args.connections) * 1000:6.0f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rtt-ms', type=float, default=150)
+    parser.add_argument('--mbps', type=float, default=1.6)
+    parser.add_argument('--connections', type=int, default=6)
+    args = parser.parse_args()
+
+    import assets
+    app_module = load_app()
+    app = app_module.app
+    static = os.path.join(tempfile.mkdtemp(prefix='bench-static-'), 'static')
+    shutil.copytree(app.static_folder, static, ignore=shutil.ignore_patterns(assets.DIST))
+    app.static_folder = static
+    client = logged_in_client(app_module)
+    pages = ['/login', '/dashboard']
+    print(f'{args.rtt_ms:g} ms RTT, {args.mbps:g} Mbit/s, {args.connections} connections '
+          f'(brotli {"available" if assets.brotli else "not installed: gzip only"}):')
+
+    app.extensions['assets'] = assets.AssetManifest(static, app.static_url_path)
+    run('plain', client, pages, args)
+    assets.build(static, app.static_url_path)
+    app.extensions['assets'] = assets.AssetManifest(static, app.static_url_path)
+    run('built', client, pages, args)
+    app_module.history_writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Scoring an intake sheet: per-row paths vs one vectorized batch.
+
+    python benchmarks/bench_symptom_batch.py --rows 1000
+
+Compares the notebook's per-row DataFrame + get_dummies + reindex flow,
+a loop over SymptomClassifier.predict(), predict_batch(), and the
+/api/symptom-Checker/batch endpoint (JSON and NDJSON bodies).
+"""
+import argparse
+import json
+import random
+import time
+
+from _util import load_app, logged_in_client
+from symptom_model import FEATURES
+
+
+def random_profiles(n, seed=0):
+    rng = random.Random(seed)
+    yes_no = ['Yes', 'No']
+    return [{
+        'Fever': rng.choice(yes_no), 'Cough': rng.choice(yes_no), 'Fatigue': rng.choice(yes_no),
+        'Difficulty Breathing': rng.choice(yes_no), 'Age': rng.randint(18, 90),
+        'Gender': rng.choice(['Male', 'Female']), 'Blood Pressure': rng.choice(['Low', 'Normal', 'High']),
+        'Cholesterol Level': rng.choice(['Low', 'Normal', 'High'])
+    } for _ in range(n)]
+
+
+def clock(name, rows, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f'{name:<36} {elapsed * 1000:9.2f}ms total  {elapsed / rows * 1e6:9.2f}us/row')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    app_module = load_app()
+    client = logged_in_client(app_module)
+    model = app_module.symptom_classifier
+    profiles = random_profiles(args.rows)
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    if pd is not None:
+        columns = model.columns
+
+        def notebook_rows():
+            for profile in profiles:
+                user_df = pd.get_dummies(pd.DataFrame([profile])[FEATURES])
+                X = user_df.reindex(columns=columns, fill_value=0).to_numpy(dtype=float)
+                model.scores(X)
+        clock('per-row DataFrame (notebook)', args.rows, notebook_rows)
+
+    clock('per-row predict()', args.rows, lambda: [model.predict(p) for p in profiles])
+    clock('predict_batch()', args.rows, lambda: model.predict_batch(profiles))
+
+    body = json.dumps(profiles)
+    ndjson = '\n'.join(json.dumps(p) for p in profiles)
+
+    def post(data, content_type):
+        resp = client.post('/api/symptom-Checker/batch', data=data, content_type=content_type)
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+    clock('endpoint, JSON list', args.rows, lambda: post(body, 'application/json'))
+    clock('endpoint, NDJSON', args.rows, lambda: post(ndjson, 'application/x-ndjson'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Symptom result cache: lookup cost per backend and end-to-end effect.
+
+    python benchmarks/bench_symptom_cache.py --requests 500 --llm-delay 0.1
+
+Replays a skewed workload of symptom strings (a few common ones, a long
+tail of rare ones, in varying order and case) against the endpoint with a
+stub LLM, once per cache backend.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from _util import load_app, logged_in_client, patch_gevent, report, timed
+from cache import MemoryCache, SQLiteCache, symptom_cache_key
+from stub_llm import start_stub
+
+COMMON = ['fever, cough', 'headache', 'sore throat, fever', 'fatigue, cough, fever', 'rash']
+
+
+def workload(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        if rng.random() < 0.8:
+            parts = rng.choice(COMMON).split(', ')
+            rng.shuffle(parts)
+            yield (', '.join(parts)).upper() if rng.random() < 0.2 else ', '.join(parts)
+        else:
+            yield f'rare symptom {rng.randint(0, 10 ** 6)}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--llm-delay', type=float, default=0.1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-cache-')
+    for cache in (MemoryCache(1024, 3600), SQLiteCache(os.path.join(workdir, 'micro.db'), 1024, 3600)):
+        key = symptom_cache_key('fever, cough')
+        cache.set(key, 'Influenza')
+        samples, elapsed = timed(lambda: cache.get(key), 5000)
+        report(f'{type(cache).__name__}.get (hit)', samples, elapsed)
+
+    patch_gevent()
+    stub, base_url = start_stub(delay=args.llm_delay)
+    app_module = load_app(OPENROUTER_BASE_URL=base_url, OPENROUTER_API_KEY='stub')
+    client = logged_in_client(app_module)
+    prompts = list(workload(args.requests))
+
+    for backend in ('none', 'memory', 'sqlite'):
+        app_module.symptom_cache = (None if backend == 'none' else
+                                    MemoryCache(1024, 3600) if backend == 'memory' else
+                                    SQLiteCache(os.path.join(workdir, 'endpoint.db'), 1024, 3600))
+        upstream_before = stub.requests
+        samples = []
+        start = time.perf_counter()
+        for symptoms in prompts:
+            t0 = time.perf_counter()
+            resp = client.post('/api/symptom-Checker', json={'symptoms': symptoms})
+            assert resp.status_code == 200
+            samples.append(time.perf_counter() - t0)
+        report(f'endpoint, cache={backend}', samples, time.perf_counter() - start)
+        stats = app_module.symptom_cache.stats() if app_module.symptom_cache else {}
+        print(f'{"":<32} upstream calls={stub.requests - upstream_before} {stats}')
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Compare the classifier and LLM paths of /api/symptom-Checker.
+
+The LLM path is pointed at benchmarks/stub_llm.py so the numbers measure our
+own overhead plus a fixed, configurable upstream delay rather than
+OpenRouter's mood of the day:
+
+    python benchmarks/bench_symptom_checker.py --requests 2000 --llm-delay 0.2
+"""
+import argparse
+import os
+
+from _util import load_app, logged_in_client, patch_gevent, report, timed
+from stub_llm import start_stub
+
+PROFILE = {
+    'Fever': 'Yes', 'Cough': 'Yes', 'Fatigue': 'No', 'Difficulty Breathing': 'No',
+    'Age': 30, 'Gender': 'Female', 'Blood Pressure': 'Normal', 'Cholesterol Level': 'Normal'
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--llm-requests', type=int, default=50)
+    parser.add_argument('--llm-delay', type=float, default=0.2, help='stub upstream latency, seconds')
+    args = parser.parse_args()
+
+    patch_gevent()
+    stub, base_url = start_stub(delay=args.llm_delay)
+    app_module = load_app(OPENROUTER_BASE_URL=base_url, OPENROUTER_API_KEY='stub')
+    client = logged_in_client(app_module)
+    classifier = app_module.symptom_classifier
+
+    samples, elapsed = timed(lambda: classifier.predict(PROFILE), args.requests)
+    report('classifier.predict (in-process)', samples, elapsed)
+
+    def classifier_request():
+        resp = client.post('/api/symptom-Checker', json={'profile': PROFILE})
+        assert resp.status_code == 200
+    samples, elapsed = timed(classifier_request, args.requests)
+    report('endpoint, structured profile', samples, elapsed)
+
+    def llm_request():
+        resp = client.post('/api/symptom-Checker', json={'symptoms': 'fever, cough'})
+        assert resp.status_code == 200
+    samples, elapsed = timed(llm_request, args.llm_requests)
+    report(f'endpoint, LLM ({args.llm_delay * 1000:.0f}ms stub)', samples, elapsed)
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Structured triage from the precomputed prediction index vs the model itself.
+
+    python benchmarks/bench_symptom_index.py --n 20000 --rows 1000
+
+Runs build_model.verify_index() on the served artifact first, so numbers
+are only printed for an index that gives the model's top-k on every
+profile it covers. Then times, on random profiles with whole ages:
+
+  predict()        one lookup per profile vs encode + matmul + softmax
+  predict_batch()  one batch of --rows
+  endpoint         POST /api/symptom-Checker with a profile, index on and off;
+                   request handling dwarfs the scoring here
+"""
+import argparse
+import itertools
+
+from _util import load_app, logged_in_client, report, timed
+from bench_symptom_batch import random_profiles
+from build_model import verify_index
+from symptom_model import load_classifier
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    classifier = load_classifier()
+    index = classifier.index
+    grid, agreement, index_accuracy, model_accuracy = verify_index(classifier)
+    print(f'index: {len(index)} rows, {index.top_classes.nbytes + index.top_proba.nbytes:,} B, '
+          f'{index.age_step}-year age buckets, top-{index.top_k}')
+    print(f'parity: top-{index.top_k} identical on all {grid} grid profiles; dataset top-1 agreement '
+          f'{agreement:.1%}, accuracy {index_accuracy:.3f} (model {model_accuracy:.3f})')
+
+    profiles = random_profiles(args.n)
+    for profile in profiles:
+        assert [d for d, _ in classifier.predict(profile)] == [d for d, _ in classifier.predict_model(profile)]
+    cycle = itertools.cycle(profiles)
+    report('predict_model()', *timed(lambda: classifier.predict_model(next(cycle)), args.n))
+    report('predict(), index', *timed(lambda: classifier.predict(next(cycle)), args.n))
+    report('  of which key()', *timed(lambda: index.key(next(cycle)), args.n))
+
+    batch = profiles[:args.rows]
+    report(f'predict_batch_model({args.rows})', *timed(lambda: classifier.predict_batch_model(batch), 50))
+    report(f'predict_batch({args.rows}), index', *timed(lambda: classifier.predict_batch(batch), 50))
+
+    app_module = load_app(SYMPTOM_LLM_FALLBACK='0')
+    client = logged_in_client(app_module)
+    served = app_module.symptom_classifier
+
+    def request():
+        response = client.post('/api/symptom-Checker', json={'profile': next(cycle)})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    timed(request, 500)  # warm up: the first requests pay for imports and session setup
+    for label, mode_index in (('endpoint, model', None), ('endpoint, index', served.index)):
+        served.index = mode_index
+        report(label, *timed(request, min(args.n, 2000)))
+    app_module.history_writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Time to first text: /api/symptom-Checker vs its Server-Sent Events stream, and cancellation.
+
+    python benchmarks/bench_symptom_stream.py --requests 20 --llm-delay 0.5 --token-delay 0.05 --tokens 20
+
+Both endpoints are pointed at benchmarks/stub_llm.py. The stub streams
+its first token after --llm-delay and the rest --token-delay apart; for
+the plain endpoint it holds the whole reply for as long as the stream
+takes to finish, as a real model would. Every request uses new symptom
+text so nothing is answered from the cache.
+
+The cancellation pass opens --requests streams, reads up to the first
+token and closes the response, as the server does when a browser goes
+away. It reports how many tokens the stub still sent per abandoned stream
+and whether every upstream slot was handed back.
+"""
+import argparse
+import time
+
+from _util import load_app, logged_in_client, patch_gevent, percentile
+from stub_llm import start_stub
+
+URL = '/api/symptom-Checker/stream'
+
+
+def ms(samples, pct):
+    return percentile(samples, pct) * 1000
+
+
+def read_events(response):
+    """Yield (event, raw data) from a streamed test-client response as it arrives."""
+    buffer = ''
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            yield fields.get('event'), fields.get('data')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--llm-delay', type=float, default=0.5, help='stub latency to the first token, seconds')
+    parser.add_argument('--token-delay', type=float, default=0.05)
+    parser.add_argument('--tokens', type=int, default=20)
+    args = parser.parse_args()
+
+    patch_gevent()
+    full = args.llm_delay + (args.tokens - 1) * args.token_delay
+    stub, base_url = start_stub(delay=full, token_delay=args.token_delay, tokens=args.tokens)
+    app_module = load_app(OPENROUTER_BASE_URL=base_url, OPENROUTER_API_KEY='stub', SYMPTOM_CACHE_BACKEND='none')
+    client = logged_in_client(app_module)
+    llm = app_module.llm_client
+    print(f'stub: first token after {args.llm_delay * 1000:.0f}ms, {args.tokens} tokens, '
+          f'complete after {full * 1000:.0f}ms')
+
+    blocking = []
+    for i in range(args.requests):
+        t0 = time.perf_counter()
+        response = client.post('/api/symptom-Checker', json={'symptoms': f'fever, cough #{i}'})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        blocking.append(time.perf_counter() - t0)
+    print(f'{"blocking endpoint":<20} result      p50={ms(blocking, 50):7.1f}ms p99={ms(blocking, 99):7.1f}ms')
+
+    stub.delay = args.llm_delay
+    first, done = [], []
+    for i in range(args.requests):
+        t0 = time.perf_counter()
+        response = client.post(URL, json={'symptoms': f'headache #{i}'}, buffered=False)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        for event, _ in read_events(response):
+            if event == 'token' and len(first) == i:
+                first.append(time.perf_counter() - t0)
+            elif event != 'token':
+                assert event == 'done', event
+                done.append(time.perf_counter() - t0)
+        response.close()
+    print(f'{"SSE stream":<20} first text  p50={ms(first, 50):7.1f}ms p99={ms(first, 99):7.1f}ms')
+    print(f'{"":<20} done        p50={ms(done, 50):7.1f}ms p99={ms(done, 99):7.1f}ms')
+
+    sent, cancelled = stub.tokens_sent, llm.streams_cancelled
+    for i in range(args.requests):
+        response = client.post(URL, json={'symptoms': f'rash #{i}'}, buffered=False)
+        for event, _ in read_events(response):
+            break
+        response.close()
+    time.sleep(2 * args.token_delay + 0.2)  # let the stub notice on its next write
+    per_stream = (stub.tokens_sent - sent) / args.requests
+    print(f'{"cancelled streams":<20} {per_stream:.1f} of {args.tokens} tokens generated upstream, '
+          f'{llm.streams_cancelled - cancelled} counted cancelled, {stub.streams_cancelled} seen by the stub, '
+          f'{llm.active} upstream slots still held')
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    print(next(line for line in metrics.splitlines() if line.startswith('symptom_stream_first_token_seconds_count')))
+    app_module.history_writer.close()
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+"""Headless signaling load generator: simulated WebRTC clients against app.py.
+
+    python benchmarks/loadgen.py --users 100 --rate 10 --duration 30
+    python benchmarks/loadgen.py --server-env ICE_COALESCE_MS=20 --json run.json
+    python benchmarks/loadgen.py --url http://127.0.0.1:5000 --server-pid 1234
+
+Starts app.py on a free local port with a throwaway database (or uses --url),
+signs up and logs in --users accounts over HTTP, then connects one
+python-socketio client per account with its session cookie and registers it. Calls then start at --rate per second between idle pairs, each
+following the browser's sequence:
+
+    caller: call-user (offer)      -> callee: incoming-call
+    callee: answer-call            -> caller: call-answered
+    both:   --candidates ice-candidate each way, then a null end-of-candidates
+    caller: hang-up after --hold s -> callee: hang-up
+
+Reports call-setup latency (call-user sent -> call-answered received), ring
+and ICE relay latency, messages sent by one peer that never reached the
+other, and the server's CPU use and RSS from /proc. Everything runs on
+localhost. Exits with status 1 if --max-drops or --max-setup-p99 is
+exceeded, so a run can gate a change.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import socketio
+
+from _util import ROOT, free_port, percentile, session_cookie, wait_for_port
+
+MESSAGES = ('incoming-call', 'call-answered', 'ice-candidate', 'hang-up')
+
+
+class Ledger:
+    """Counts and latencies shared by every simulated user."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sent = dict.fromkeys(MESSAGES, 0)
+        self.received = dict.fromkeys(MESSAGES, 0)
+        self.ring, self.setup, self.relay = [], [], []
+        self.started = self.completed = self.failed = self.timed_out = self.skipped = 0
+
+    def expect(self, message, n=1):
+        with self.lock:
+            self.sent[message] += n
+
+    def got(self, message, latency=None, samples=None):
+        with self.lock:
+            self.received[message] += 1
+            if samples is not None:
+                samples.append(latency)
+
+    def bump(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def drops(self):
+        return {message: self.sent[message] - self.received[message] for message in MESSAGES}
+
+
+class SimulatedUser:
+    def __init__(self, url, mobile, ledger, args, release):
+        self.mobile = mobile
+        self.ledger = ledger
+        self.args = args
+        self._release = release  # called with self once the user is idle again
+        self.peer = None
+        self.offered_at = None
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('incoming-call', self.on_incoming_call)
+        self.client.on('call-answered', self.on_call_answered)
+        self.client.on('call-failed', self.on_call_failed)
+        self.client.on('ice-candidate', lambda data: self.on_candidates([data['candidate']]))
+        self.client.on('ice-candidates', lambda data: self.on_candidates(data['candidates']))
+        self.client.on('hang-up', self.on_hang_up)
+        # The server only registers a socket for its logged-in account's number
+        self.client.connect(url, headers={'Cookie': session_cookie(url, mobile)}, transports=['websocket'])
+        self.client.emit('register', {'mobile': mobile})
+
+    def sdp(self, kind):
+        return {'type': kind, 'sdp': 'v=0\r\n' + 'a=x' * (self.args.sdp_bytes // 3), 'sent': time.perf_counter()}
+
+    def call(self, callee):
+        self.peer = callee.mobile
+        callee.peer = self.mobile
+        self.ledger.bump('started')
+        self.ledger.expect('incoming-call')
+        self.offered_at = time.perf_counter()
+        self.client.emit('call-user', {'caller_mobile': self.mobile, 'target_mobile': callee.mobile,
+                                       'offer': self.sdp('offer')})
+
+    def send_candidates(self):
+        self.ledger.expect('ice-candidate', self.args.candidates)
+        for i in range(self.args.candidates):
+            candidate = {'candidate': f'candidate:{i} 1 udp 2122260223 10.0.0.1 {50000 + i} typ host',
+                         'sdpMid': '0', 'sdpMLineIndex': 0, 'sent': time.perf_counter()}
+            self.client.emit('ice-candidate', {'target_mobile': self.peer, 'candidate': candidate})
+        self.client.emit('ice-candidate', {'target_mobile': self.peer, 'candidate': None})
+
+    def on_incoming_call(self, data):
+        self.ledger.got('incoming-call', time.perf_counter() - data['offer']['sent'], self.ledger.ring)
+        self.peer = data['from']
+        # Handlers run on the client's event thread, so "think time" must not sleep there
+        threading.Timer(self.args.answer_delay, self.answer).start()
+
+    def answer(self):
+        self.ledger.expect('call-answered')
+        self.client.emit('answer-call', {'target_mobile': self.peer, 'answer': self.sdp('answer')})
+        self.send_candidates()
+
+    def on_call_answered(self, data):
+        offered_at, self.offered_at = self.offered_at, None
+        if offered_at is None:
+            return  # gave up on this call already
+        self.ledger.got('call-answered', time.perf_counter() - offered_at, self.ledger.setup)
+        self.send_candidates()
+        threading.Timer(self.args.hold, self.hang_up).start()
+
+    def on_call_failed(self, data):
+        self.ledger.bump('failed')
+        self.end()
+
+    def on_candidates(self, candidates):
+        now = time.perf_counter()
+        for candidate in candidates:
+            if candidate:
+                self.ledger.got('ice-candidate', now - candidate['sent'], self.ledger.relay)
+
+    def hang_up(self):
+        self.ledger.expect('hang-up')
+        self.client.emit('hang-up', {'target_mobile': self.peer})
+        self.ledger.bump('completed')
+        self.end()
+
+    def on_hang_up(self, data):
+        self.ledger.got('hang-up')
+        self.end()
+
+    def ring_timed_out(self, timeout):
+        offered_at = self.offered_at
+        return offered_at is not None and time.perf_counter() - offered_at > timeout
+
+    def end(self):
+        self.offered_at = None
+        self.peer = None
+        self._release(self)
+
+
+class ServerSampler(threading.Thread):
+    """CPU seconds and RSS of a process, sampled from /proc."""
+
+    def __init__(self, pid, interval=0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self.running = True
+        self.start_cpu, self.start_rss = self.cpu_seconds(), self.rss()
+
+    def cpu_seconds(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime and stime, fields 14 and 15 of stat(5)
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    def rss(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def run(self):
+        while self.running:
+            self.peak_rss = max(self.peak_rss, self.rss())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.running = False
+        return self.cpu_seconds() - self.start_cpu, self.rss()
+
+
+def start_server(env_overrides):
+    port = free_port()
+    db_path = os.path.join(tempfile.mkdtemp(prefix='loadgen-'), 'loadgen.db')
+    # Cheap password hashes: every simulated user signs up and logs in first
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='0', DATABASE_URL=f'sqlite:///{db_path}',
+               BCRYPT_LOG_ROUNDS='4')
+    env.update(env_overrides)
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'app.py')], env=env, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(port)
+    return f'http://127.0.0.1:{port}', proc
+
+
+def drive(users, ledger, args):
+    """Start calls at args.rate/s for args.duration seconds, then let them finish."""
+    idle = set(users)
+    idle_lock = threading.Lock()
+
+    def release(user):
+        with idle_lock:
+            idle.add(user)
+
+    for user in users:
+        user._release = release
+
+    rng = random.Random(args.seed)
+    interval = 1.0 / args.rate
+    deadline = time.perf_counter() + args.duration
+    due = time.perf_counter()
+    while time.perf_counter() < deadline:
+        time.sleep(max(0.0, due - time.perf_counter()))
+        due += rng.expovariate(1.0 / interval) if args.poisson else interval
+        with idle_lock:
+            if len(idle) < 2:
+                ledger.bump('skipped')
+                continue
+            caller, callee = rng.sample(sorted(idle, key=lambda u: u.mobile), 2)
+            idle.discard(caller)
+            idle.discard(callee)
+        caller.call(callee)
+        for user in users:
+            if user.ring_timed_out(args.ring_timeout):
+                ledger.bump('timed_out')
+                user.hang_up()
+
+    drain_until = time.perf_counter() + args.hold + args.answer_delay + args.drain
+    while time.perf_counter() < drain_until and len(idle) < len(users):
+        time.sleep(0.05)
+    time.sleep(0.5)  # stragglers after the last hang-up
+
+
+def summarize(ledger, args, server):
+    summary = {
+        'users': args.users, 'rate': args.rate, 'duration': args.duration,
+        'calls': {'started': ledger.started, 'completed': ledger.completed, 'failed': ledger.failed,
+                  'timed_out': ledger.timed_out, 'skipped_all_busy': ledger.skipped},
+        'sent': ledger.sent, 'received': ledger.received, 'dropped': ledger.drops(),
+    }
+    for name, samples in (('call_setup', ledger.setup), ('ring', ledger.ring), ('ice_relay', ledger.relay)):
+        summary[name + '_ms'] = {f'p{pct}': round(percentile(samples, pct) * 1000, 3) for pct in (50, 95, 99)}
+        summary[name + '_ms']['max'] = round(max(samples, default=0) * 1000, 3)
+    if server:
+        summary['server'] = server
+    return summary
+
+
+def print_summary(summary):
+    calls = summary['calls']
+    print(f"{summary['users']} users, {summary['rate']:g} calls/s for {summary['duration']:g}s: "
+          f"{calls['started']} started, {calls['completed']} completed, {calls['failed']} failed, "
+          f"{calls['timed_out']} unanswered, {calls['skipped_all_busy']} skipped (no idle pair)")
+    for name in ('call_setup', 'ring', 'ice_relay'):
+        stats = summary[name + '_ms']
+        print(f"  {name:<12} p50={stats['p50']:8.2f}ms p95={stats['p95']:8.2f}ms "
+              f"p99={stats['p99']:8.2f}ms max={stats['max']:8.2f}ms")
+    print('  dropped      ' + ', '.join(f'{message}={n}' for message, n in summary['dropped'].items())
+          + f"  (of {sum(summary['sent'].values())} sent)")
+    server = summary.get('server')
+    if server:
+        print(f"  server       cpu={server['cpu_seconds']:.2f}s ({server['cpu_percent']:.0f}% of one core) "
+              f"rss start={server['rss_start_mib']:.1f}MiB peak={server['rss_peak_mib']:.1f}MiB "
+              f"end={server['rss_end_mib']:.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=5.0, help='new calls per second')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds to keep starting calls')
+    parser.add_argument('--poisson', action='store_true', help='exponential gaps instead of a fixed rate')
+    parser.add_argument('--candidates', type=int, default=8, help='ICE candidates sent by each side')
+    parser.add_argument('--sdp-bytes', type=int, default=2500)
+    parser.add_argument('--answer-delay', type=float, default=0.0, help='callee think time, seconds')
+    parser.add_argument('--hold', type=float, default=2.0, help='seconds from answer to hang-up')
+    parser.add_argument('--ring-timeout', type=float, default=10.0)
+    parser.add_argument('--drain', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='drive an already running server instead of starting app.py')
+    parser.add_argument('--server-pid', type=int, help='with --url, the pid to sample CPU/RSS from')
+    parser.add_argument('--server-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='extra environment for the started app.py, e.g. ICE_COALESCE_MS=20')
+    parser.add_argument('--json', help='also write the summary to this file')
+    parser.add_argument('--max-drops', type=int, help='exit 1 if more messages than this are dropped')
+    parser.add_argument('--max-setup-p99', type=float, help='exit 1 if call setup p99 exceeds this (ms)')
+    args = parser.parse_args()
+
+    proc = None
+    url, pid = args.url, args.server_pid
+    if url is None:
+        url, proc = start_server(dict(item.split('=', 1) for item in args.server_env))
+        pid = proc.pid
+    try:
+        ledger = Ledger()
+        users = [SimulatedUser(url, f'+1555{i:07d}', ledger, args, None) for i in range(args.users)]
+        time.sleep(1.0)  # let the registrations land
+        sampler = ServerSampler(pid) if pid else None
+        if sampler:
+            sampler.start()
+        started = time.perf_counter()
+        drive(users, ledger, args)
+        server = None
+        if sampler:
+            cpu, rss_end = sampler.stop()
+            elapsed = time.perf_counter() - started
+            server = {'cpu_seconds': round(cpu, 3), 'cpu_percent': round(100 * cpu / elapsed, 1),
+                      'rss_start_mib': sampler.start_rss / 2 ** 20, 'rss_peak_mib': sampler.peak_rss / 2 ** 20,
+                      'rss_end_mib': rss_end / 2 ** 20}
+        # Each disconnect waits out the websocket reader's timeout; do them together
+        closers = [threading.Thread(target=user.client.disconnect) for user in users]
+        for closer in closers:
+            closer.start()
+        for closer in closers:
+            closer.join()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    summary = summarize(ledger, args, server)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    dropped = sum(summary['dropped'].values())
+    failed = []
+    if args.max_drops is not None and dropped > args.max_drops:
+        failed.append(f'{dropped} dropped messages > {args.max_drops}')
+    if args.max_setup_p99 is not None and summary['call_setup_ms']['p99'] > args.max_setup_p99:
+        failed.append(f"call setup p99 {summary['call_setup_ms']['p99']}ms > {args.max_setup_p99}ms")
+    if failed:
+        print('FAILED: ' + '; '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
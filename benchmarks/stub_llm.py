@@ -0,0 +1,149 @@
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Answers POST .../chat/completions after a fixed delay so the symptom checker
+can be exercised without network access:
+
+    python benchmarks/stub_llm.py --port 8099 --delay 0.5
+    OPENROUTER_BASE_URL=http://127.0.0.1:8099/api/v1 python app.py
+
+Requests with "stream": true get a chunked text/event-stream instead, the
+way the real API sends it: the first token after --delay, then one more
+every --token-delay seconds, --tokens in all, and `data: [DONE]`.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment; split writes hit delayed-ACK stalls
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    # A reader that left early makes the server's own final flushes fail too
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def finish(self):
+        try:
+            super().finish()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(server.delay)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        if body.get('stream'):
+            self.stream_completion(body, prompt)
+            return
+        payload = json.dumps({
+            'id': 'chatcmpl-stub',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': f'Stub diagnosis for {len(prompt)} prompt chars.'},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (deadline tests do this on purpose)
+            self.close_connection = True
+
+    def stream_completion(self, body, prompt):
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        base = {'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': body.get('model', 'stub')}
+        words = [f'Stub diagnosis for {len(prompt)} prompt chars'] + [f' word{i}' for i in range(1, server.tokens)]
+        try:
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(server.token_delay)
+                self.write_chunk(json.dumps({**base, 'choices': [
+                    {'index': 0, 'delta': {'content': word}, 'finish_reason': None}]}))
+                with server.lock:
+                    server.tokens_sent += 1
+            self.write_chunk(json.dumps({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+            self.write_chunk('[DONE]')
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The reader closed the stream early
+            with server.lock:
+                server.streams_cancelled += 1
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        event = f'data: {data}\n\n'.encode()
+        self.wfile.write(f'{len(event):x}\r\n'.encode() + event + b'\r\n')
+        self.wfile.flush()
+
+
+def start_stub(port=0, delay=0.0, token_delay=0.05, tokens=20):
+    """Start the stub in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubLLMHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.token_delay = token_delay
+    server.tokens = tokens
+    server.tokens_sent = server.streams_cancelled = 0
+    server.requests = 0
+    server.in_flight = server.max_in_flight = 0
+    server.connections = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/api/v1'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--delay', type=float, default=0.5, help='seconds before each reply')
+    parser.add_argument('--token-delay', type=float, default=0.05, help='seconds between streamed tokens')
+    parser.add_argument('--tokens', type=int, default=20, help='tokens per streamed reply')
+    args = parser.parse_args()
+    server, url = start_stub(args.port, args.delay, args.token_delay, args.tokens)
+    print(f'Stub LLM listening on {url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
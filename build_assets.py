@@ -0,0 +1,39 @@
+"""Fingerprint and precompress the static files, and generate the service worker.
+
+    python build_assets.py [STATIC_DIR ...]
+
+Writes <static>/dist (gitignored) for the main app's and the TEST app's
+static folders by default; see assets.py for how they are then served.
+Rerun it whenever a stylesheet or script changes, before (re)starting the
+app. Brotli variants need the `brotli` package; without it only gzip ones
+are written.
+"""
+import argparse
+import os
+
+import assets
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STATIC = [os.path.join(ROOT, 'static'), os.path.join(ROOT, 'TEST', 'static')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('static', nargs='*', default=DEFAULT_STATIC)
+    parser.add_argument('--gzip-level', type=int, default=9)
+    parser.add_argument('--brotli-quality', type=int, default=11)
+    args = parser.parse_args()
+
+    if assets.brotli is None:
+        print('brotli is not installed; writing gzip variants only')
+    for static in args.static:
+        manifest = assets.build(static, gzip_level=args.gzip_level, brotli_quality=args.brotli_quality)
+        print(f'{os.path.relpath(static, ROOT)}: version {manifest["version"]}')
+        for path, target in manifest['files'].items():
+            sizes = manifest['sizes'][path]
+            variants = '  '.join(f'{suffix} {size:>7,}' for suffix, size in sizes.items() if suffix != 'identity')
+            print(f'  {path:<24} -> {target:<34} {sizes["identity"]:>7,} B  {variants}')
+
+
+if __name__ == '__main__':
+    main()
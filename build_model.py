@@ -0,0 +1,145 @@
+"""Fit the symptom classifier and export it as a versioned .npz artifact.
+
+    python build_model.py [--csv PATH] [--out PATH] [--index-age-step YEARS]
+
+The Flask app loads the artifact at startup with NumPy alone, so pandas and
+scikit-learn are only needed here. Rerun this whenever the dataset changes.
+The artifact also carries the prediction index of the model it holds (see
+symptom_model.PredictionIndex), checked here against the model itself.
+"""
+import argparse
+import csv
+import itertools
+import os
+import time
+
+import numpy as np
+
+from symptom_model import DATASET_PATH, FEATURES, INDEX_AGE_STEP, MODEL_PATH, TARGET, ProfileEncoder, SymptomClassifier
+
+
+def profile_grid(encoder, ages=range(0, 121)):
+    """Every combination of categorical levels, for every age in `ages`."""
+    categorical = [f for f in FEATURES if f in encoder.levels]
+    for age in ages:
+        for combo in itertools.product(*(encoder.levels[f] for f in categorical)):
+            profile = dict(zip(categorical, combo))
+            profile['Age'] = age
+            yield profile
+
+
+class ParityError(ValueError):
+    """Raised when the artifact would not score like the fitted model."""
+
+
+def check(ok, message):
+    # Not `assert`: these checks must also run under python -O
+    if not ok:
+        raise ParityError(message)
+
+
+def verify_encoder(columns, csv_path=DATASET_PATH):
+    """Check ProfileEncoder is bit-identical to get_dummies + reindex.
+
+    Dataset rows go through the notebook's exact per-row path; the full
+    level grid is compared against one batched get_dummies call, which
+    reindexes to the same layout. Returns the number of rows checked.
+    """
+    import pandas as pd
+
+    encoder = ProfileEncoder.from_csv_header(columns, csv_path)
+    check(encoder.features == FEATURES, 'CSV header no longer matches the notebook feature list')
+
+    rows = pd.read_csv(csv_path)[FEATURES].to_dict('records')
+    for row in rows:
+        expected = pd.get_dummies(pd.DataFrame([row])).reindex(columns=columns, fill_value=0)
+        expected = expected.to_numpy(dtype=np.float64)[0]
+        actual = encoder.encode(row)
+        check(actual.tobytes() == expected.tobytes(), f'encoder mismatch for {row}')
+
+    grid = list(profile_grid(encoder))
+    expected = pd.get_dummies(pd.DataFrame(grid)[FEATURES]).reindex(columns=columns, fill_value=0)
+    expected = expected.to_numpy(dtype=np.float64)
+    actual = np.zeros_like(expected)
+    for i, profile in enumerate(grid):
+        encoder.encode_into(actual[i], profile)
+    check(actual.tobytes() == expected.tobytes(), 'encoder mismatch on the level grid')
+    return len(rows) + len(grid)
+
+
+def verify_index(classifier, csv_path=DATASET_PATH):
+    """Check the classifier's prediction index against its model.
+
+    Every grid profile, at its bucket's scoring age, must get the model's
+    top-k classes in the same order and the same probabilities to float32
+    precision. On the dataset rows the index is then compared with the
+    model as a predictor; with one-year buckets they must agree on every row.
+    Returns (grid profiles, top-1 agreement, index accuracy, model accuracy).
+    """
+    index = classifier.index
+    grid = list(profile_grid(classifier.encoder, index.scoring_ages()))
+    check(len(grid) == len(index), 'index does not cover the level grid')
+    expected = classifier.predict_batch_model(grid, index.top_k)
+    for profile, want in zip(grid, expected):
+        got = index.lookup(index.key(profile), index.top_k)
+        check([c for c, _ in got] == [c for c, _ in want], f'index top-{index.top_k} mismatch for {profile}')
+        check(np.allclose([p for _, p in got], [p for _, p in want], rtol=1e-6, atol=0),
+              f'index probability mismatch for {profile}')
+
+    with open(csv_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    model = [top[0][0] for top in classifier.predict_batch_model(rows, 1)]
+    indexed = [index.lookup(index.key(row), 1)[0][0] for row in rows]
+    agreement = np.mean([a == b for a, b in zip(model, indexed)])
+    model_accuracy = np.mean([p == row[TARGET] for p, row in zip(model, rows)])
+    index_accuracy = np.mean([p == row[TARGET] for p, row in zip(indexed, rows)])
+    if index.age_step == 1:
+        check(agreement == 1.0, f'index disagrees with the model on {1 - agreement:.1%} of the dataset')
+    return len(grid), agreement, index_accuracy, model_accuracy
+
+
+def build(csv_path=DATASET_PATH, out_path=MODEL_PATH, index_age_step=INDEX_AGE_STEP):
+    start = time.perf_counter()
+    classifier = SymptomClassifier.train(csv_path)
+    # Checked under a temporary name; out_path only ever holds a verified artifact
+    staged = out_path + '.tmp.npz'
+    classifier.save(staged, index_age_step=index_age_step)
+    try:
+        # Round-trip check: the served model must score exactly like the fitted one
+        loaded = SymptomClassifier.load(staged)
+        check((loaded.coef == classifier.coef).all() and (loaded.intercept == classifier.intercept).all(),
+              'coefficients changed in the round trip')
+        check(list(loaded.classes) == [str(c) for c in classifier.classes], 'class labels changed in the round trip')
+        check(loaded.columns == classifier.columns, 'column layout changed in the round trip')
+        checked = verify_encoder(loaded.columns, csv_path)
+        check(loaded.index is not None and loaded.index.model_version == loaded.version,
+              'artifact has no prediction index for this model')
+        grid, agreement, index_accuracy, model_accuracy = verify_index(loaded, csv_path)
+    except BaseException:
+        os.remove(staged)
+        raise
+    os.replace(staged, out_path)
+
+    print(f'Wrote {out_path} ({os.path.getsize(out_path)} bytes) in {time.perf_counter() - start:.2f}s')
+    print(f'  version:   {loaded.version}')
+    print(f'  classes:   {len(loaded.classes)}, columns: {len(loaded.columns)}')
+    print(f'  holdout accuracy: {loaded.metadata["holdout_accuracy"]:.3f}')
+    print(f'  encoder bit-identical to get_dummies on {checked} profiles')
+    print(f'  prediction index: {grid} profiles ({loaded.index.age_step}-year age buckets), '
+          f'top-{loaded.index.top_k} matches the model on all of them')
+    print(f'    dataset: top-1 agreement {agreement:.1%}, accuracy {index_accuracy:.3f} '
+          f'(model {model_accuracy:.3f})')
+    return loaded
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default=DATASET_PATH)
+    parser.add_argument('--out', default=MODEL_PATH)
+    parser.add_argument('--index-age-step', type=int, default=INDEX_AGE_STEP,
+                        help='width of the age buckets in the prediction index, years')
+    args = parser.parse_args()
+    try:
+        build(args.csv, args.out, args.index_age_step)
+    except ParityError as e:
+        raise SystemExit(f'build_model.py: {e}; {args.out} was not written')
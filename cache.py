@@ -0,0 +1,173 @@
+"""Bounded TTL/LRU caches with hit, miss and eviction counters.
+
+MemoryCache lives in the worker process. SQLiteCache keeps entries in a
+local database file so they survive restarts and are shared by every
+worker on the host. Both store JSON-serialisable values.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCache:
+    def __init__(self, max_entries=1024, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'size': len(self._entries)}
+
+
+class SQLiteCache:
+    """Same interface as MemoryCache, backed by a SQLite file.
+
+    Counters are per process; size is read from the shared table. Each
+    instance has one connection, shared under a lock: a thread-local one
+    would be one per greenlet once gevent has patched threading. Hits only
+    read. Their last_used updates are buffered and written in one
+    transaction once touch_batch keys have been hit or touch_interval
+    seconds have passed, and before every set() so eviction sees them. LRU
+    order across workers therefore lags by at most that much.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl=3600, touch_batch=256, touch_interval=5.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_batch = touch_batch
+        self.touch_interval = touch_interval
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.touch_flushes = 0
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last hit time, not yet written
+        self._touched_at = time.monotonic()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS cache ('
+                               'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+                               'expires_at REAL NOT NULL, last_used REAL NOT NULL)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_last_used ON cache (last_used)')
+
+    def _flush_touches(self):
+        # Caller holds the lock
+        if self._touched:
+            with self._conn:
+                self._conn.executemany('UPDATE cache SET last_used = ? WHERE key = ?',
+                                       [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+            self.touch_flushes += 1
+        self._touched_at = time.monotonic()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] <= now:
+                with self._conn:
+                    self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                self._touched.pop(key, None)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= self.touch_batch or time.monotonic() - self._touched_at >= self.touch_interval:
+                self._flush_touches()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._flush_touches()
+            with self._conn:
+                self._conn.execute('INSERT OR REPLACE INTO cache (key, value, expires_at, last_used) '
+                                   'VALUES (?, ?, ?, ?)', (key, json.dumps(value), now + self.ttl, now))
+                cur = self._conn.execute('DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_used '
+                                         'LIMIT max(0, (SELECT COUNT(*) FROM cache) - ?))', (self.max_entries,))
+                self.evictions += max(cur.rowcount, 0)
+
+    def delete(self, key):
+        with self._lock:
+            self._touched.pop(key, None)
+            with self._conn:
+                self._conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'expirations': self.expirations, 'size': len(self),
+                'pending_touches': len(self._touched), 'touch_flushes': self.touch_flushes}
+
+
+def create_cache(backend, path=None, max_entries=1024, ttl=3600):
+    """Build the cache named by config: 'memory', 'sqlite' or 'none'."""
+    if backend == 'memory':
+        return MemoryCache(max_entries, ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, max_entries, ttl)
+    if backend in (None, '', 'none'):
+        return None
+    raise ValueError(f'Unknown cache backend: {backend!r}')
+
+
+_SYMPTOM_SEPARATORS = re.compile(r'[,;\n]+|\band\b')
+
+
+def symptom_cache_key(symptoms, model=''):
+    """Order- and case-insensitive key for a free-text symptom list."""
+    parts = {' '.join(part.split()) for part in _SYMPTOM_SEPARATORS.split(symptoms.lower())}
+    parts.discard('')
+    return f'symptoms:{model}:' + ','.join(sorted(parts))
@@ -0,0 +1,477 @@
+"""Server-side call sessions for the signaling handlers.
+
+The browsers used to be the only ones who knew a call existed: an offer
+nobody answered, or a tab closed mid-call, left nothing behind, and history
+was only written if the client remembered to POST it. CallSessionTable
+follows each call from call-user (ringing) through answer-call (active) to
+hang-up, disconnect or timeout (ended), and hands every ended session to
+`on_end` so the app can write both parties' history rows itself.
+
+Sessions are __slots__ records indexed by call id, by (caller, callee) and
+by participant, so every transition is O(1). Deadlines (unanswered calls,
+and connected calls whose hang-ups were both lost) sit in one TimerWheel
+rather than a timer per call; entries are not removed when a call moves
+on, expire() simply skips those whose session no longer matches.
+
+CallSessionTable lives in one worker process. With several workers behind
+a message queue, answer-call and hang-up often reach a worker other than
+the one that took call-user, so RedisCallSessionTable keeps the same
+records in Redis instead, where every worker can move them on.
+"""
+import itertools
+import time
+import uuid
+from datetime import datetime
+
+from history_writer import utcnow
+
+RINGING = 'ringing'
+ACTIVE = 'active'
+ENDED = 'ended'
+
+
+class CallSession:
+    __slots__ = ('call_id', 'caller', 'callee', 'state', 'started_at', 'created', 'answered', 'ended',
+                 'end_reason')
+
+    def __init__(self, call_id, caller, callee, created, started_at):
+        self.call_id = call_id
+        self.caller = caller
+        self.callee = callee
+        self.state = RINGING
+        self.started_at = started_at  # wall clock (naive UTC) for the history row
+        self.created = created        # monotonic; the rest are too
+        self.answered = None
+        self.ended = None
+        self.end_reason = None
+
+    def duration(self):
+        """Whole seconds connected; 0 for calls that were never answered."""
+        if self.answered is None or self.ended is None:
+            return 0
+        return int(round(self.ended - self.answered))
+
+    def peer_of(self, mobile):
+        return self.callee if mobile == self.caller else self.caller
+
+    def __repr__(self):
+        return f'CallSession({self.call_id!r}, {self.caller!r} -> {self.callee!r}, {self.state})'
+
+
+class TimerWheel:
+    """Hashed timing wheel: O(1) schedule, cost per tick proportional to what is due.
+
+    Keys land in slot (due tick % slots); a deadline more than one turn away
+    stays in its slot and is passed over until its turn comes round.
+    """
+
+    def __init__(self, tick=1.0, slots=64, now=0.0):
+        self.tick = tick
+        self._slots = [[] for _ in range(slots)]
+        self._current = int(now / tick)  # next tick to be processed
+        self.scheduled = 0
+
+    def schedule(self, key, deadline):
+        due = max(int(deadline / self.tick) + 1, self._current)
+        self._slots[due % len(self._slots)].append((due, key))
+        self.scheduled += 1
+
+    def advance(self, now):
+        """Keys whose deadline is at or before `now`, in no particular order."""
+        target = int(now / self.tick)
+        if target < self._current:
+            return []
+        expired = []
+        n = len(self._slots)
+        # After a long pause every slot is due once; never loop more than a turn
+        ticks = range(self._current, target + 1) if target - self._current < n else range(target - n + 1, target + 1)
+        for t in ticks:
+            slot = self._slots[t % n]
+            if not slot:
+                continue
+            keep = []
+            for entry in slot:
+                if entry[0] <= target:
+                    expired.append(entry[1])
+                else:
+                    keep.append(entry)
+            self._slots[t % n] = keep
+        self._current = target + 1
+        self.scheduled -= len(expired)
+        return expired
+
+    def __len__(self):
+        return self.scheduled
+
+
+class CallSessionTable:
+    def __init__(self, on_end=None, ring_timeout=45.0, max_duration=4 * 3600.0, tick=1.0,
+                 max_sessions=100000, clock=time.monotonic, wall_clock=utcnow):
+        """
+        on_end:       called with each session once it has ended
+        ring_timeout: seconds a call may ring before it ends as 'no-answer'
+        max_duration: seconds a connected call may last before it ends as
+                      'timeout' (both parties vanished without a hang-up)
+        tick:         resolution of those deadlines; call expire() this often
+        max_sessions: offers beyond this many live sessions are not tracked
+        """
+        self._on_end = on_end
+        self.ring_timeout = ring_timeout
+        self.max_duration = max_duration
+        self.tick = tick
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._sessions = {}  # call id -> CallSession
+        self._by_pair = {}   # (caller, callee) -> call id
+        self._by_user = {}   # mobile -> [call ids]; almost always just one
+        self._wheel = TimerWheel(tick, now=clock())
+        self._prefix = uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+        self.ringing = 0
+        self.offered = 0
+        self.answered = 0
+        self.untracked = 0
+        self.ended = {}  # end reason -> count
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, call_id):
+        return self._sessions.get(call_id)
+
+    def find(self, a, b):
+        """The live session between two numbers, whichever of them called."""
+        call_id = self._by_pair.get((a, b)) or self._by_pair.get((b, a))
+        return self._sessions.get(call_id) if call_id else None
+
+    def offer(self, caller, callee):
+        """Start ringing; returns the new session, or None if the table is full."""
+        previous = self._by_pair.get((caller, callee))
+        if previous is not None:
+            # Offered again before the last one was answered or hung up
+            self.end(self._sessions[previous], 'replaced')
+        if len(self._sessions) >= self.max_sessions:
+            self.untracked += 1
+            return None
+        now = self._clock()
+        session = CallSession(f'{self._prefix}-{next(self._ids)}', caller, callee, now, self._wall_clock())
+        self._sessions[session.call_id] = session
+        self._by_pair[(caller, callee)] = session.call_id
+        self._by_user.setdefault(caller, []).append(session.call_id)
+        self._by_user.setdefault(callee, []).append(session.call_id)
+        self._wheel.schedule(session.call_id, now + self.ring_timeout)
+        self.ringing += 1
+        self.offered += 1
+        return session
+
+    def answer(self, caller, callee, call_id=None):
+        """Mark the call from `caller` to `callee` connected; None if it is not ringing.
+
+        A call_id only identifies the call: it must still be between those two.
+        """
+        session = self._sessions.get(call_id if call_id else self._by_pair.get((caller, callee)))
+        if session is None or session.state != RINGING or (session.caller, session.callee) != (caller, callee):
+            return None
+        now = self._clock()
+        session.state = ACTIVE
+        session.answered = now
+        self._wheel.schedule(session.call_id, now + self.max_duration)
+        self.ringing -= 1
+        self.answered += 1
+        return session
+
+    def hang_up(self, mobile, peer):
+        """End the session between `mobile` and `peer`, if any, on `mobile`'s behalf."""
+        session = self.find(mobile, peer)
+        if session is None:
+            return None
+        if session.state == ACTIVE:
+            reason = 'hangup'
+        else:
+            reason = 'cancelled' if mobile == session.caller else 'declined'
+        return self.end(session, reason)
+
+    def drop_user(self, mobile):
+        """End every session `mobile` is part of (their last device went away)."""
+        call_ids = list(self._by_user.get(mobile, ()))
+        return [self.end(self._sessions[call_id], 'disconnected') for call_id in call_ids]
+
+    def discard(self, session):
+        """Forget a session that never really started (the callee was offline)."""
+        self._remove(session)
+
+    def end(self, session, reason):
+        if session.state == ENDED:
+            return session
+        self._remove(session)
+        session.state = ENDED
+        session.ended = self._clock()
+        session.end_reason = reason
+        self.ended[reason] = self.ended.get(reason, 0) + 1
+        if self._on_end is not None:
+            self._on_end(session)
+        return session
+
+    def _remove(self, session):
+        if self._sessions.pop(session.call_id, None) is None:
+            return
+        if session.state == RINGING:
+            self.ringing -= 1
+        if self._by_pair.get((session.caller, session.callee)) == session.call_id:
+            del self._by_pair[(session.caller, session.callee)]
+        for mobile in (session.caller, session.callee):
+            calls = self._by_user.get(mobile)
+            if calls is not None and session.call_id in calls:
+                calls.remove(session.call_id)
+                if not calls:
+                    del self._by_user[mobile]
+
+    def expire(self, now=None):
+        """End sessions past their deadline; returns them."""
+        now = self._clock() if now is None else now
+        expired = []
+        for call_id in self._wheel.advance(now):
+            session = self._sessions.get(call_id)
+            if session is None:
+                continue
+            if session.state == RINGING and session.created + self.ring_timeout <= now:
+                expired.append(self.end(session, 'no-answer'))
+            elif session.state == ACTIVE and session.answered + self.max_duration <= now:
+                expired.append(self.end(session, 'timeout'))
+        return expired
+
+    def stats(self):
+        stats = {'ringing': self.ringing, 'active': len(self._sessions) - self.ringing,
+                 'offered': self.offered, 'answered': self.answered, 'untracked': self.untracked,
+                 'timers': len(self._wheel)}
+        for reason, count in self.ended.items():
+            stats[f'ended_{reason.replace("-", "_")}'] = count
+        return stats
+
+
+class RedisCallSessionTable:
+    """CallSessionTable with the same interface, stored in Redis.
+
+    Every worker sees every call, so answer-call and hang-up work on
+    whichever worker they reach. Each transition is a transaction under
+    WATCH of the call's hash. When two workers race, say one answering a call
+    while another expires it, exactly one of them wins, and only the worker
+    that ends a call passes it to on_end. Times are wall-clock seconds,
+    since monotonic clocks are not shared between hosts. Every worker's
+    expire() polls the deadlines; the transaction picks one to end each call.
+
+    Keys (under `prefix`):
+      call:<id>               hash: caller, callee, state, created, answered, started_at
+      pair:<caller>:<callee>  id of the live call between them
+      user:<mobile>           set of live call ids
+      deadlines               sorted set of live call ids, scored by deadline
+      stats                   hash of counters: live, ringing, offered, ...
+    """
+
+    def __init__(self, redis_client, on_end=None, ring_timeout=45.0, max_duration=4 * 3600.0, tick=1.0,
+                 max_sessions=100000, prefix='calls:', clock=time.time, wall_clock=utcnow):
+        self.redis = redis_client
+        self._on_end = on_end
+        self.ring_timeout = ring_timeout
+        self.max_duration = max_duration
+        self.tick = tick
+        self.max_sessions = max_sessions
+        self.prefix = prefix
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._deadlines_key = prefix + 'deadlines'
+        self._stats_key = prefix + 'stats'
+        self._prefix = uuid.uuid4().hex[:12]
+        self._ids = itertools.count(1)
+
+    def _call_key(self, call_id):
+        return f'{self.prefix}call:{call_id}'
+
+    def _pair_key(self, caller, callee):
+        return f'{self.prefix}pair:{caller}:{callee}'
+
+    def _user_key(self, mobile):
+        return f'{self.prefix}user:{mobile}'
+
+    def _session(self, call_id, fields):
+        session = CallSession(call_id, fields['caller'], fields['callee'], float(fields['created']),
+                              datetime.fromisoformat(fields['started_at']))
+        session.state = fields['state']
+        if fields.get('answered'):
+            session.answered = float(fields['answered'])
+        return session
+
+    def __len__(self):
+        return int(self.redis.hget(self._stats_key, 'live') or 0)
+
+    @property
+    def ringing(self):
+        return int(self.redis.hget(self._stats_key, 'ringing') or 0)
+
+    def get(self, call_id):
+        fields = self.redis.hgetall(self._call_key(call_id))
+        return self._session(call_id, fields) if fields else None
+
+    def find(self, a, b):
+        """The live session between two numbers, whichever of them called."""
+        forward, backward = self.redis.mget(self._pair_key(a, b), self._pair_key(b, a))
+        call_id = forward or backward
+        return self.get(call_id) if call_id else None
+
+    def offer(self, caller, callee):
+        """Start ringing; returns the new session, or None if the table is full."""
+        previous = self.redis.get(self._pair_key(caller, callee))
+        if previous is not None:
+            self._finish(previous, 'replaced')
+        if len(self) >= self.max_sessions:
+            self.redis.hincrby(self._stats_key, 'untracked', 1)
+            return None
+        now = self._clock()
+        session = CallSession(f'{self._prefix}-{next(self._ids)}', caller, callee, now, self._wall_clock())
+        pipe = self.redis.pipeline()
+        pipe.hset(self._call_key(session.call_id), mapping={
+            'caller': caller, 'callee': callee, 'state': RINGING, 'created': repr(now),
+            'started_at': session.started_at.isoformat()})
+        pipe.set(self._pair_key(caller, callee), session.call_id)
+        pipe.sadd(self._user_key(caller), session.call_id)
+        pipe.sadd(self._user_key(callee), session.call_id)
+        pipe.zadd(self._deadlines_key, {session.call_id: now + self.ring_timeout})
+        for counter in ('live', 'ringing', 'offered'):
+            pipe.hincrby(self._stats_key, counter, 1)
+        pipe.execute()
+        return session
+
+    def answer(self, caller, callee, call_id=None):
+        """Mark the call from `caller` to `callee` connected; None if it is not ringing.
+
+        A call_id only identifies the call: it must still be between those two.
+        """
+        call_id = call_id or self.redis.get(self._pair_key(caller, callee))
+        if not call_id:
+            return None
+        key = self._call_key(call_id)
+        answered = []
+
+        def mark_active(pipe):
+            answered.clear()
+            fields = pipe.hgetall(key)
+            if fields.get('state') != RINGING or (fields['caller'], fields['callee']) != (caller, callee):
+                return
+            now = self._clock()
+            pipe.multi()
+            pipe.hset(key, mapping={'state': ACTIVE, 'answered': repr(now)})
+            pipe.zadd(self._deadlines_key, {call_id: now + self.max_duration})
+            pipe.hincrby(self._stats_key, 'ringing', -1)
+            pipe.hincrby(self._stats_key, 'answered', 1)
+            answered.append(dict(fields, state=ACTIVE, answered=now))
+        self.redis.transaction(mark_active, key)
+        return self._session(call_id, answered[0]) if answered else None
+
+    def hang_up(self, mobile, peer):
+        """End the session between `mobile` and `peer`, if any, on `mobile`'s behalf."""
+        # Retried if the call was answered between reading and ending it
+        for _ in range(3):
+            session = self.find(mobile, peer)
+            if session is None:
+                return None
+            if session.state == ACTIVE:
+                reason = 'hangup'
+            else:
+                reason = 'cancelled' if mobile == session.caller else 'declined'
+            ended = self._finish(session.call_id, reason, expect_state=session.state)
+            if ended is not None:
+                return ended
+        return None
+
+    def drop_user(self, mobile):
+        """End every session `mobile` is part of (their last device went away)."""
+        ended = (self._finish(call_id, 'disconnected') for call_id in self.redis.smembers(self._user_key(mobile)))
+        return [session for session in ended if session is not None]
+
+    def discard(self, session):
+        """Forget a session that never really started (the callee was offline)."""
+        self._finish(session.call_id, None)
+
+    def end(self, session, reason):
+        return self._finish(session.call_id, reason) or session
+
+    def _finish(self, call_id, reason, expect_state=None):
+        """Remove a live call; returns it ended (after on_end) if this call removed it.
+
+        reason None discards it without counting it or calling on_end.
+        """
+        key = self._call_key(call_id)
+        removed = []
+
+        def remove(pipe):
+            removed.clear()
+            fields = pipe.hgetall(key)
+            if not fields or (expect_state is not None and fields['state'] != expect_state):
+                return
+            pair_key = self._pair_key(fields['caller'], fields['callee'])
+            pipe.watch(pair_key)
+            owns_pair = pipe.get(pair_key) == call_id
+            pipe.multi()
+            pipe.delete(key)
+            if owns_pair:
+                pipe.delete(pair_key)
+            pipe.srem(self._user_key(fields['caller']), call_id)
+            pipe.srem(self._user_key(fields['callee']), call_id)
+            pipe.zrem(self._deadlines_key, call_id)
+            pipe.hincrby(self._stats_key, 'live', -1)
+            if fields['state'] == RINGING:
+                pipe.hincrby(self._stats_key, 'ringing', -1)
+            if reason is not None:
+                pipe.hincrby(self._stats_key, f'ended:{reason}', 1)
+            removed.append(fields)
+        self.redis.transaction(remove, key)
+        if not removed:
+            return None
+        session = self._session(call_id, removed[0])
+        session.state = ENDED
+        session.ended = self._clock()
+        session.end_reason = reason
+        if reason is not None and self._on_end is not None:
+            self._on_end(session)
+        return session
+
+    def expire(self, now=None):
+        """End sessions past their deadline; returns the ones this worker ended."""
+        now = self._clock() if now is None else now
+        expired = []
+        for call_id in self.redis.zrangebyscore(self._deadlines_key, '-inf', now):
+            fields = self.redis.hgetall(self._call_key(call_id))
+            if not fields:
+                # Removed since the range was read
+                continue
+            if fields['state'] == RINGING and float(fields['created']) + self.ring_timeout <= now:
+                reason = 'no-answer'
+            elif fields['state'] == ACTIVE and float(fields['answered']) + self.max_duration <= now:
+                reason = 'timeout'
+            else:
+                continue
+            # Only if it is still in that state: an answer on another worker wins
+            session = self._finish(call_id, reason, expect_state=fields['state'])
+            if session is not None:
+                expired.append(session)
+        return expired
+
+    def stats(self):
+        counters = {field: int(value) for field, value in self.redis.hgetall(self._stats_key).items()}
+        ringing = counters.get('ringing', 0)
+        stats = {'ringing': ringing, 'active': counters.get('live', 0) - ringing,
+                 'offered': counters.get('offered', 0), 'answered': counters.get('answered', 0),
+                 'untracked': counters.get('untracked', 0), 'timers': self.redis.zcard(self._deadlines_key)}
+        for field, count in counters.items():
+            if field.startswith('ended:'):
+                stats[f'ended_{field[len("ended:"):].replace("-", "_")}'] = count
+        return stats
+
+
+def create_call_sessions(url=None, prefix='calls:', **options):
+    """In-process table by default; Redis-backed when given a redis:// URL."""
+    if not url:
+        return CallSessionTable(**options)
+    import redis
+    return RedisCallSessionTable(redis.Redis.from_url(url, decode_responses=True), prefix=prefix, **options)
@@ -0,0 +1,190 @@
+"""Streaming contact import/export in CSV and vCard formats.
+
+Uploads are parsed line by line from the request stream, normalized and
+deduplicated a chunk at a time, and handed to the app's insert callback
+in chunks, so a 50k-entry phone book costs one request, one query for the
+user's existing numbers, and a few dozen multi-row inserts. Exports are
+generated the same way from a lazily iterated query.
+"""
+import csv
+import io
+import itertools
+import re
+
+NAME_HEADERS = {'name', 'full name', 'fn', 'display name', 'contact name', 'contact_name'}
+NUMBER_HEADERS = {'mobile', 'mobile_number', 'mobile number', 'phone', 'phone number', 'number',
+                  'tel', 'telephone', 'contact_mobile_number'}
+NAME_MAX_LENGTH = 100
+NUMBER_MAX_LENGTH = 20
+EXPORT_FORMATS = {'csv': ('text/csv', 'csv'), 'vcf': ('text/vcard', 'vcf')}
+
+_NOT_DIALABLE = re.compile(r'[^\d+]')
+
+
+class ContactImportError(ValueError):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def text_stream(binary):
+    """Decode an uploaded file or raw request body without reading it all."""
+    if not hasattr(binary, 'read1'):
+        binary = io.BufferedReader(binary)
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def detect_kind(filename=None, mimetype=None):
+    """'vcard', 'csv', or None to sniff the content."""
+    name = (filename or '').lower()
+    if name.endswith(('.vcf', '.vcard')) or mimetype in ('text/vcard', 'text/x-vcard'):
+        return 'vcard'
+    if name.endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    return None
+
+
+def read_contacts(text, kind=None):
+    """Yield (name, raw number) pairs from a CSV or vCard text stream."""
+    lines = iter(text)
+    first = next((line for line in lines if line.strip()), '')
+    lines = itertools.chain([first], lines)
+    if kind == 'vcard' or (kind is None and first.strip().upper().startswith('BEGIN:VCARD')):
+        return _read_vcard(lines)
+    return _read_csv(lines)
+
+
+def _read_csv(lines):
+    rows = csv.reader(lines)
+    first = next(rows, None)
+    if first is None:
+        return
+    headers = [cell.strip().lower() for cell in first]
+    name_col = next((i for i, h in enumerate(headers) if h in NAME_HEADERS), None)
+    number_col = next((i for i, h in enumerate(headers) if h in NUMBER_HEADERS), None)
+    if number_col is None:
+        # No header row: name,number
+        name_col, number_col = 0, 1
+        rows = itertools.chain([first], rows)
+    for row in rows:
+        if len(row) <= number_col:
+            if any(cell.strip() for cell in row):
+                yield (row[0] if row else '', '')  # counted as invalid
+            continue
+        yield (row[name_col] if name_col is not None and name_col < len(row) else '', row[number_col])
+
+
+def _unfold(lines):
+    """Join vCard continuation lines (those starting with a space or tab)."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _vcard_unescape(value):
+    return value.replace('\\n', ' ').replace('\\N', ' ').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _read_vcard(lines):
+    full_name = structured_name = None
+    numbers = []
+    for line in _unfold(lines):
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        # "item1.TEL;TYPE=CELL" -> "TEL"
+        prop = key.split(';', 1)[0].rsplit('.', 1)[-1].upper()
+        if prop == 'BEGIN':
+            full_name = structured_name = None
+            numbers = []
+        elif prop == 'FN':
+            full_name = _vcard_unescape(value).strip()
+        elif prop == 'N':
+            family, _, rest = value.partition(';')
+            given = rest.split(';', 1)[0]
+            structured_name = ' '.join(_vcard_unescape(p).strip() for p in (given, family) if p.strip())
+        elif prop == 'TEL':
+            numbers.append(value[4:] if value[:4].lower() == 'tel:' else value)
+        elif prop == 'END':
+            # One contact per number, all under the card's name
+            for number in numbers:
+                yield full_name or structured_name or '', number
+            numbers = []
+
+
+def clean_number(raw):
+    """Light normalization for apps that store numbers as typed: keep + and digits."""
+    number = _NOT_DIALABLE.sub('', raw or '')
+    if '+' in number[1:] or len(number.lstrip('+')) < 3:
+        return None
+    return number
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_contacts(pairs, normalize, existing, insert, chunk_size=1000, max_rows=None):
+    """Normalize, dedupe and insert (name, raw number) pairs chunk by chunk.
+
+    normalize: normalize(list of raw numbers) -> list of numbers or None
+    existing:  numbers the user already has (fetched with one query)
+    insert:    insert(list of (name, number)) adds one chunk to the session
+    Duplicates are dropped both against `existing` and within the upload.
+    """
+    seen = set(existing)
+    stats = {'imported': 0, 'duplicates': 0, 'invalid': 0}
+    total = 0
+    for chunk in chunked(pairs, chunk_size):
+        total += len(chunk)
+        if max_rows is not None and total > max_rows:
+            raise ContactImportError(f'At most {max_rows} contacts per import.', status=413)
+        rows = []
+        for (name, _), number in zip(chunk, normalize([raw for _, raw in chunk])):
+            if not number or len(number) > NUMBER_MAX_LENGTH:
+                stats['invalid'] += 1
+            elif number in seen:
+                stats['duplicates'] += 1
+            else:
+                seen.add(number)
+                rows.append(((name or '').strip()[:NAME_MAX_LENGTH] or number, number))
+        if rows:
+            insert(rows)
+            stats['imported'] += len(rows)
+    return stats
+
+
+def _vcard_escape(value):
+    return value.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def export_contacts(rows, fmt, number_header='mobile', chunk_size=500):
+    """Yield the export body for an iterable of (name, number) rows in chunks."""
+    if fmt == 'vcf':
+        for chunk in chunked(rows, chunk_size):
+            yield ''.join(f'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:{_vcard_escape(name)}\r\n'
+                          f'TEL;TYPE=CELL:{number}\r\nEND:VCARD\r\n' for name, number in chunk)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['name', number_header])
+    for chunk in chunked(rows, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,102 @@
+"""Per-user version counters for cheap conditional GETs.
+
+Every write to a user's contacts or call history bumps that user's counter
+for it, after the commit. A response built from those tables can then be
+tagged with the counters (see `etag`) and a revalidation answered with 304
+Not Modified by comparing tags, without querying the tables at all.
+
+Bumping after the commit means a reader can at worst pair new rows with the
+old counter, which only costs one extra full response; it never pairs old
+rows with a new counter, which would be served as fresh until the next write.
+
+VersionStore keeps the counters in the worker process and starts from a new
+random epoch each time, so tags handed out before a restart never match.
+With several workers the counters must be shared: RedisVersionStore keeps
+them in Redis.
+"""
+import threading
+import uuid
+
+CONTACTS = 'contacts'
+HISTORY = 'history'
+
+
+class VersionStore:
+    def __init__(self, epoch=None):
+        self.epoch = epoch or uuid.uuid4().hex[:8]
+        self._versions = {}  # (user_id, kind) -> int
+        self._lock = threading.Lock()
+        self.bumps = 0
+
+    def get(self, user_id, *kinds):
+        return tuple(self._versions.get((user_id, kind), 0) for kind in kinds)
+
+    def bump(self, user_id, kind):
+        with self._lock:
+            key = (user_id, kind)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self.bumps += 1
+
+    def bump_many(self, user_ids, kind):
+        for user_id in set(user_ids):
+            self.bump(user_id, kind)
+
+    def etag(self, user_id, *kinds):
+        """Strong ETag value (unquoted) for a response built from `kinds`."""
+        return '-'.join([self.epoch, str(user_id), *map(str, self.get(user_id, *kinds))])
+
+    def stats(self):
+        return {'users': len({user_id for user_id, _ in self._versions}), 'bumps': self.bumps}
+
+
+class RedisVersionStore:
+    """VersionStore with the same interface, stored in Redis.
+
+    One hash per user (`<prefix><user_id>`, field per kind). The epoch is
+    kept under `<prefix>epoch` and created by the first worker to start, so
+    every worker tags responses alike and a flushed Redis starts a new one.
+    """
+
+    def __init__(self, redis_client, prefix='versions:'):
+        self.redis = redis_client
+        self.prefix = prefix
+        self._epoch_key = prefix + 'epoch'
+        self._stats_key = prefix + 'stats'
+        self.redis.set(self._epoch_key, uuid.uuid4().hex[:8], nx=True)
+
+    @property
+    def epoch(self):
+        return self.redis.get(self._epoch_key) or ''
+
+    def get(self, user_id, *kinds):
+        values = self.redis.hmget(f'{self.prefix}{user_id}', kinds)
+        return tuple(int(v or 0) for v in values)
+
+    def bump(self, user_id, kind):
+        self.bump_many([user_id], kind)
+
+    def bump_many(self, user_ids, kind):
+        user_ids = set(user_ids)
+        pipe = self.redis.pipeline()
+        for user_id in user_ids:
+            pipe.hincrby(f'{self.prefix}{user_id}', kind, 1)
+        pipe.hincrby(self._stats_key, 'bumps', len(user_ids))
+        pipe.execute()
+
+    def etag(self, user_id, *kinds):
+        pipe = self.redis.pipeline()
+        pipe.get(self._epoch_key)
+        pipe.hmget(f'{self.prefix}{user_id}', kinds)
+        epoch, values = pipe.execute()
+        return '-'.join([epoch or '', str(user_id), *(str(int(v or 0)) for v in values)])
+
+    def stats(self):
+        return {'bumps': int(self.redis.hget(self._stats_key, 'bumps') or 0)}
+
+
+def create_version_store(url=None, prefix='versions:'):
+    """In-process counters by default; Redis-backed when given a redis:// URL."""
+    if not url:
+        return VersionStore()
+    import redis
+    return RedisVersionStore(redis.Redis.from_url(url, decode_responses=True), prefix)
@@ -0,0 +1,63 @@
+"""SQLite engine profile shared by app.py and TEST/app.py.
+
+With SQLite's default rollback journal a writer locks out every reader, and
+each commit syncs twice. The 'wal' profile switches to write-ahead logging
+(readers and one writer proceed together), syncs only at checkpoints
+(synchronous=NORMAL), and gives each connection a larger page cache and a
+memory map of the file. 'legacy' leaves SQLite's defaults alone.
+
+Pragmas are set on every new pooled connection. Under gevent a connection
+is held by a request greenlet across any cooperative yield (an LLM call,
+say), so the pool is sized for many concurrent requests instead of
+SQLAlchemy's default 5 + 10 overflow; SQLite connections are cheap.
+"""
+from sqlalchemy import event
+
+PROFILES = {
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # negative means KiB, so 64 MiB
+        'temp_store': 'MEMORY',
+    },
+    'legacy': {},
+}
+
+
+def is_file_sqlite(uri):
+    return uri.startswith('sqlite') and ':memory:' not in uri and uri.rstrip('/') != 'sqlite:'
+
+
+def engine_options(uri, pool_size=20, max_overflow=40, busy_timeout=5.0):
+    """SQLALCHEMY_ENGINE_OPTIONS for `uri`; empty for anything but file SQLite.
+
+    busy_timeout (seconds) is how long a connection waits on another
+    process's write lock before raising "database is locked".
+    """
+    if not is_file_sqlite(uri):
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': 30,
+        'connect_args': {'timeout': busy_timeout},
+    }
+
+
+def install(app, db, profile='wal'):
+    """Set the profile's pragmas on every connection the app's engine opens."""
+    if profile not in PROFILES:
+        raise ValueError(f'Unknown SQLite profile {profile!r}; expected one of {sorted(PROFILES)}')
+    pragmas = PROFILES[profile]
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
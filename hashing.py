@@ -0,0 +1,91 @@
+"""Password hashing off the event loop.
+
+bcrypt is deliberately slow (~100-300ms at the default cost). Called
+inline under gevent it freezes every greenlet on the worker, so one login
+stalls all Socket.IO traffic. PasswordHasher runs hashes on a small pool of
+native threads (bcrypt releases the GIL while it works) and lets the
+calling greenlet wait cooperatively. The number of waiting callers is
+bounded; past that, HasherBusy is raised instead of queueing without limit.
+"""
+import threading
+
+
+class HasherBusy(Exception):
+    pass
+
+
+def _hash_cost(hashed):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    def __init__(self, bcrypt, rounds=12, max_workers=2, max_queue=64):
+        """
+        bcrypt:      the app's flask_bcrypt.Bcrypt instance
+        rounds:      cost for new hashes; stored hashes with another cost are
+                     upgraded on the next successful login (see needs_rehash)
+        max_workers: native hashing threads; 0 hashes inline on the caller
+        max_queue:   callers allowed to wait for a free thread
+        """
+        self._bcrypt = bcrypt
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pool = self._make_pool(max_workers) if max_workers else None
+        self.hashes = 0
+        self.verifications = 0
+        self.rehashes = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _make_pool(max_workers):
+        try:
+            from gevent import monkey
+            if monkey.is_module_patched('threading'):
+                from gevent.threadpool import ThreadPool
+                pool = ThreadPool(max_workers)
+                return lambda fn, *args: pool.spawn(fn, *args).get()
+        except ImportError:
+            pass
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(max_workers, thread_name_prefix='password-hash')
+        return lambda fn, *args: executor.submit(fn, *args).result()
+
+    def _run(self, fn, *args):
+        if self._pool is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy('Too many password checks in progress, try again shortly.')
+        try:
+            return self._pool(fn, *args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        self.hashes += 1
+        return self._run(self._bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        self.verifications += 1
+        return self._run(self._bcrypt.check_password_hash, hashed, password)
+
+    def needs_rehash(self, hashed):
+        return _hash_cost(hashed) != self.rounds
+
+    def verify_and_update(self, password, hashed):
+        """(matches, new hash if the stored one should be replaced else None)."""
+        if not self.verify(password, hashed):
+            return False, None
+        if not self.needs_rehash(hashed):
+            return True, None
+        self.rehashes += 1
+        return True, self.hash(password)
+
+    def stats(self):
+        return {'hashes': self.hashes, 'verifications': self.verifications, 'rehashes': self.rehashes,
+                'rejected': self.rejected, 'max_workers': self.max_workers}
@@ -0,0 +1,116 @@
+"""Write-behind queue for call-history rows.
+
+Signaling handlers used to commit one CallHistory row each, delaying the
+reply until SQLite had synced. HistoryWriter.add() only appends to a deque;
+a background task drains it in multi-row inserts once `flush_size` rows
+are waiting or `flush_interval` seconds have passed, whichever comes first.
+Rows still queued at interpreter exit are written by close().
+
+The task runs on the app's own async primitives (a greenlet under gevent)
+rather than a native thread: SQLAlchemy's pool locks are gevent-patched and
+cannot be shared with a foreign OS thread. One batched commit per interval
+replaces one commit per signaling event.
+"""
+import atexit
+import collections
+import time
+from datetime import datetime, timezone
+
+
+class HistoryWriter:
+    def __init__(self, write, spawn, sleep, flush_size=200, flush_interval=0.2, max_queue=100000, retries=3):
+        """
+        write:          write(rows) inserts a list of column dicts in one transaction
+        spawn/sleep:    background task primitives (socketio.start_background_task
+                        and socketio.sleep in the apps)
+        flush_size:     most rows per insert; a full batch is flushed without
+                        waiting for the interval
+        flush_interval: longest a row waits in the queue, seconds
+        max_queue:      add() drops (and counts) rows beyond this backlog
+        retries:        attempts per batch; a batch that still fails is
+                        written row by row and only the failing rows dropped
+        """
+        self._write = write
+        self._sleep = sleep
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retries = retries
+        self._queue = collections.deque()
+        self._closed = False
+        self.queued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        spawn(self._run)
+        atexit.register(self.close)
+
+    def add(self, **row):
+        """Queue one row; never blocks. Returns False if it had to be dropped."""
+        if self._closed or len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return False
+        self._queue.append(row)
+        self.queued += 1
+        return True
+
+    def depth(self):
+        return len(self._queue)
+
+    def _run(self):
+        # Wake often enough to notice a full batch, but never spin
+        tick = min(self.flush_interval, 0.01)
+        last_flush = time.monotonic()
+        while not self._closed:
+            self._sleep(tick)
+            if len(self._queue) >= self.flush_size or (
+                    self._queue and time.monotonic() - last_flush >= self.flush_interval):
+                self._drain()
+                last_flush = time.monotonic()
+
+    def _drain(self):
+        queue = self._queue
+        while queue:
+            batch = [queue.popleft() for _ in range(min(self.flush_size, len(queue)))]
+            if self._try_write(batch, self.retries):
+                continue
+            if len(batch) == 1:
+                self.dropped += 1
+                continue
+            # A batch that keeps failing may hold one row the database rejects;
+            # write the rows one at a time so only the bad ones are lost
+            for row in batch:
+                if not self._try_write([row], 1):
+                    self.dropped += 1
+
+    def _try_write(self, rows, attempts):
+        for attempt in range(attempts):
+            if attempt:
+                self._sleep(self.flush_interval)
+            try:
+                self._write(rows)
+            except Exception as e:
+                self.errors += 1
+                print(f'Call history write failed ({len(rows)} rows, attempt {attempt + 1}): {e}')
+            else:
+                self.written += len(rows)
+                self.batches += 1
+                return True
+        return False
+
+    def close(self):
+        """Stop the background task and write whatever is still queued."""
+        if self._closed:
+            return
+        self._closed = True
+        self._drain()
+
+    def stats(self):
+        return {'depth': len(self._queue), 'queued': self.queued, 'written': self.written,
+                'batches': self.batches, 'dropped': self.dropped, 'errors': self.errors}
+
+
+def utcnow():
+    """Naive UTC, the same clock as SQL CURRENT_TIMESTAMP defaults."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
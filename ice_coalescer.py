@@ -0,0 +1,67 @@
+"""Coalesce trickled ICE candidates into fewer Socket.IO frames.
+
+A call setup trickles dozens of candidates per side. Instead of relaying
+each one as its own emit, candidates are buffered per (sender, target) pair
+and sent as one array when the coalescing window closes or when the sender
+signals end-of-candidates, whichever comes first.
+"""
+import time
+
+
+class IceCoalescer:
+    def __init__(self, window, flush, spawn, sleep, clock=time.perf_counter):
+        """
+        window: seconds to hold the first buffered candidate
+        flush:  flush(sender, target, candidates) performs the actual emit
+        spawn/sleep: background task primitives (socketio.start_background_task
+                     and socketio.sleep in the apps)
+        """
+        self.window = window
+        self._flush_fn = flush
+        self._spawn = spawn
+        self._sleep = sleep
+        self._clock = clock
+        self._buffers = {}  # (sender, target) -> [first_buffered_at, candidates]
+        self.candidates = 0
+        self.frames = 0
+        self.added_latency_total = 0.0
+        self.added_latency_max = 0.0
+
+    def add(self, sender, target, candidate):
+        """Buffer a candidate; None marks end-of-candidates and flushes now."""
+        key = (sender, target)
+        if candidate is None:
+            self._flush(key)
+            return
+        self.candidates += 1
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = [self._clock(), []]
+            self._spawn(self._flush_later, key, buf)
+        buf[1].append(candidate)
+
+    def _flush_later(self, key, buf):
+        self._sleep(self.window)
+        # Skip if end-of-candidates already flushed this buffer
+        if self._buffers.get(key) is buf:
+            self._flush(key)
+
+    def _flush(self, key):
+        buf = self._buffers.pop(key, None)
+        if not buf or not buf[1]:
+            return
+        latency = self._clock() - buf[0]
+        self.frames += 1
+        self.added_latency_total += latency
+        self.added_latency_max = max(self.added_latency_max, latency)
+        self._flush_fn(key[0], key[1], buf[1])
+
+    def pending(self):
+        return sum(len(buf[1]) for buf in self._buffers.values())
+
+    def stats(self):
+        return {'candidates': self.candidates, 'frames': self.frames,
+                'frames_saved': self.candidates - self.frames - self.pending(),
+                'pending': self.pending(),
+                'added_latency_avg_ms': self.added_latency_total / self.frames * 1000 if self.frames else 0.0,
+                'added_latency_max_ms': self.added_latency_max * 1000}
@@ -0,0 +1,61 @@
+"""Short-lived cache of user rows for session lookups.
+
+Every authenticated request (Flask-Login's user_loader, TEST's
+session['user_id'] checks) loads the same user row by primary key. The
+cache keeps a snapshot of the row's columns for `ttl` seconds and rebuilds
+a session-attached instance from it without a query. Updating or deleting
+a user through the ORM drops its entry in this process. Other workers keep
+their copy until the TTL runs out, so keep the TTL short. Bulk
+query.update() calls bypass the ORM events and are not seen at all.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+
+from cache import MemoryCache
+
+
+class IdentityCache:
+    def __init__(self, db, model, ttl=30, max_entries=10000):
+        """ttl: seconds a snapshot is trusted; 0 always queries the database."""
+        self._db = db
+        self._model = model
+        self._columns = [attr.key for attr in inspect(model).column_attrs]
+        self.ttl = ttl
+        self._cache = MemoryCache(max_entries, ttl)
+        event.listen(model, 'after_update', self._changed)
+        event.listen(model, 'after_delete', self._changed)
+
+    def _changed(self, mapper, connection, target):
+        self.invalidate(target.id)
+
+    def get(self, user_id):
+        """The user with this id attached to the current session, or None."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            return None
+        if self.ttl <= 0:
+            return self._db.session.get(self._model, user_id)
+
+        snapshot = self._cache.get(user_id)
+        if snapshot is None:
+            user = self._db.session.get(self._model, user_id)
+            if user is not None:
+                self._cache.set(user_id, {key: getattr(user, key) for key in self._columns})
+            return user
+
+        user = self._model(**snapshot)
+        make_transient_to_detached(user)
+        # load=False attaches the rebuilt row as-is (or returns the copy
+        # already in the session) instead of SELECTing it again
+        return self._db.session.merge(user, load=False)
+
+    def invalidate(self, user_id):
+        self._cache.delete(user_id)
+
+    def stats(self):
+        stats = self._cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['ttl'] = self.ttl
+        return stats
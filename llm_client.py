@@ -0,0 +1,185 @@
+"""Shared outbound client for the symptom checker's LLM fallback.
+
+One instance is created at app startup and reused by every request, so
+upstream connections stay in the OpenAI client's keep-alive pool. On top of
+that it bounds the number of in-flight upstream calls, enforces a deadline
+per call, and coalesces identical prompts: while a prompt is in flight,
+later callers wait for that call's answer instead of issuing their own.
+
+stream() relays the completion as it is generated instead. Streams are not
+coalesced (each reader gets its own upstream call) but take a slot like any
+other call, and hand it back as soon as they finish or are closed.
+
+The synchronisation uses `threading` primitives, which gevent's monkey
+patching turns into cooperative ones inside the app.
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import openai
+
+
+class LLMError(Exception):
+    """The upstream LLM call failed."""
+
+
+class LLMTimeout(LLMError):
+    """No answer (or no free upstream slot) before the call's deadline."""
+
+
+class LLMClient:
+    def __init__(self, base_url, api_key, model, max_concurrency=8, timeout=30.0):
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        # No SDK retries: they would run past the caller's deadline
+        self._client = openai.OpenAI(base_url=base_url, api_key=api_key, timeout=timeout, max_retries=0)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.requests = self.upstream_calls = self.coalesced = 0
+        self.timeouts = self.errors = self.active = 0
+        self.streams = self.streams_cancelled = 0
+
+    def complete(self, prompt, timeout=None):
+        """Return the completion text for `prompt`, sharing identical in-flight calls."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(prompt)
+            leader = future is None
+            if leader:
+                future = self._inflight[prompt] = Future()
+            else:
+                self.coalesced += 1
+
+        if leader:
+            try:
+                future.set_result(self._call(prompt, deadline))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._inflight[prompt]
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            self.timeouts += 1
+            raise LLMTimeout('Timed out waiting for a shared LLM call.')
+
+    def _call(self, prompt, deadline):
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.timeouts += 1
+            raise LLMTimeout('Too many LLM requests in flight.')
+        self.active += 1
+        self.upstream_calls += 1
+        try:
+            client = self._client.with_options(timeout=max(0.001, deadline - time.monotonic()))
+            completion = client.chat.completions.create(
+                extra_body={},
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}]
+            )
+            return completion.choices[0].message.content
+        except openai.APITimeoutError:
+            self.timeouts += 1
+            raise LLMTimeout('The LLM did not answer in time.')
+        except openai.OpenAIError as e:
+            self.errors += 1
+            raise LLMError(str(e))
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def stream(self, prompt, timeout=None):
+        """Start a streamed completion; returns a TokenStream of text pieces.
+
+        Waiting for a slot and for the upstream response headers happens
+        here, so those failures raise LLMTimeout/LLMError before anything has
+        been sent to the client. `timeout` bounds that wait and, after it,
+        each wait for the next chunk; a slow but steady stream may run longer.
+        """
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self.requests += 1
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.timeouts += 1
+            raise LLMTimeout('Too many LLM requests in flight.')
+        self.active += 1
+        self.upstream_calls += 1
+        self.streams += 1
+        try:
+            client = self._client.with_options(timeout=max(0.001, deadline - time.monotonic()))
+            upstream = client.chat.completions.create(
+                extra_body={},
+                model=self.model,
+                messages=[{'role': 'user', 'content': prompt}],
+                stream=True
+            )
+        except BaseException as e:
+            self.active -= 1
+            self._slots.release()
+            if isinstance(e, openai.APITimeoutError):
+                self.timeouts += 1
+                raise LLMTimeout('The LLM did not answer in time.')
+            if isinstance(e, openai.OpenAIError):
+                self.errors += 1
+                raise LLMError(str(e))
+            raise
+        return TokenStream(self, upstream)
+
+    def _stream_closed(self, cancelled):
+        if cancelled:
+            self.streams_cancelled += 1
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {'requests': self.requests, 'upstream_calls': self.upstream_calls,
+                'coalesced': self.coalesced, 'timeouts': self.timeouts,
+                'errors': self.errors, 'active': self.active,
+                'streams': self.streams, 'streams_cancelled': self.streams_cancelled,
+                'max_concurrency': self.max_concurrency}
+
+
+class TokenStream:
+    """Text pieces of one streamed completion, in order.
+
+    Iterate it to the end, or close() it to abandon the completion: that
+    drops the upstream connection, so the provider stops generating, and
+    frees the client's slot either way.
+    """
+
+    def __init__(self, client, upstream):
+        self._client = client
+        self._upstream = upstream
+        self._done = False  # read to the end, or failed: either way not cancelled
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self._upstream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            self._done = True
+        except openai.APITimeoutError:
+            self._done = True
+            self._client.timeouts += 1
+            raise LLMTimeout('The LLM stopped sending in time.')
+        except openai.OpenAIError as e:
+            self._done = True
+            self._client.errors += 1
+            raise LLMError(str(e))
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._upstream.close()
+        finally:
+            self._client._stream_closed(cancelled=not self._done)
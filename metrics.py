@@ -0,0 +1,233 @@
+"""In-process counters, gauges and histograms in the Prometheus text format.
+
+Built for the signaling hot path: label values are resolved to a child
+object once (at decoration time for handlers), so recording is an attribute
+update plus, for histograms, one bisect over the bucket bounds. Updates are
+not locked; under gevent handlers are not preempted mid-update, and under
+threads a lost increment is an acceptable price for staying cheap.
+"""
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+# Seconds; tuned for signaling handlers (sub-ms) up to call setup (seconds)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _CounterValue:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Child for these label values; keep a reference to it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, help, labelnames=(), fn=None):
+        """fn: optional callable read at scrape time instead of set()/inc()."""
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def _new_child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def render(self):
+        if self.fn is not None:
+            return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge',
+                    f'{self.name} {_format_value(self.fn())}']
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class StatsCollector:
+    """Expose a component's stats() dict as gauges named <prefix>_<key>."""
+
+    def __init__(self, prefix, help, fn):
+        self.prefix = prefix
+        self.help = help
+        self.fn = fn
+
+    def render(self):
+        lines = []
+        for key, value in self.fn().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f'{self.prefix}_{key}'
+            lines += [f'# HELP {name} {self.help}: {key}', f'# TYPE {name} gauge',
+                      f'{name} {_format_value(value)}']
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def stats(self, prefix, help, fn):
+        return self.register(StatsCollector(prefix, help, fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # A broken collector must not take down the scrape
+                lines.append(f'# {getattr(metric, "name", getattr(metric, "prefix", "?"))} failed: {e}')
+        return '\n'.join(lines) + '\n'
+
+
+def timed(latency, calls=None, errors=None):
+    """Decorator recording a handler's latency, call count and exceptions.
+
+    Takes label children (e.g. HANDLER_SECONDS.labels('call-user')). Extra
+    positional arguments beyond what the handler accepts are dropped, since
+    Flask-SocketIO probes connect handlers by calling them with an auth arg.
+    """
+    def decorator(fn):
+        params = inspect.signature(fn).parameters.values()
+        nargs = None
+        if not any(p.kind == p.VAR_POSITIONAL for p in params):
+            nargs = sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in params)
+        clock = time.perf_counter
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args[:nargs], **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc()
+                raise
+            finally:
+                latency.observe(clock() - start)
+                if calls is not None:
+                    calls.inc()
+        return wrapper
+    return decorator
@@ -0,0 +1,63 @@
+"""Memoized E.164 normalization on top of the phonenumbers library.
+
+phonenumbers.parse + is_valid_number + format_number walk Python-level
+metadata on every call (tens of microseconds), and the same few numbers
+(the user's own, their contacts, whoever they call) come back constantly
+through signup, login and contact handling. Results are kept in a bounded
+LRU keyed by (number as typed, region); invalid numbers are cached too.
+"""
+import functools
+
+import phonenumbers
+
+
+class PhoneNormalizer:
+    def __init__(self, region='US', max_entries=65536):
+        """region: default region for numbers written without a +country code."""
+        if region not in phonenumbers.SUPPORTED_REGIONS:
+            raise ValueError(f'Unknown phone region {region!r}')
+        self.region = region
+        self.max_entries = max_entries
+        self._cached = functools.lru_cache(maxsize=max_entries)(self._to_e164)
+
+    @staticmethod
+    def _to_e164(number, region):
+        try:
+            parsed = phonenumbers.parse(number, region)
+        except phonenumbers.NumberParseException:
+            return None
+        if not phonenumbers.is_valid_number(parsed):
+            return None
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+    def normalize(self, number, region=None):
+        """E.164 form of `number`, or None if it is not a valid number."""
+        if not number:
+            return None
+        return self._cached(number.strip(), region or self.region)
+
+    def normalize_many(self, numbers, region=None):
+        """normalize() over a list; repeats within the list are looked up once."""
+        region = region or self.region
+        cached = self._cached
+        seen = {}
+        results = []
+        for number in numbers:
+            if not number:
+                results.append(None)
+                continue
+            number = number.strip()
+            result = seen.get(number, seen)
+            if result is seen:
+                result = seen[number] = cached(number, region)
+            results.append(result)
+        return results
+
+    def clear(self):
+        self._cached.cache_clear()
+
+    def stats(self):
+        info = self._cached.cache_info()
+        lookups = info.hits + info.misses
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize,
+                'max_entries': self.max_entries, 'hit_rate': info.hits / lookups if lookups else 0.0}
@@ -0,0 +1,194 @@
+"""Who is online, for routing Socket.IO signaling.
+
+A user (mobile number) may be connected from several devices at once, each
+with its own Socket.IO sid. The registry keeps both directions indexed so
+register, disconnect and lookups are all O(1) regardless of how many users
+are online.
+
+PresenceRegistry keeps that state in the worker process. RedisPresenceRegistry
+keeps it in Redis so that several workers or nodes, joined through
+Flask-SocketIO's message_queue, see the same users online.
+"""
+import time
+
+
+class PresenceRegistry:
+    def __init__(self):
+        self._sids = {}     # mobile -> {sid: None}, oldest device first
+        self._mobiles = {}  # sid -> mobile
+        self.connects = 0
+        self.disconnects = 0
+
+    def add(self, mobile, sid):
+        """Register a device; returns True if the user just came online."""
+        previous = self._mobiles.get(sid)
+        if previous == mobile:
+            return False
+        if previous is not None:
+            # The same socket re-registered under another number
+            self.remove_sid(sid)
+        devices = self._sids.get(mobile)
+        came_online = devices is None
+        if came_online:
+            devices = self._sids[mobile] = {}
+        devices[sid] = None
+        self._mobiles[sid] = mobile
+        self.connects += 1
+        return came_online
+
+    def remove_sid(self, sid):
+        """Forget a disconnected socket; returns its mobile number or None."""
+        mobile = self._mobiles.pop(sid, None)
+        if mobile is None:
+            return None
+        devices = self._sids[mobile]
+        del devices[sid]
+        if not devices:
+            del self._sids[mobile]
+        self.disconnects += 1
+        return mobile
+
+    def get(self, mobile):
+        """The most recently registered sid for `mobile`, or None."""
+        devices = self._sids.get(mobile)
+        if not devices:
+            return None
+        return next(reversed(devices))
+
+    def sids(self, mobile):
+        return list(self._sids.get(mobile, ()))
+
+    def mobile_for(self, sid):
+        return self._mobiles.get(sid)
+
+    def is_online(self, mobile):
+        return mobile in self._sids
+
+    __contains__ = is_online
+
+    def mobiles(self):
+        return self._sids.keys()
+
+    def __len__(self):
+        return len(self._sids)
+
+    @property
+    def device_count(self):
+        return len(self._mobiles)
+
+    def stats(self):
+        return {'users': len(self._sids), 'devices': len(self._mobiles),
+                'connects': self.connects, 'disconnects': self.disconnects}
+
+
+class RedisPresenceRegistry:
+    """PresenceRegistry with the same interface, stored in Redis.
+
+    Keys (under `prefix`):
+      user:<mobile>  sorted set of sids, scored by registration time
+      sid:<sid>      mobile number for a sid
+      users          set of mobiles with at least one device
+      stats          hash of counters: connects, disconnects, and devices
+                     (the total size of the user:* sets, so it reads in O(1))
+    """
+
+    def __init__(self, redis_client, prefix='presence:'):
+        self.redis = redis_client
+        self.prefix = prefix
+        self._users_key = prefix + 'users'
+        self._stats_key = prefix + 'stats'
+
+    def _user_key(self, mobile):
+        return f'{self.prefix}user:{mobile}'
+
+    def _sid_key(self, sid):
+        return f'{self.prefix}sid:{sid}'
+
+    def add(self, mobile, sid):
+        previous = self.redis.get(self._sid_key(sid))
+        if previous == mobile:
+            return False
+        if previous is not None:
+            self.remove_sid(sid)
+        user_key = self._user_key(mobile)
+
+        def add_device(pipe):
+            # Under WATCH user_key, like drop_device: the device count only
+            # moves if this sid is really new to the set
+            new = pipe.zscore(user_key, sid) is None
+            pipe.multi()
+            pipe.zadd(user_key, {sid: time.time()})
+            pipe.set(self._sid_key(sid), mobile)
+            pipe.sadd(self._users_key, mobile)
+            pipe.hincrby(self._stats_key, 'connects', 1)
+            if new:
+                pipe.hincrby(self._stats_key, 'devices', 1)
+        return self.redis.transaction(add_device, user_key)[2] == 1
+
+    def remove_sid(self, sid):
+        pipe = self.redis.pipeline()
+        pipe.get(self._sid_key(sid))
+        pipe.delete(self._sid_key(sid))
+        mobile = pipe.execute()[0]
+        if mobile is None:
+            return None
+        user_key = self._user_key(mobile)
+
+        def drop_device(pipe):
+            # Runs under WATCH user_key: retried if another worker adds or
+            # removes a device for this user before EXEC
+            present = pipe.zscore(user_key, sid) is not None
+            remaining = pipe.zcard(user_key) - present
+            pipe.multi()
+            pipe.zrem(user_key, sid)
+            pipe.hincrby(self._stats_key, 'disconnects', 1)
+            if present:
+                pipe.hincrby(self._stats_key, 'devices', -1)
+            if not remaining:
+                pipe.srem(self._users_key, mobile)
+        self.redis.transaction(drop_device, user_key)
+        return mobile
+
+    def get(self, mobile):
+        newest = self.redis.zrange(self._user_key(mobile), -1, -1)
+        return newest[0] if newest else None
+
+    def sids(self, mobile):
+        return self.redis.zrange(self._user_key(mobile), 0, -1)
+
+    def mobile_for(self, sid):
+        return self.redis.get(self._sid_key(sid))
+
+    def is_online(self, mobile):
+        return bool(self.redis.exists(self._user_key(mobile)))
+
+    __contains__ = is_online
+
+    def mobiles(self):
+        return self.redis.smembers(self._users_key)
+
+    def __len__(self):
+        return self.redis.scard(self._users_key)
+
+    @property
+    def device_count(self):
+        return int(self.redis.hget(self._stats_key, 'devices') or 0)
+
+    def stats(self):
+        counters = self.redis.hgetall(self._stats_key)
+        return {'users': len(self), 'devices': int(counters.get('devices', 0)),
+                'connects': int(counters.get('connects', 0)),
+                'disconnects': int(counters.get('disconnects', 0))}
+
+
+def presence_room(mobile):
+    """Socket.IO room of everyone who wants `mobile`'s online/offline changes."""
+    return f'presence:{mobile}'
+
+
+def create_presence_registry(url=None, prefix='presence:'):
+    """In-process registry by default; Redis-backed when given a redis:// URL."""
+    if not url:
+        return PresenceRegistry()
+    import redis
+    return RedisPresenceRegistry(redis.Redis.from_url(url, decode_responses=True), prefix)
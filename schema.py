@@ -0,0 +1,90 @@
+"""One-time schema bootstrap with numbered migrations.
+
+Each app passes its ordered list of migrations; migration N (1-based) runs
+once, inside its own transaction, and is then recorded in the
+schema_migrations table. Migration 1 is conventionally `create_all`, which
+only creates missing tables, so every later migration must cope with a
+database that was created straight at the current models (create indexes
+with checkfirst, add columns only if absent, ...).
+
+Run it at import time so every worker (gunicorn included) starts on an
+up-to-date schema, instead of checking on every request. Workers booting
+together are serialized: each step takes the database's write lock (BEGIN
+IMMEDIATE on SQLite, an advisory lock on PostgreSQL) before it reads the
+version, so a migration is applied by exactly one of them and the others
+wait for it and then see it applied.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, func, select
+from sqlalchemy.exc import IntegrityError
+
+_metadata = MetaData()
+schema_migrations = Table(
+    'schema_migrations', _metadata,
+    Column('version', Integer, primary_key=True),
+    Column('applied_at', DateTime, server_default=func.now()),
+)
+
+
+def current_version(conn):
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+# Key of the PostgreSQL advisory lock held while upgrading
+ADVISORY_LOCK_ID = 0x5348_4d41
+
+
+def lock_for_upgrade(conn):
+    """Start conn's transaction holding a lock no other upgrade can share."""
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        # pysqlite only opens a transaction lazily, before DML; take the
+        # write lock up front (waiting out the busy timeout) instead
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
+    elif dialect == 'postgresql':
+        conn.exec_driver_sql(f'SELECT pg_advisory_xact_lock({ADVISORY_LOCK_ID})')
+    # Elsewhere a racing insert of the same version fails with IntegrityError
+
+
+def upgrade(app, db, migrations):
+    """Apply pending migrations; returns the resulting schema version."""
+    with app.app_context():
+        engine = db.engine
+    with engine.connect() as conn:
+        while True:
+            lock_for_upgrade(conn)
+            try:
+                _metadata.create_all(conn)
+                # Read under the lock: another worker may have just moved it
+                version = current_version(conn)
+                if version >= len(migrations):
+                    conn.commit()
+                    return version
+                migration = migrations[version]
+                migration(conn)
+                conn.execute(schema_migrations.insert().values(version=version + 1))
+                conn.commit()
+            except IntegrityError:
+                # Another worker applied it first; read the version again
+                conn.rollback()
+                continue
+            except BaseException:
+                conn.rollback()
+                raise
+            print(f'Applied schema migration {version + 1}: {migration.__doc__ or migration.__name__}')
+
+
+def create_indexes(*models):
+    """Migration that adds the models' declared indexes to existing tables."""
+    def migration(conn):
+        for model in models:
+            for index in model.__table__.indexes:
+                index.create(conn, checkfirst=True)
+    migration.__doc__ = 'indexes on ' + ', '.join(model.__tablename__ for model in models)
+    return migration
+
+
+def create_tables(db):
+    def migration(conn):
+        db.metadata.create_all(conn)
+    migration.__doc__ = 'create tables'
+    return migration
@@ -4,6 +4,8 @@ document.addEventListener('DOMContentLoaded', () => {
     let localStream;
     let peerConnection;
     let remoteMobileNumber;
+    let incomingCallId; // the server's id for the call we are being offered
+    let callHistoryCursor = null; // `before` for the next page of call history; null on the last page
 
     const servers = {
         iceServers: [
@@ -28,6 +30,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const declineBtn = document.getElementById('decline-btn');
     const contactsList = document.getElementById('contacts-list');
     const callHistoryList = document.getElementById('call-history-list');
+    const loadMoreHistoryBtn = document.getElementById('load-more-history-btn');
     const saveContactBtn = document.getElementById('save-contact-btn');
     const micBtn = document.getElementById('mic-btn');
     const videoBtn = document.getElementById('video-btn');
@@ -46,8 +49,7 @@ document.addEventListener('DOMContentLoaded', () => {
         socket.emit('register', { mobile: currentUser.mobile });
         setupDialerListeners();
         setupCallControlListeners();
-        loadContacts();
-        loadCallHistory();
+        loadDashboard();
         setupContactFormListener();
     };
 
@@ -78,6 +80,7 @@ document.addEventListener('DOMContentLoaded', () => {
         videoBtn.addEventListener('click', toggleVideo);
         answerBtn.addEventListener('click', handleAnswer);
         declineBtn.addEventListener('click', handleDecline);
+        loadMoreHistoryBtn.addEventListener('click', loadMoreCallHistory);
     }
     
     function setupContactFormListener() {
@@ -131,12 +134,12 @@ document.addEventListener('DOMContentLoaded', () => {
         });
 
         peerConnection.onicecandidate = event => {
-            if (event.candidate) {
-                socket.emit('ice-candidate', { 
-                    target_mobile: remoteMobileNumber, 
-                    candidate: event.candidate 
-                });
-            }
+            // event.candidate is null once gathering is done; the server uses
+            // that to flush any candidates it is batching for the peer
+            socket.emit('ice-candidate', { 
+                target_mobile: remoteMobileNumber, 
+                candidate: event.candidate 
+            });
         };
 
         peerConnection.ontrack = event => {
@@ -168,7 +171,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const answer = await peerConnection.createAnswer();
         await peerConnection.setLocalDescription(answer);
 
-        socket.emit('answer-call', { target_mobile: remoteMobileNumber, answer: answer });
+        socket.emit('answer-call', { target_mobile: remoteMobileNumber, answer: answer, call_id: incomingCallId });
         showVideoCallUI();
     };
 
@@ -186,14 +189,14 @@ document.addEventListener('DOMContentLoaded', () => {
         socket.emit('hang-up', { target_mobile: remoteMobileNumber });
         remoteMobileNumber = null;
         hideVideoCallUI();
-        logCallHistory('outgoing', 0); // Assuming duration calculation is needed
-        loadCallHistory();
+        refreshCallHistorySoon();
     };
     
 
     // --- Socket.IO Listeners ---
     socket.on('incoming-call', data => {
         remoteMobileNumber = data.from;
+        incomingCallId = data.call_id;
         incomingCallFrom.textContent = data.from;
         sessionStorage.setItem('webrtcOffer', JSON.stringify(data.offer));
         incomingCallModal.show();
@@ -203,14 +206,23 @@ document.addEventListener('DOMContentLoaded', () => {
         await peerConnection.setRemoteDescription(new RTCSessionDescription(data.answer));
     });
 
-    socket.on('ice-candidate', async data => {
-        if (peerConnection && data.candidate) {
+    const addIceCandidate = async candidate => {
+        if (peerConnection && candidate) {
             try {
-                 await peerConnection.addIceCandidate(new RTCIceCandidate(data.candidate));
+                 await peerConnection.addIceCandidate(new RTCIceCandidate(candidate));
             } catch (e) {
                 console.error('Error adding received ice candidate', e);
             }
         }
+    };
+
+    socket.on('ice-candidate', data => addIceCandidate(data.candidate));
+
+    // Batched form, sent when the server coalesces trickled candidates
+    socket.on('ice-candidates', async data => {
+        for (const candidate of data.candidates) {
+            await addIceCandidate(candidate);
+        }
     });
 
     socket.on('hang-up', () => {
@@ -219,9 +231,13 @@ document.addEventListener('DOMContentLoaded', () => {
             peerConnection = null;
         }
         remoteMobileNumber = null;
+        incomingCallModal.hide();
         hideVideoCallUI();
+        refreshCallHistorySoon();
     });
     
+    socket.on('register-failed', data => console.error(data.message));
+
     socket.on('call-failed', data => {
         alert(data.message);
         endCall();
@@ -229,9 +245,22 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
     // --- API Calls & Data Management ---
+    // Both lists in one round trip. The response carries an ETag, so on a
+    // reload the browser revalidates its cached copy and gets a bodiless 304
+    // unless a contact or call was added since.
+    async function loadDashboard() {
+        const response = await fetch('/api/bootstrap');
+        const data = await response.json();
+        renderContacts(data.contacts);
+        renderCallHistory(data.call_history, data.call_history_cursor);
+    }
+
     async function loadContacts() {
         const response = await fetch('/api/contacts');
-        const contacts = await response.json();
+        renderContacts(await response.json());
+    }
+
+    function renderContacts(contacts) {
         contactsList.innerHTML = '';
         if (contacts.length === 0) {
             contactsList.innerHTML = '<li class="list-group-item text-muted">No contacts yet.</li>';
@@ -277,10 +306,30 @@ document.addEventListener('DOMContentLoaded', () => {
 
     async function loadCallHistory() {
         const response = await fetch('/api/call-history');
-        const history = await response.json();
-        callHistoryList.innerHTML = '';
-        if (history.length === 0) {
-            callHistoryList.innerHTML = '<li class="list-group-item text-muted">No call history.</li>';
+        renderCallHistory(await response.json(), response.headers.get('X-Next-Cursor'));
+    }
+
+    // The next page starts after the last row shown; its own X-Next-Cursor
+    // header says whether there is another one
+    async function loadMoreCallHistory() {
+        if (callHistoryCursor === null) return;
+        loadMoreHistoryBtn.disabled = true;
+        try {
+            const response = await fetch(`/api/call-history?before=${encodeURIComponent(callHistoryCursor)}`);
+            renderCallHistory(await response.json(), response.headers.get('X-Next-Cursor'), true);
+        } finally {
+            loadMoreHistoryBtn.disabled = false;
+        }
+    }
+
+    function renderCallHistory(history, cursor, append = false) {
+        callHistoryCursor = cursor === undefined ? null : cursor;
+        loadMoreHistoryBtn.classList.toggle('d-none', callHistoryCursor === null);
+        if (!append) {
+            callHistoryList.innerHTML = '';
+            if (history.length === 0) {
+                callHistoryList.innerHTML = '<li class="list-group-item text-muted">No call history.</li>';
+            }
         }
         history.forEach(log => {
             const li = document.createElement('li');
@@ -298,17 +347,10 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    async function logCallHistory(status, duration) {
-        await fetch('/api/call-history', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                caller_mobile: currentUser.mobile,
-                receiver_mobile: remoteMobileNumber,
-                status: status,
-                duration: duration
-            })
-        });
+    // The server records both sides of a call when it ends and writes them
+    // in batches, so give the write a moment before reloading
+    function refreshCallHistorySoon() {
+        setTimeout(loadCallHistory, 1000);
     }
 
     // --- Start the application ---
@@ -1,52 +1,99 @@
-const CACHE_NAME = 'webrtc-video-call-v1';
-const urlsToCache = [
-  '/',
-  '/login',
-  '/signup',
-  '/dashboard',
-  '/static/css/style.css',
-  '/static/js/auth.js',
-  '/static/js/main.js',
+// Served from /serviceworker.js by assets.py, which fills in the version
+// and the precache list from the static files' content hashes; see
+// build_assets.py. Do not register this file directly.
+const ASSET_VERSION = '__ASSET_VERSION__';
+const PRECACHE_URLS = [/* __PRECACHE_URLS__ */];
+// v2: caches from before only public pages were kept may hold a dashboard;
+// the new name makes activate delete them even if no asset changed
+const CACHE_NAME = `webrtc-video-call-v2-${ASSET_VERSION}`;
+// Pages that look the same to everyone; only these are kept for offline use.
+// Anything behind a login (the dashboard) is never written to CacheStorage,
+// where the next person on a shared device could open it after logout.
+const PUBLIC_PAGES = new Set(['/login', '/signup']);
+
+// Third-party files pinned to a version in their URL
+const CDN_URLS = [
   'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
   'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
   'https://fonts.googleapis.com/css2?family=Poppins:wght@300;400;600&display=swap',
   'https://fonts.googleapis.com/icon?family=Material+Icons',
   'https://cdn.socket.io/4.5.4/socket.io.min.js'
 ];
+const PRECACHED = new Set([...PRECACHE_URLS, ...CDN_URLS]);
 
 self.addEventListener('install', event => {
   event.waitUntil(
     caches.open(CACHE_NAME)
-      .then(cache => {
-        console.log('Opened cache');
-        return cache.addAll(urlsToCache);
-      })
+      .then(cache => cache.addAll([...PRECACHED]))
+      .then(() => self.skipWaiting())
   );
 });
 
-self.addEventListener('fetch', event => {
-  event.respondWith(
-    caches.match(event.request)
-      .then(response => {
-        if (response) {
-          return response;
-        }
-        return fetch(event.request);
-      })
+self.addEventListener('activate', event => {
+  // Every cache but this version's is from an older build
+  event.waitUntil(
+    caches.keys()
+      .then(cacheNames => Promise.all(
+        cacheNames.filter(cacheName => cacheName !== CACHE_NAME).map(cacheName => caches.delete(cacheName))
+      ))
+      .then(() => self.clients.claim())
   );
 });
 
-self.addEventListener('activate', event => {
-  const cacheWhitelist = [CACHE_NAME];
-  event.waitUntil(
-    caches.keys().then(cacheNames => {
-      return Promise.all(
-        cacheNames.map(cacheName => {
-          if (cacheWhitelist.indexOf(cacheName) === -1) {
-            return caches.delete(cacheName);
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') {
+    return;
+  }
+  const url = new URL(request.url);
+
+  // Hashed files, and the pinned CDN files, never change under the same URL
+  if (url.pathname.startsWith('/static/dist/') || PRECACHED.has(request.url)) {
+    event.respondWith(
+      caches.match(request).then(cached => cached || fetch(request).then(response => {
+        if (response.ok && url.pathname.startsWith('/static/dist/')) {
+          const copy = response.clone();
+          caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+        }
+        return response;
+      }))
+    );
+    return;
+  }
+
+  // Unbuilt assets (development) may change at any time: serve the cached
+  // copy, then refresh it for next time
+  if (url.origin === self.location.origin && PRECACHED.has(url.pathname)) {
+    event.respondWith(
+      caches.open(CACHE_NAME).then(cache => cache.match(request).then(cached => {
+        const fetched = fetch(request).then(response => {
+          if (response.ok) {
+            cache.put(request, response.clone());
           }
+          return response;
+        });
+        return cached || fetched;
+      }))
+    );
+    return;
+  }
+
+  // Pages name the current hashed files, so always ask the server first;
+  // the last copy seen is only a fallback for when it can't be reached.
+  // A public URL that redirected (a logged-in /login goes to the dashboard)
+  // served someone's own page, so it is not kept either.
+  if (request.mode === 'navigate' && url.origin === self.location.origin && PUBLIC_PAGES.has(url.pathname)) {
+    event.respondWith(
+      fetch(request)
+        .then(response => {
+          if (response.ok && !response.redirected) {
+            const copy = response.clone();
+            caches.open(CACHE_NAME).then(cache => cache.put(request, copy));
+          }
+          return response;
         })
-      );
-    })
-  );
-});
\ No newline at end of file
+        .catch(() => caches.match(request))
+    );
+  }
+  // Everything else (private pages, API calls, Socket.IO) goes straight to the network
+});
@@ -0,0 +1,82 @@
+"""Shared fixtures: app.py imported once against a throwaway SQLite database."""
+import itertools
+import os
+import sys
+
+# app.py patches at import; do it first so nothing pytest started stays unpatched
+from gevent import monkey
+monkey.patch_all()
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.stub_llm import start_stub  # noqa: E402
+from cache import MemoryCache  # noqa: E402
+from llm_client import LLMClient  # noqa: E402
+
+_mobiles = itertools.count(5550000001)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    # Configuration is read at import, so the environment must be set first
+    os.environ['DATABASE_URL'] = 'sqlite:///' + str(tmp_path_factory.mktemp('db') / 'test.db')
+    os.environ.setdefault('SYMPTOM_LLM_FALLBACK', '0')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    # Free-text checks only ever reach the stub_llm fixture
+    os.environ.pop('OPENROUTER_API_KEY', None)
+    import app as app_module
+    yield app_module
+    app_module.history_writer.close()
+
+
+@pytest.fixture
+def login(app_module):
+    """login(mobile) -> a test client logged in as `mobile`, signed up first if it is new."""
+    def login(mobile, password='test-pass'):
+        client = app_module.app.test_client()
+        client.post('/signup', json={'name': 'Test', 'mobile': mobile, 'password': password, 'account_type': 'patient'})
+        response = client.post('/login', json={'mobile': mobile, 'password': password})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return client
+    return login
+
+
+@pytest.fixture
+def user(app_module, login):
+    """(logged-in test client, user id) for a new account."""
+    mobile = str(next(_mobiles))
+    client = login(mobile)
+    with app_module.app.app_context():
+        user_id = app_module.User.query.filter_by(mobile=mobile).one().id
+    return client, user_id
+
+
+@pytest.fixture
+def connect(app_module, login):
+    """connect(mobile) -> a Socket.IO test client logged in and registered as `mobile`."""
+    clients = []
+
+    def connect(mobile):
+        client = app_module.socketio.test_client(app_module.app, flask_test_client=login(mobile))
+        client.emit('register', {'mobile': mobile})
+        clients.append(client)
+        return client
+    yield connect
+    for client in clients:
+        if client.is_connected():
+            client.disconnect()
+
+
+@pytest.fixture
+def stub_llm(app_module, monkeypatch):
+    """benchmarks/stub_llm.py on localhost, with free-text checks turned on."""
+    server, base_url = start_stub()
+    monkeypatch.setattr(app_module, 'llm_client', LLMClient(base_url, 'stub', 'stub-model', timeout=2.0))
+    monkeypatch.setitem(app_module.app.config, 'SYMPTOM_LLM_FALLBACK', True)
+    monkeypatch.setattr(app_module, 'symptom_cache', MemoryCache())
+    yield server
+    server.shutdown()
@@ -0,0 +1,120 @@
+"""assets.build() output and how assets.install() serves it."""
+import gzip
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+from flask import Flask, url_for
+
+import assets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICE_WORKER = "const CACHE = 'app-' + '__ASSET_VERSION__';\nconst PRECACHE = [/* __PRECACHE_URLS__ */];\n"
+
+# Runs the real service worker in node with just enough of CacheStorage and
+# fetch to see which navigations it writes to the cache
+NAVIGATE = """
+const stored = [];
+const listeners = {};
+const cache = {put: (request, response) => { stored.push(new URL(request.url).pathname); }};
+global.self = {location: {origin: 'https://app.test'}, addEventListener: (name, fn) => { listeners[name] = fn; }};
+global.caches = {open: async () => cache, match: async () => undefined};
+global.fetch = async request => ({ok: true, redirected: request.url.endsWith('?redirected'), clone() { return this; }});
+eval(require('fs').readFileSync(0, 'utf8'));
+(async () => {
+  for (const path of JSON.parse(process.argv[1])) {
+    let responded = null;
+    listeners.fetch({request: {method: 'GET', mode: 'navigate', url: 'https://app.test' + path},
+                     respondWith: promise => { responded = promise; }});
+    await responded;
+  }
+  await new Promise(resolve => setTimeout(resolve, 10));
+  console.log(JSON.stringify(stored));
+})();
+"""
+
+
+@pytest.fixture
+def static(tmp_path):
+    root = tmp_path / 'static'
+    (root / 'js').mkdir(parents=True)
+    (root / 'css').mkdir()
+    (root / 'js' / 'main.js').write_text('console.log("main");\n' * 50)
+    (root / 'css' / 'style.css').write_text('body { margin: 0 }\n')
+    (root / 'js' / 'serviceworker.js').write_text(SERVICE_WORKER)
+    (root / 'manifest.json').write_text('{}')
+    return root
+
+
+def make_app(static):
+    app = Flask(__name__, static_folder=str(static))
+    assets.install(app)
+    return app
+
+
+def test_build_fingerprints_and_compresses(static):
+    manifest = assets.build(str(static))
+    assert sorted(manifest['files']) == ['css/style.css', 'js/main.js']
+    target = manifest['files']['js/main.js']
+    assert target == f"dist/js/main.{assets.content_hash((static / 'js' / 'main.js').read_bytes())}.js"
+    assert gzip.decompress((static / (target + '.gz')).read_bytes()) == (static / 'js' / 'main.js').read_bytes()
+    # Compressing the tiny stylesheet would not save anything
+    assert not (static / (manifest['files']['css/style.css'] + '.gz')).exists()
+    assert json.loads((static / 'dist' / 'assets.json').read_text())['version'] == manifest['version']
+
+    (static / 'js' / 'main.js').write_text('changed')
+    rebuilt = assets.build(str(static))
+    assert rebuilt['version'] != manifest['version'] and not (static / target).exists()
+
+
+def test_built_assets_are_served_hashed_and_immutable(static):
+    manifest = assets.build(str(static))
+    app = make_app(static)
+    with app.test_request_context():
+        url = url_for('static', filename='js/main.js')
+    assert url == '/static/' + manifest['files']['js/main.js']
+
+    client = app.test_client()
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['Cache-Control'] == assets.IMMUTABLE
+    assert response.mimetype in ('application/javascript', 'text/javascript')
+    assert 'Content-Disposition' not in response.headers
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers and plain.data.startswith(b'console.log')
+    assert client.get('/static/manifest.json').headers.get('Cache-Control') != assets.IMMUTABLE
+
+
+def test_service_worker_is_filled_from_the_hashes(static):
+    manifest = assets.build(str(static))
+    client = make_app(static).test_client()
+    response = client.get('/serviceworker.js')
+    body = response.get_data(as_text=True)
+    assert json.dumps(manifest['version']) in body
+    assert '/static/' + manifest['files']['js/main.js'] in body and '__PRECACHE_URLS__' not in body
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert client.get('/serviceworker.js', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_unbuilt_tree_is_served_as_before(static):
+    app = make_app(static)
+    with app.test_request_context():
+        assert url_for('static', filename='js/main.js') == '/static/js/main.js'
+    client = app.test_client()
+    assert client.get('/static/js/main.js').headers.get('Cache-Control') != assets.IMMUTABLE
+    body = client.get('/serviceworker.js').get_data(as_text=True)
+    assert '"dev-' in body and '/static/js/main.js' in body
+    assert not os.path.exists(static / 'dist')
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='needs node')
+def test_service_worker_caches_only_public_pages():
+    with open(os.path.join(ROOT, 'static', 'js', 'serviceworker.js')) as f:
+        worker = assets.render_service_worker(f.read(), 'test', [])
+    paths = ['/dashboard', '/login', '/signup', '/login?redirected', '/']
+    result = subprocess.run(['node', '-e', NAVIGATE, json.dumps(paths)], input=worker,
+                            capture_output=True, text=True, timeout=30, check=True)
+    assert json.loads(result.stdout) == ['/login', '/signup']
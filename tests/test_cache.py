@@ -0,0 +1,105 @@
+"""MemoryCache and SQLiteCache: TTL, LRU eviction and counters."""
+import time
+
+import gevent
+import pytest
+
+from cache import MemoryCache, SQLiteCache, create_cache, symptom_cache_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_cache(request, tmp_path):
+    def make(max_entries=1024, ttl=3600):
+        return create_cache(request.param, str(tmp_path / 'cache.db'), max_entries, ttl)
+    return make
+
+
+def tick():
+    # SQLiteCache orders by wall-clock last use; keep successive uses apart
+    time.sleep(0.002)
+
+
+def test_get_set_and_counters(make_cache):
+    cache = make_cache()
+    assert cache.get('a') is None
+    cache.set('a', {'result': 'Flu'})
+    assert cache.get('a') == {'result': 'Flu'}
+    stats = cache.stats()
+    assert {key: stats[key] for key in ('hits', 'misses', 'evictions', 'expirations', 'size')} == \
+        {'hits': 1, 'misses': 1, 'evictions': 0, 'expirations': 0, 'size': 1}
+    cache.delete('a')
+    assert cache.get('a') is None and len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    cache = make_cache(max_entries=2)
+    cache.set('a', 1)
+    tick()
+    cache.set('b', 2)
+    tick()
+    assert cache.get('a') == 1
+    tick()
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1 and len(cache) == 2
+
+
+def test_entries_expire(make_cache):
+    cache = make_cache(ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.06)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1 and len(cache) == 0
+
+
+def test_memory_cache_uses_its_clock():
+    now = [0.0]
+    cache = MemoryCache(ttl=10, clock=lambda: now[0])
+    cache.set('a', 1)
+    now[0] = 9.9
+    assert cache.get('a') == 1
+    now[0] = 10.0
+    assert cache.get('a') is None
+
+
+def test_sqlite_cache_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'shared.db')
+    SQLiteCache(path).set('a', 'Flu')
+    assert SQLiteCache(path).get('a') == 'Flu'
+
+
+def test_create_cache_backends(tmp_path):
+    assert create_cache('none') is None and create_cache('') is None
+    assert isinstance(create_cache('memory'), MemoryCache)
+    with pytest.raises(ValueError, match='redis'):
+        create_cache('redis')
+
+
+def test_symptom_key_ignores_order_case_and_spacing():
+    key = symptom_cache_key('Fever, dry  cough and headache', 'm')
+    assert key == symptom_cache_key('headache;fever\nDry cough', 'm') == 'symptoms:m:dry cough,fever,headache'
+    assert symptom_cache_key('fever', 'other-model') != symptom_cache_key('fever', 'm')
+
+
+def test_sqlite_touches_are_batched(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'), touch_batch=3, touch_interval=3600)
+    for key in 'abc':
+        cache.set(key, 1)
+    for key in 'aab':
+        cache.get(key)
+    assert cache.stats()['touch_flushes'] == 0
+    cache.get('c')  # the third distinct key fills the batch
+    assert cache.stats()['touch_flushes'] == 1
+    assert cache.stats()['pending_touches'] == 0
+    cache.close()
+
+
+def test_sqlite_greenlets_share_one_connection(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.db'))
+    cache.set('a', 1)
+    connection = cache._conn
+    assert all(g.value == 1 for g in gevent.joinall([gevent.spawn(cache.get, 'a') for _ in range(50)]))
+    assert cache._conn is connection
+    cache.close()
@@ -0,0 +1,78 @@
+"""Keyset pagination of GET /api/call-history."""
+from datetime import timedelta
+
+import pytest
+
+
+def seed(app_module, user_id, n, per_second=1):
+    """n history rows, `per_second` of them sharing each timestamp; returns ids newest first."""
+    now = app_module.utcnow().replace(microsecond=0)
+    with app_module.app.app_context():
+        db = app_module.db
+        db.session.execute(db.insert(app_module.CallHistory), [
+            {'caller_mobile': '5550000000', 'receiver_mobile': f'+1202555{i:04d}', 'duration': i,
+             'status': 'outgoing', 'user_id': user_id, 'timestamp': now - timedelta(seconds=i // per_second)}
+            for i in range(n)])
+        db.session.commit()
+        rows = app_module.CallHistory.query.filter_by(user_id=user_id).all()
+    return [h.id for h in sorted(rows, key=lambda h: (h.timestamp, h.id), reverse=True)]
+
+
+def walk(client, limit):
+    """Follow X-Next-Cursor to the end; returns the list of pages of ids."""
+    pages, url = [], f'/api/call-history?limit={limit}'
+    while True:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([row['id'] for row in response.get_json()])
+        cursor = response.headers.get('X-Next-Cursor')
+        if cursor is None:
+            return pages
+        url = f'/api/call-history?limit={limit}&before={cursor}'
+
+
+def test_pages_cover_every_row_once_in_order(app_module, user):
+    client, user_id = user
+    expected = seed(app_module, user_id, 25, per_second=5)
+    pages = walk(client, 7)
+    assert [len(page) for page in pages] == [7, 7, 7, 4]
+    assert [i for page in pages for i in page] == expected
+
+
+def test_exact_multiple_of_the_page_size_has_no_trailing_cursor(app_module, user):
+    client, user_id = user
+    expected = seed(app_module, user_id, 14)
+    pages = walk(client, 7)
+    assert pages == [expected[:7], expected[7:]]
+
+
+def test_cursor_is_scoped_to_the_user(app_module, user):
+    client, user_id = user
+    seed(app_module, user_id, 3)
+    other = seed(app_module, user_id + 1000, 3)
+    assert client.get(f'/api/call-history?before={other[0]}').get_json() == []
+
+
+def test_page_size_is_capped(app_module, user, monkeypatch):
+    client, user_id = user
+    monkeypatch.setitem(app_module.app.config, 'CALL_HISTORY_MAX_PAGE_SIZE', 4)
+    seed(app_module, user_id, 6)
+    assert len(client.get('/api/call-history?limit=100').get_json()) == 4
+
+
+@pytest.mark.parametrize('query', ['limit=ten', 'before=abc', 'before='])
+def test_non_integer_paging_is_a_400(user, query):
+    client, _ = user
+    response = client.get(f'/api/call-history?{query}')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'limit and before must be integers.'}
+
+
+def test_bootstrap_returns_the_first_page_and_its_cursor(app_module, user, monkeypatch):
+    client, user_id = user
+    monkeypatch.setitem(app_module.app.config, 'CALL_HISTORY_PAGE_SIZE', 5)
+    expected = seed(app_module, user_id, 8)
+    data = client.get('/api/bootstrap').get_json()
+    assert [row['id'] for row in data['call_history']] == expected[:5]
+    assert data['call_history_cursor'] == expected[4]
+    assert data['contacts'] == []
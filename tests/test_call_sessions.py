@@ -0,0 +1,149 @@
+"""CallSessionTable and RedisCallSessionTable transitions (across workers for Redis), and the TimerWheel."""
+import pytest
+
+from call_sessions import CallSessionTable, RedisCallSessionTable, TimerWheel, create_call_sessions
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def make_tables(request, clock):
+    """make_tables(n) -> (n tables sharing state, list of sessions passed to on_end)."""
+    ended = []
+
+    def make(n=1, **options):
+        options = dict({'ring_timeout': 45, 'max_duration': 100, 'clock': clock}, **options)
+        if request.param == 'memory':
+            assert n == 1, 'in-process tables cannot share calls'
+            return [CallSessionTable(ended.append, **options)], ended
+        fakeredis = pytest.importorskip('fakeredis')
+        server = fakeredis.FakeServer()
+        return [RedisCallSessionTable(fakeredis.FakeRedis(server=server, decode_responses=True), ended.append,
+                                      **options) for _ in range(n)], ended
+    make.backend = request.param
+    return make
+
+
+@pytest.fixture
+def table(make_tables):
+    """One table whose ended sessions are collected in table.ended_sessions."""
+    (table,), ended = make_tables()
+    table.ended_sessions = ended
+    return table
+
+
+def test_answered_call_is_recorded_once_on_hang_up(table, clock):
+    session = table.offer('111', '222')
+    clock.now += 5
+    assert table.answer('111', '222', session.call_id).call_id == session.call_id
+    clock.now += 60  # past the ring timeout: answered calls are not expired
+    assert table.expire() == []
+    assert table.hang_up('222', '111').end_reason == 'hangup'
+    assert table.hang_up('222', '111') is None
+    assert [(s.end_reason, s.duration()) for s in table.ended_sessions] == [('hangup', 60)]
+    assert len(table) == 0 and table.stats()['ended_hangup'] == 1
+
+
+def test_unanswered_and_abandoned_calls_expire(table, clock):
+    table.offer('111', '222')
+    table.offer('333', '444')
+    table.answer('333', '444')
+    clock.now += 46
+    assert [s.end_reason for s in table.expire()] == ['no-answer']
+    assert table.expire() == []
+    clock.now += 60
+    (expired,) = table.expire()
+    assert expired.end_reason == 'timeout' and expired.duration() >= 100
+    assert len(table) == 0
+
+
+def test_hang_up_before_answer(table):
+    table.offer('111', '222')
+    table.offer('333', '444')
+    assert table.hang_up('222', '111').end_reason == 'declined'
+    assert table.hang_up('333', '444').end_reason == 'cancelled'
+    assert [s.duration() for s in table.ended_sessions] == [0, 0]
+    assert table.ringing == 0
+
+
+def test_reoffer_replaces_the_ringing_call(table):
+    first = table.offer('111', '222')
+    second = table.offer('111', '222')
+    assert [s.end_reason for s in table.ended_sessions] == ['replaced']
+    assert table.find('222', '111').call_id == second.call_id
+    assert table.answer('111', '222', first.call_id) is None  # a stale id is refused
+    assert table.answer('111', '222', second.call_id).call_id == second.call_id
+
+
+def test_only_the_callee_can_answer(table):
+    session = table.offer('111', '222')
+    assert table.answer('333', '222', session.call_id) is None
+    assert table.answer('111', '333', session.call_id) is None
+    assert table.answer('111', '222', session.call_id) is not None
+
+
+def test_drop_user_ends_all_their_calls(table):
+    table.offer('111', '222')
+    table.offer('333', '111')
+    assert sorted(s.end_reason for s in table.drop_user('111')) == ['disconnected', 'disconnected']
+    assert len(table) == 0 and table.ringing == 0
+
+
+def test_discard_and_capacity(make_tables):
+    (table,), ended = make_tables(max_sessions=1)
+    session = table.offer('111', '222')
+    assert table.offer('333', '444') is None and table.stats()['untracked'] == 1
+    table.discard(session)
+    assert len(table) == 0 and ended == []
+    assert table.offer('333', '444') is not None
+
+
+def test_answer_on_another_worker_stops_the_ring_timeout(make_tables, clock):
+    if make_tables.backend == 'memory':
+        pytest.skip('in-process tables do not share calls')
+    (offered_on, answered_on, hung_up_on), ended = make_tables(3)
+    session = offered_on.offer('111', '222')
+    clock.now += 10
+    assert answered_on.answer('111', '222') is not None  # no call_id: found by pair
+    clock.now += 60
+    assert offered_on.expire() == [] and answered_on.expire() == []
+    assert hung_up_on.hang_up('111', '222').call_id == session.call_id
+    assert [(s.end_reason, s.duration()) for s in ended] == [('hangup', 60)]
+    assert offered_on.stats()['ended_hangup'] == 1
+
+
+def test_each_expired_call_is_ended_by_one_worker(make_tables, clock):
+    if make_tables.backend == 'memory':
+        pytest.skip('in-process tables do not share calls')
+    tables, ended = make_tables(3)
+    for i in range(5):
+        tables[i % 3].offer(f'10{i}', f'20{i}')
+    clock.now += 46
+    assert sum(len(table.expire()) for table in tables) == 5
+    assert len(ended) == 5 and len(tables[0]) == 0
+
+
+def test_create_call_sessions():
+    assert isinstance(create_call_sessions(None), CallSessionTable)
+
+
+def test_timer_wheel_spans_more_than_one_turn():
+    wheel = TimerWheel(tick=1.0, slots=4, now=0.0)
+    wheel.schedule('soon', 2.5)
+    wheel.schedule('later', 9.5)
+    assert wheel.advance(2.0) == []
+    assert wheel.advance(3.0) == ['soon']
+    assert wheel.advance(9.0) == [] and len(wheel) == 1
+    assert wheel.advance(100.0) == ['later'] and len(wheel) == 0
+    assert wheel.advance(50.0) == []
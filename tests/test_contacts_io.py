@@ -0,0 +1,87 @@
+"""contacts_io parsing, dedupe and export, and the /api/contacts import/export endpoints."""
+import io
+
+import pytest
+
+import contacts_io
+
+VCARD = (
+    'BEGIN:VCARD\r\nVERSION:3.0\r\nN:Lovelace;Ada;;;\r\nFN:Ada\r\n  Lovelace\r\n'
+    'item1.TEL;TYPE=CELL:+44 20 7946 0018\r\nTEL;VALUE=uri:tel:+442079460019\r\nEND:VCARD\r\n'
+    'BEGIN:VCARD\r\nVERSION:3.0\r\nN:Hopper;Grace;;;\r\nTEL:555-0100\r\nEND:VCARD\r\n'
+    'BEGIN:VCARD\r\nVERSION:3.0\r\nFN:Smith\\, J.\r\nTEL:555-0101\r\nEND:VCARD\r\n'
+)
+
+
+def read(text, kind=None):
+    return list(contacts_io.read_contacts(io.StringIO(text), kind))
+
+
+def test_csv_with_a_header_row_in_any_column_order():
+    assert read('Phone Number,Full Name\n555-0100,Ada\n555-0101,"Smith, J."\n') == \
+        [('Ada', '555-0100'), ('Smith, J.', '555-0101')]
+
+
+def test_csv_without_a_header_is_name_then_number():
+    assert read('Ada,555-0100\nGrace\n\nHopper,555-0101\n') == [('Ada', '555-0100'), ('Grace', ''),
+                                                                 ('Hopper', '555-0101')]
+
+
+def test_vcard_is_sniffed_and_unfolded():
+    assert read(VCARD) == [('Ada Lovelace', '+44 20 7946 0018'), ('Ada Lovelace', '+442079460019'),
+                           ('Grace Hopper', '555-0100'), ('Smith, J.', '555-0101')]
+    assert contacts_io.detect_kind('book.VCF') == 'vcard'
+    assert contacts_io.detect_kind(mimetype='text/csv') == 'csv'
+    assert contacts_io.detect_kind('book.txt') is None
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('+1 (202) 555-0100', '+12025550100'), ('555.0100', '5550100'), ('12', None), ('1+2345', None), ('', None),
+])
+def test_clean_number(raw, expected):
+    assert contacts_io.clean_number(raw) == expected
+
+
+def test_import_dedupes_and_counts_invalid_rows():
+    inserted = []
+    pairs = [('Ada', '555-0100'), ('Ada again', '5550100'), ('Old', '555 0199'), ('', '555-0102'), ('Bad', 'n/a')]
+    stats = contacts_io.import_contacts(pairs, lambda numbers: [contacts_io.clean_number(n) for n in numbers],
+                                        {'5550199'}, inserted.append, chunk_size=2)
+    assert stats == {'imported': 2, 'duplicates': 2, 'invalid': 1}
+    assert inserted == [[('Ada', '5550100')], [('5550102', '5550102')]]
+
+
+def test_import_stops_past_max_rows():
+    with pytest.raises(contacts_io.ContactImportError) as error:
+        contacts_io.import_contacts([('Ada', '5550100')] * 3, lambda numbers: numbers, set(), lambda rows: None,
+                                    chunk_size=2, max_rows=2)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'vcf'])
+def test_export_reads_back(fmt):
+    rows = [('Ada Lovelace', '+442079460018'), ('Smith, J.', '5550101')]
+    body = ''.join(contacts_io.export_contacts(rows, fmt, chunk_size=1))
+    assert read(body) == rows
+
+
+def test_import_and_export_endpoints(user):
+    client, _ = user
+    response = client.post('/api/contacts/import', data='name,mobile\nAda,555-0100\nGrace,555-0101\nAda,5550100\n',
+                           content_type='text/csv')
+    assert response.get_json()['imported'] == 2 and response.get_json()['duplicates'] == 1
+    response = client.post('/api/contacts/import', data={'file': (io.BytesIO(VCARD.encode()), 'book.vcf')})
+    assert response.get_json()['imported'] == 2 and response.get_json()['duplicates'] == 2
+
+    export = client.get('/api/contacts/export?format=vcf')
+    assert export.headers['Content-Disposition'] == 'attachment; filename=contacts.vcf'
+    assert len(read(export.get_data(as_text=True))) == 4
+    assert client.get('/api/contacts/export?format=xlsx').status_code == 400
+
+
+def test_import_is_capped(app_module, user, monkeypatch):
+    client, _ = user
+    monkeypatch.setitem(app_module.app.config, 'CONTACTS_IMPORT_MAX_ROWS', 1)
+    response = client.post('/api/contacts/import', data='Ada,5550100\nGrace,5550101\n', content_type='text/csv')
+    assert response.status_code == 413
+    assert client.get('/api/contacts').get_json() == []
@@ -0,0 +1,73 @@
+"""Per-user version counters and the /api/bootstrap ETags built from them."""
+import pytest
+from sqlalchemy import event
+
+from data_versions import CONTACTS, HISTORY, RedisVersionStore, VersionStore, create_version_store
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def make_store(request):
+    """make_store() -> a store; Redis stores made by one test share a server."""
+    if request.param == 'memory':
+        return VersionStore
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    return lambda: RedisVersionStore(fakeredis.FakeRedis(server=server, decode_responses=True))
+
+
+def test_bumps_change_only_that_users_tag(make_store):
+    store = make_store()
+    assert store.get(1, CONTACTS, HISTORY) == (0, 0)
+    before = store.etag(1, CONTACTS, HISTORY)
+    store.bump(1, CONTACTS)
+    store.bump_many([1, 1, 2], HISTORY)
+    assert store.get(1, CONTACTS, HISTORY) == (1, 1) and store.get(2, CONTACTS, HISTORY) == (0, 1)
+    assert store.etag(1, CONTACTS, HISTORY) != before
+    assert store.etag(1, CONTACTS, HISTORY) == f'{store.epoch}-1-1-1'
+    assert store.stats()['bumps'] == 3
+
+
+def test_epoch_is_per_boot_in_process_and_shared_in_redis(make_store):
+    first, second = make_store(), make_store()
+    if isinstance(first, VersionStore):
+        assert first.epoch != second.epoch
+    else:
+        first.bump(1, CONTACTS)
+        assert first.epoch == second.epoch and second.etag(1, CONTACTS) == first.etag(1, CONTACTS)
+
+
+def test_create_version_store():
+    assert isinstance(create_version_store(None), VersionStore)
+
+
+def test_revalidation_is_answered_without_queries(app_module, user):
+    client, _ = user
+    first = client.get('/api/bootstrap')
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'private, no-cache'
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        again = client.get('/api/bootstrap', headers={'If-None-Match': first.headers['ETag']})
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert again.status_code == 304 and again.headers['ETag'] == first.headers['ETag']
+    assert statements == []
+
+
+def test_contact_and_history_writes_change_the_tag(app_module, user):
+    client, user_id = user
+    tags = [client.get('/api/bootstrap').headers['ETag']]
+    client.post('/api/contacts', json={'name': 'Ada', 'mobile': '5550100'})
+    tags.append(client.get('/api/bootstrap').headers['ETag'])
+    app_module.write_call_history([{'caller_mobile': '1', 'receiver_mobile': '2', 'duration': 0,
+                                    'status': 'outgoing', 'user_id': user_id, 'timestamp': app_module.utcnow()}])
+    response = client.get('/api/bootstrap', headers={'If-None-Match': tags[-1]})
+    assert response.status_code == 200 and len(set(tags + [response.headers['ETag']])) == 3
+    assert [c['name'] for c in response.get_json()['contacts']] == ['Ada']
+    assert len(response.get_json()['call_history']) == 1
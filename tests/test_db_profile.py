@@ -0,0 +1,57 @@
+"""db_profile engine options and pragmas."""
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+import db_profile
+
+
+@pytest.mark.parametrize('uri, expected', [
+    ('sqlite:///database.db', True), ('sqlite:////tmp/x.db', True),
+    ('sqlite://', False), ('sqlite:///:memory:', False), ('postgresql://localhost/app', False),
+])
+def test_only_file_sqlite_gets_pool_options(uri, expected):
+    assert db_profile.is_file_sqlite(uri) is expected
+    options = db_profile.engine_options(uri, pool_size=7, busy_timeout=2.5)
+    if expected:
+        assert (options['pool_size'], options['connect_args']) == (7, {'timeout': 2.5})
+    else:
+        assert options == {}
+
+
+def make_db(path, profile):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_profile.engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    db = SQLAlchemy(app)
+    db_profile.install(app, db, profile)
+    return app, db
+
+
+def pragma(app, db, name):
+    with app.app_context():
+        return db.session.execute(db.text(f'PRAGMA {name}')).scalar()
+
+
+def test_wal_profile_sets_pragmas_on_new_connections(tmp_path):
+    app, db = make_db(tmp_path / 'wal.db', 'wal')
+    assert pragma(app, db, 'journal_mode') == 'wal'
+    assert pragma(app, db, 'synchronous') == 1  # NORMAL
+    assert pragma(app, db, 'cache_size') == -64 * 1024
+
+
+def test_legacy_profile_keeps_sqlite_defaults(tmp_path):
+    app, db = make_db(tmp_path / 'legacy.db', 'legacy')
+    assert pragma(app, db, 'journal_mode') == 'delete'
+
+
+def test_unknown_profile_is_refused(tmp_path):
+    with pytest.raises(ValueError, match='Unknown SQLite profile'):
+        make_db(tmp_path / 'x.db', 'fast')
+
+
+def test_app_engine_uses_the_wal_profile(app_module):
+    with app_module.app.app_context():
+        engine = app_module.db.engine
+        assert engine.pool.size() == 20
+        assert app_module.db.session.execute(app_module.db.text('PRAGMA journal_mode')).scalar() == 'wal'
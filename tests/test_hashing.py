@@ -0,0 +1,76 @@
+"""PasswordHasher: bcrypt off the hub, bounded waiting, and cost upgrades at login."""
+import threading
+
+import pytest
+from flask_bcrypt import Bcrypt
+
+from hashing import HasherBusy, PasswordHasher
+
+
+@pytest.fixture(scope='module')
+def bcrypt():
+    return Bcrypt()
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_hash_and_verify(bcrypt, workers):
+    hasher = PasswordHasher(bcrypt, rounds=4, max_workers=workers)
+    hashed = hasher.hash('s3cret')
+    assert hashed.startswith('$2b$04$')
+    assert hasher.verify('s3cret', hashed) and not hasher.verify('wrong', hashed)
+    assert hasher.stats()['hashes'] == 1 and hasher.stats()['verifications'] == 2
+
+
+def test_stale_cost_is_upgraded_only_on_a_match(bcrypt):
+    old = PasswordHasher(bcrypt, rounds=5, max_workers=0).hash('s3cret')
+    hasher = PasswordHasher(bcrypt, rounds=4, max_workers=0)
+    assert hasher.verify_and_update('wrong', old) == (False, None)
+    matches, new_hash = hasher.verify_and_update('s3cret', old)
+    assert matches and new_hash.startswith('$2b$04$') and hasher.stats()['rehashes'] == 1
+    assert hasher.verify_and_update('s3cret', new_hash) == (True, None)
+    assert hasher.needs_rehash('not a hash')
+
+
+def test_callers_past_the_queue_are_refused(bcrypt):
+    hasher = PasswordHasher(bcrypt, rounds=4, max_workers=1, max_queue=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow(*args):
+        started.set()
+        release.wait(5)
+        return True
+
+    hasher._bcrypt = type('Slow', (), {'check_password_hash': staticmethod(slow)})()
+    worker = threading.Thread(target=hasher.verify, args=('a', 'b'))
+    worker.start()
+    assert started.wait(5)
+    with pytest.raises(HasherBusy):
+        hasher.verify('a', 'b')
+    release.set()
+    worker.join(5)
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.verify('a', 'b')
+
+
+def test_login_upgrades_the_stored_hash(app_module, user):
+    client, user_id = user
+    with app_module.app.app_context():
+        account = app_module.db.session.get(app_module.User, user_id)
+        account.password = PasswordHasher(app_module.bcrypt, rounds=5, max_workers=0).hash('secret')
+        app_module.db.session.commit()
+        mobile = account.mobile
+    response = client.post('/login', json={'mobile': mobile, 'password': 'secret'})
+    assert response.status_code == 200
+    with app_module.app.app_context():
+        assert app_module.db.session.get(app_module.User, user_id).password.startswith('$2b$04$')
+
+
+def test_signup_answers_503_when_busy(app_module, monkeypatch):
+    def busy(*args):
+        raise HasherBusy('Too many password checks in progress, try again shortly.')
+
+    monkeypatch.setattr(app_module.password_hasher, 'hash', busy)
+    response = app_module.app.test_client().post('/signup', json={'name': 'A', 'mobile': '5550000999', 'password': 'pw',
+                                            'account_type': 'patient'})
+    assert response.status_code == 503 and response.get_json()['success'] is False
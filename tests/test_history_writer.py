@@ -0,0 +1,122 @@
+"""HistoryWriter batching, retries and backpressure, with the flush loop driven by hand."""
+import pytest
+
+from history_writer import HistoryWriter
+
+
+class Store:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def write(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        self.batches.append(list(rows))
+
+
+def make_writer(store, **options):
+    # The flush loop is never started; tests call _drain()/close() themselves
+    return HistoryWriter(store.write, spawn=lambda fn: None, sleep=lambda seconds: None, **options)
+
+
+def test_rows_are_written_in_batches_of_flush_size():
+    store = Store()
+    writer = make_writer(store, flush_size=2)
+    for i in range(5):
+        assert writer.add(duration=i)
+    assert store.batches == [] and writer.depth() == 5
+    writer._drain()
+    assert [[row['duration'] for row in batch] for batch in store.batches] == [[0, 1], [2, 3], [4]]
+    assert writer.stats() == {'depth': 0, 'queued': 5, 'written': 5, 'batches': 3, 'dropped': 0, 'errors': 0}
+
+
+def test_failed_writes_are_retried():
+    store = Store(failures=2)
+    writer = make_writer(store, retries=3)
+    writer.add(duration=1)
+    writer._drain()
+    assert store.batches == [[{'duration': 1}]]
+    assert (writer.errors, writer.written, writer.dropped) == (2, 1, 0)
+
+
+def test_a_bad_row_only_drops_itself():
+    store = Store()
+    write = store.write
+
+    def reject_negative(rows):
+        if any(row['duration'] < 0 for row in rows):
+            raise ValueError('CHECK constraint failed')
+        write(rows)
+    writer = HistoryWriter(reject_negative, spawn=lambda fn: None, sleep=lambda seconds: None, retries=2)
+    for duration in (1, -1, 2):
+        writer.add(duration=duration)
+    writer._drain()
+    assert store.batches == [[{'duration': 1}], [{'duration': 2}]]
+    assert (writer.written, writer.dropped, writer.errors) == (2, 1, 3)
+
+
+def test_backlog_beyond_max_queue_is_dropped():
+    writer = make_writer(Store(), max_queue=2)
+    assert writer.add(duration=1) and writer.add(duration=2)
+    assert writer.add(duration=3) is False
+    assert writer.stats()['dropped'] == 1 and writer.depth() == 2
+
+
+def test_close_writes_what_is_queued_and_refuses_more():
+    store = Store()
+    writer = make_writer(store)
+    writer.add(duration=1)
+    writer.close()
+    assert store.batches == [[{'duration': 1}]]
+    assert writer.add(duration=2) is False
+
+
+def test_posted_rows_reach_the_database(app_module, user):
+    client, _ = user
+    row = {'caller_mobile': '5550000000', 'receiver_mobile': '5550000009', 'duration': 42, 'status': 'outgoing'}
+    assert client.post('/api/call-history', json=row).status_code == 202
+    app_module.socketio.sleep(app_module.app.config['CALL_HISTORY_FLUSH_INTERVAL'] + 0.1)
+    (listed,) = client.get('/api/call-history').get_json()
+    assert {k: listed[k] for k in row} == row
+
+
+@pytest.mark.parametrize('missing', ['caller_mobile', 'receiver_mobile', 'status'])
+def test_post_requires_the_call_fields(user, missing):
+    client, _ = user
+    row = {'caller_mobile': '5550000000', 'receiver_mobile': '5550000009', 'status': 'outgoing'}
+    del row[missing]
+    assert client.post('/api/call-history', json=row).status_code == 400
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'duration': -5}, 'duration must be a non-negative integer.'),
+    ({'duration': 'long'}, 'duration must be a non-negative integer.'),
+    ({'duration': True}, 'duration must be a non-negative integer.'),
+    ({'status': ['outgoing']}, 'caller_mobile, receiver_mobile and status must be strings of at most 20 characters.'),
+    ({'caller_mobile': 5550000000}, 'caller_mobile, receiver_mobile and status must be strings of at most 20 characters.'),
+    ({'receiver_mobile': '5' * 21}, 'caller_mobile, receiver_mobile and status must be strings of at most 20 characters.'),
+])
+def test_post_validates_before_queueing(app_module, user, change, message):
+    client, _ = user
+    queued = app_module.history_writer.queued
+    row = dict({'caller_mobile': '5550000000', 'receiver_mobile': '5550000009', 'status': 'outgoing'}, **change)
+    response = client.post('/api/call-history', json=row)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': message}
+    assert app_module.history_writer.queued == queued
+
+
+def test_post_coerces_a_numeric_duration(app_module, user):
+    client, _ = user
+    row = {'caller_mobile': '5550000000', 'receiver_mobile': '5550000019', 'status': 'outgoing', 'duration': '17'}
+    assert client.post('/api/call-history', json=row).status_code == 202
+    app_module.socketio.sleep(app_module.app.config['CALL_HISTORY_FLUSH_INTERVAL'] + 0.1)
+    (listed,) = client.get('/api/call-history?limit=1').get_json()
+    assert listed['duration'] == 17
+
+
+def test_post_body_must_be_an_object(user):
+    client, _ = user
+    assert client.post('/api/call-history', json=['5550000000']).status_code == 400
@@ -0,0 +1,52 @@
+"""IceCoalescer batching, driven by a manual clock and scheduler."""
+import pytest
+
+from ice_coalescer import IceCoalescer
+
+
+class Harness:
+    def __init__(self, window=0.02):
+        self.now = 0.0
+        self.timers = []
+        self.frames = []
+        self.coalescer = IceCoalescer(window, self.flush, self.spawn, lambda seconds: None, clock=lambda: self.now)
+
+    def flush(self, sender, target, candidates):
+        self.frames.append((sender, target, list(candidates)))
+
+    def spawn(self, fn, *args):
+        self.timers.append((fn, args))
+
+    def fire_timers(self, after):
+        self.now += after
+        timers, self.timers = self.timers, []
+        for fn, args in timers:
+            fn(*args)
+
+
+@pytest.fixture
+def harness():
+    return Harness()
+
+
+def test_candidates_in_one_window_share_a_frame(harness):
+    for i in range(3):
+        harness.coalescer.add('sid-a', '222', {'candidate': i})
+    harness.coalescer.add('sid-b', '111', {'candidate': 9})
+    assert harness.frames == [] and harness.coalescer.pending() == 4
+    harness.fire_timers(0.02)
+    assert harness.frames == [('sid-a', '222', [{'candidate': 0}, {'candidate': 1}, {'candidate': 2}]),
+                              ('sid-b', '111', [{'candidate': 9}])]
+    stats = harness.coalescer.stats()
+    assert (stats['candidates'], stats['frames'], stats['frames_saved'], stats['pending']) == (4, 2, 2, 0)
+    assert stats['added_latency_max_ms'] == pytest.approx(20.0)
+
+
+def test_end_of_candidates_flushes_at_once(harness):
+    harness.coalescer.add('sid-a', '222', {'candidate': 0})
+    harness.coalescer.add('sid-a', '222', None)
+    assert harness.frames == [('sid-a', '222', [{'candidate': 0}])]
+    harness.fire_timers(0.02)  # the window's own timer finds nothing left to send
+    assert len(harness.frames) == 1
+    harness.coalescer.add('sid-a', '222', None)
+    assert len(harness.frames) == 1
@@ -0,0 +1,84 @@
+"""IdentityCache serves repeat user lookups without a query and forgets rows the ORM changes."""
+import contextlib
+
+import pytest
+from sqlalchemy import event
+
+from identity_cache import IdentityCache
+
+
+@contextlib.contextmanager
+def count_queries(db):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+@pytest.fixture
+def make_cache(app_module):
+    caches = []
+
+    def make(ttl):
+        caches.append(IdentityCache(app_module.db, app_module.User, ttl=ttl))
+        return caches[-1]
+
+    yield make
+    for cache in caches:
+        event.remove(app_module.User, 'after_update', cache._changed)
+        event.remove(app_module.User, 'after_delete', cache._changed)
+
+
+@pytest.fixture
+def cache(make_cache):
+    return make_cache(30)
+
+
+def test_second_lookup_does_not_query(app_module, user, cache):
+    _, user_id = user
+    with app_module.app.app_context():
+        first = cache.get(user_id)
+        app_module.db.session.remove()
+        with count_queries(app_module.db) as statements:
+            again = cache.get(str(user_id))
+        assert statements == []
+        assert (again.id, again.mobile, again.name) == (first.id, first.mobile, first.name)
+        assert again in app_module.db.session
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_orm_update_drops_the_entry(app_module, user, cache):
+    _, user_id = user
+    with app_module.app.app_context():
+        cache.get(user_id)
+        app_module.db.session.remove()
+        cache.get(user_id).name = 'Renamed'
+        app_module.db.session.commit()
+        app_module.db.session.remove()
+        assert cache.get(user_id).name == 'Renamed'
+
+
+def test_zero_ttl_and_bad_ids(app_module, user, make_cache):
+    _, user_id = user
+    cache = make_cache(0)
+    with app_module.app.app_context():
+        with count_queries(app_module.db) as statements:
+            cache.get(user_id)
+            app_module.db.session.remove()
+            cache.get(user_id)
+        assert len(statements) == 2
+        assert cache.get('abc') is None and cache.get(None) is None and cache.get(10 ** 9) is None
+
+
+def test_authenticated_request_loads_the_user_once(app_module, user):
+    client, _ = user
+    client.get('/api/contacts')
+    with app_module.app.app_context(), count_queries(app_module.db) as statements:
+        assert client.get('/api/contacts').status_code == 200
+    assert statements and not any('FROM user' in statement for statement in statements)
@@ -0,0 +1,74 @@
+"""LLMClient against benchmarks/stub_llm.py: pooling, coalescing, bounds and deadlines."""
+import gevent
+import pytest
+
+from benchmarks.stub_llm import start_stub
+from llm_client import LLMClient, LLMError, LLMTimeout
+
+
+@pytest.fixture
+def stub():
+    server, base_url = start_stub()
+    server.base_url = base_url
+    yield server
+    server.shutdown()
+
+
+def concurrently(*calls):
+    jobs = [gevent.spawn(call) for call in calls]
+    gevent.joinall(jobs, raise_error=True)
+    return [job.value for job in jobs]
+
+
+def test_calls_share_one_connection(stub):
+    client = LLMClient(stub.base_url, 'stub', 'stub-model')
+    answers = [client.complete(f'prompt {i}') for i in range(3)]
+    assert answers == ['Stub diagnosis for 8 prompt chars.'] * 3
+    assert stub.requests == 3 and stub.connections == 1
+
+
+def test_identical_prompts_in_flight_are_coalesced(stub):
+    stub.delay = 0.2
+    client = LLMClient(stub.base_url, 'stub', 'stub-model')
+    answers = concurrently(*[lambda: client.complete('fever')] * 5)
+    assert len(set(answers)) == 1
+    assert stub.requests == 1
+    assert client.stats()['upstream_calls'] == 1 and client.stats()['coalesced'] == 4
+
+
+def test_upstream_concurrency_is_bounded(stub):
+    stub.delay = 0.1
+    client = LLMClient(stub.base_url, 'stub', 'stub-model', max_concurrency=2)
+    answers = concurrently(*[lambda i=i: client.complete(f'prompt {i}') for i in range(6)])
+    assert len(answers) == 6
+    assert stub.max_in_flight == 2
+    assert client.stats()['active'] == 0
+
+
+def test_slow_answer_times_out(stub):
+    stub.delay = 0.5
+    client = LLMClient(stub.base_url, 'stub', 'stub-model', timeout=0.1)
+    with pytest.raises(LLMTimeout):
+        client.complete('fever')
+    assert client.stats()['timeouts'] == 1 and client.stats()['active'] == 0
+
+
+def test_waiting_for_a_slot_counts_against_the_deadline(stub):
+    stub.delay = 0.5
+    client = LLMClient(stub.base_url, 'stub', 'stub-model', max_concurrency=1)
+    busy = gevent.spawn(client.complete, 'first')
+    gevent.sleep(0.05)
+    with pytest.raises(LLMTimeout, match='Too many'):
+        client.complete('second', timeout=0.1)
+    busy.join()
+    assert busy.successful()
+
+
+def test_unreachable_upstream_is_an_llm_error(stub):
+    base_url = stub.base_url
+    stub.shutdown()
+    stub.server_close()
+    client = LLMClient(base_url, 'stub', 'stub-model', timeout=2.0)
+    with pytest.raises(LLMError):
+        client.complete('fever')
+    assert client.stats()['errors'] == 1
@@ -0,0 +1,26 @@
+"""A short benchmarks/loadgen.py run against a real app.py: every message arrives and the gates work."""
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_short_run_completes_every_call(tmp_path):
+    summary_path = tmp_path / 'run.json'
+    # An impossible setup-latency bound, so the run must exit 1 after writing its summary
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'loadgen.py'), '--users', '4', '--rate', '4',
+         '--duration', '1', '--hold', '0.2', '--drain', '2', '--candidates', '2',
+         '--json', str(summary_path), '--max-drops', '0', '--max-setup-p99', '0.0001'],
+        capture_output=True, text=True, timeout=120)
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert 'call setup p99' in result.stdout and 'dropped messages' not in result.stdout
+
+    summary = json.loads(summary_path.read_text())
+    calls = summary['calls']
+    assert calls['started'] > 0 and calls['completed'] == calls['started'] and calls['failed'] == 0
+    assert sum(summary['dropped'].values()) == 0
+    assert summary['sent']['ice-candidate'] == calls['started'] * 2 * 2
+    assert summary['server']['cpu_seconds'] >= 0
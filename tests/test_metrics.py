@@ -0,0 +1,83 @@
+"""metrics.py rendering and the /metrics endpoint."""
+import pytest
+
+from metrics import Registry, timed
+
+
+def test_counters_gauges_and_stats_render_as_prometheus_text():
+    registry = Registry()
+    events = registry.counter('events_total', 'Events', ('event',))
+    events.labels('call-user').inc()
+    events.labels('say "hi"\n').inc(2)
+    registry.gauge('online', 'Online users', fn=lambda: 3)
+    registry.stats('cache', 'Cache', lambda: {'hits': 5, 'ratio': 0.5, 'enabled': True, 'name': 'lru'})
+    assert registry.render().splitlines() == [
+        '# HELP events_total Events', '# TYPE events_total counter',
+        'events_total{event="call-user"} 1',
+        'events_total{event="say \\"hi\\"\\n"} 2',
+        '# HELP online Online users', '# TYPE online gauge', 'online 3',
+        '# HELP cache_hits Cache: hits', '# TYPE cache_hits gauge', 'cache_hits 5',
+        '# HELP cache_ratio Cache: ratio', '# TYPE cache_ratio gauge', 'cache_ratio 0.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        latency.observe(value)
+    lines = registry.render().splitlines()[2:]
+    assert lines == ['latency_seconds_bucket{le="0.1"} 1', 'latency_seconds_bucket{le="1"} 3',
+                     'latency_seconds_bucket{le="+Inf"} 4', 'latency_seconds_sum 4.25', 'latency_seconds_count 4']
+
+
+def test_a_broken_collector_does_not_fail_the_scrape():
+    registry = Registry()
+    registry.gauge('broken', 'Broken', fn=lambda: 1 / 0)
+    registry.gauge('fine', 'Fine', fn=lambda: 1)
+    text = registry.render()
+    assert '# broken failed: division by zero' in text and 'fine 1' in text
+
+
+def test_labels_must_match():
+    with pytest.raises(ValueError, match='expects labels'):
+        Registry().counter('events_total', 'Events', ('event',)).labels()
+
+
+def test_timed_counts_calls_errors_and_drops_extra_arguments():
+    registry = Registry()
+    seconds = registry.histogram('seconds', 'Seconds')
+    calls, errors = registry.counter('calls', 'Calls'), registry.counter('errors', 'Errors')
+
+    @timed(seconds.labels(), calls.labels(), errors.labels())
+    def handler(data):
+        if data == 'boom':
+            raise RuntimeError(data)
+        return data
+
+    assert handler('ok', {'auth': None}) == 'ok'
+    with pytest.raises(RuntimeError):
+        handler('boom')
+    assert (calls.labels().value, errors.labels().value, sum(seconds.labels().counts)) == (2, 1, 2)
+
+
+def test_metrics_endpoint(app_module, connect, stub_llm, monkeypatch):
+    connect('7770000101')
+    response = app_module.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert 'signaling_events_total{event="register"}' in text
+    assert 'signaling_online_devices ' in text and 'symptom_llm_requests ' in text
+
+    monkeypatch.setitem(app_module.app.config, 'METRICS_ENABLED', False)
+    assert app_module.app.test_client().get('/metrics').status_code == 404
+
+
+def test_answered_call_records_its_setup_time(app_module, connect):
+    setup = app_module.call_setup_seconds.labels()
+    before = sum(setup.counts)
+    caller, callee = connect('7770000111'), connect('7770000112')
+    caller.emit('call-user', {'caller_mobile': '7770000111', 'target_mobile': '7770000112', 'offer': {}})
+    callee.emit('answer-call', {'target_mobile': '7770000111', 'answer': {}})
+    assert sum(setup.counts) == before + 1
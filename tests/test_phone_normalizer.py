@@ -0,0 +1,54 @@
+"""PhoneNormalizer matches the uncached phonenumbers pipeline and memoizes by (number, region)."""
+import phonenumbers
+import pytest
+
+from phone_normalizer import PhoneNormalizer
+
+NUMBERS = ['(202) 555-0143', '+44 20 7946 0018', '020 7946 0018', '12', 'not a number', ' 202-555-0143 ']
+
+
+def uncached(number, region):
+    try:
+        parsed = phonenumbers.parse(number, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(parsed):
+        return None
+    return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+
+
+@pytest.mark.parametrize('region', ['US', 'GB'])
+def test_matches_phonenumbers(region):
+    normalizer = PhoneNormalizer(region)
+    for number in NUMBERS:
+        assert normalizer.normalize(number) == uncached(number.strip(), region)
+    assert normalizer.normalize('') is None and normalizer.normalize(None) is None
+
+
+def test_region_is_part_of_the_key():
+    normalizer = PhoneNormalizer('US')
+    assert normalizer.normalize('020 7946 0018') is None
+    assert normalizer.normalize('020 7946 0018', 'GB') == '+442079460018'
+
+
+def test_hits_misses_and_bound():
+    normalizer = PhoneNormalizer(max_entries=2)
+    for number in ['2025550143', '2025550143', 'junk', 'junk', '2025550144']:
+        normalizer.normalize(number)
+    stats = normalizer.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (2, 3, 2)
+    assert stats['hit_rate'] == pytest.approx(0.4)
+    normalizer.clear()
+    assert normalizer.stats()['size'] == 0
+
+
+def test_normalize_many_looks_up_repeats_once():
+    normalizer = PhoneNormalizer()
+    batch = ['2025550143', None, '2025550143 ', 'junk', 'junk']
+    assert normalizer.normalize_many(batch) == ['+12025550143', None, '+12025550143', None, None]
+    assert normalizer.stats()['misses'] == 2 and normalizer.stats()['hits'] == 0
+
+
+def test_unknown_region_is_refused():
+    with pytest.raises(ValueError):
+        PhoneNormalizer('XX')
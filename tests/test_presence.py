@@ -0,0 +1,73 @@
+"""PresenceRegistry and RedisPresenceRegistry bookkeeping."""
+import pytest
+
+from presence import PresenceRegistry, RedisPresenceRegistry, create_presence_registry
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def registry(request):
+    if request.param == 'memory':
+        return PresenceRegistry()
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisPresenceRegistry(fakeredis.FakeRedis(decode_responses=True))
+
+
+def test_devices_are_counted_per_sid(registry):
+    assert registry.add('111', 'sid-a') is True
+    assert registry.add('111', 'sid-b') is False
+    assert registry.add('222', 'sid-c') is True
+    assert registry.add('111', 'sid-a') is False  # re-registering changes nothing
+    assert (len(registry), registry.device_count) == (2, 3)
+
+    registry.add('222', 'sid-b')  # the socket switched numbers
+    assert registry.mobile_for('sid-b') == '222'
+    assert registry.device_count == 3
+
+    assert registry.remove_sid('sid-a') == '111'
+    assert registry.remove_sid('sid-a') is None
+    assert '111' not in registry
+    assert (len(registry), registry.device_count) == (1, 2)
+    assert registry.stats()['devices'] == 2
+    assert registry.stats()['connects'] == 4 and registry.stats()['disconnects'] == 2
+
+
+def test_lookups_follow_the_newest_device(registry):
+    registry.add('111', 'sid-a')
+    registry.add('111', 'sid-b')
+    assert registry.get('111') == 'sid-b'
+    assert sorted(registry.sids('111')) == ['sid-a', 'sid-b']
+    registry.remove_sid('sid-b')
+    assert registry.get('111') == 'sid-a'
+    assert registry.get('222') is None and registry.sids('222') == []
+    assert list(registry.mobiles()) == ['111']
+
+
+def test_workers_sharing_redis_see_the_same_users():
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    worker_a, worker_b = (RedisPresenceRegistry(fakeredis.FakeRedis(server=server, decode_responses=True))
+                          for _ in range(2))
+    worker_a.add('111', 'sid-a')
+    assert worker_b.get('111') == 'sid-a' and worker_b.mobile_for('sid-a') == '111'
+    assert worker_b.add('111', 'sid-b') is False
+    worker_a.remove_sid('sid-a')
+    worker_b.remove_sid('sid-b')
+    assert '111' not in worker_a and len(worker_a) == 0
+
+
+def test_redis_device_count_is_one_read():
+    fakeredis = pytest.importorskip('fakeredis')
+    client = fakeredis.FakeRedis(decode_responses=True)
+    registry = RedisPresenceRegistry(client)
+    for i in range(50):
+        registry.add(f'{i:03d}', f'sid-{i}')
+    commands = []
+    original = client.execute_command
+    client.execute_command = lambda *args, **kwargs: commands.append(args[0]) or original(*args, **kwargs)
+    assert registry.device_count == 50
+    assert commands == ['HGET']
+
+
+def test_create_presence_registry():
+    assert isinstance(create_presence_registry(None), PresenceRegistry)
+    assert isinstance(create_presence_registry('redis://localhost:6379/0'), RedisPresenceRegistry)
@@ -0,0 +1,114 @@
+"""schema.upgrade(): numbered migrations applied once, in order, even with several workers booting."""
+import os
+import subprocess
+import sys
+import textwrap
+
+import sqlalchemy
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+import schema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db = SQLAlchemy(app)
+
+    class Item(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(20))
+        __table_args__ = (db.Index('ix_item_name', 'name'),)
+
+    return app, db, Item
+
+
+def inspect(app, db):
+    with app.app_context():
+        return sqlalchemy.inspect(db.engine)
+
+
+def test_fresh_database_is_brought_to_the_latest_version(tmp_path):
+    app, db, Item = make_app(tmp_path / 'app.db')
+    applied = []
+
+    def seed(conn):
+        """seed items"""
+        applied.append('seed')
+        conn.execute(Item.__table__.insert().values(name='first'))
+
+    migrations = [schema.create_tables(db), schema.create_indexes(Item), seed]
+    assert schema.upgrade(app, db, migrations) == 3
+    assert schema.upgrade(app, db, migrations) == 3  # a second boot applies nothing
+    assert applied == ['seed']
+    with app.app_context(), db.engine.connect() as conn:
+        assert schema.current_version(conn) == 3
+        assert conn.execute(Item.__table__.select()).all() == [(1, 'first')]
+    assert [index['name'] for index in inspect(app, db).get_indexes('item')] == ['ix_item_name']
+
+
+def test_only_new_migrations_run(tmp_path):
+    app, db, Item = make_app(tmp_path / 'app.db')
+    schema.upgrade(app, db, [schema.create_tables(db)])
+    assert inspect(app, db).get_indexes('item')  # create_all already made the declared index
+    assert schema.upgrade(app, db, [schema.create_tables(db), schema.create_indexes(Item)]) == 2
+    with app.app_context(), db.engine.connect() as conn:
+        assert schema.current_version(conn) == 2
+
+
+def test_app_schema_is_current_at_import(app_module):
+    with app_module.app.app_context(), app_module.db.engine.connect() as conn:
+        assert schema.current_version(conn) == len(app_module.MIGRATIONS)
+    indexes = {index['name'] for table in ('call_history', 'contact')
+               for index in inspect(app_module.app, app_module.db).get_indexes(table)}
+    assert {'ix_call_history_user_timestamp', 'ix_contact_user_name'} <= indexes
+
+
+def test_contacts_are_listed_by_name(user):
+    client, _ = user
+    for name in ('Zoe', 'Adam', 'Maya'):
+        client.post('/api/contacts', json={'name': name, 'mobile': '5550000000'})
+    assert [c['name'] for c in client.get('/api/contacts').get_json()] == ['Adam', 'Maya', 'Zoe']
+
+
+WORKER = textwrap.dedent('''
+    import sys
+    import time
+    sys.path.insert(0, {root!r})
+    from flask import Flask
+    from flask_sqlalchemy import SQLAlchemy
+    import schema
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = sys.argv[1]
+    db = SQLAlchemy(app)
+
+    class Item(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(20))
+
+    def slow_index(conn):
+        """index on item"""
+        time.sleep(0.3)  # keep the others waiting on the lock
+        conn.exec_driver_sql('CREATE INDEX ix_item_name ON item (name)')  # fails if run twice
+
+    print('version', schema.upgrade(app, db, [schema.create_tables(db), slow_index]))
+''')
+
+
+def test_concurrent_upgrades_apply_each_migration_once(tmp_path):
+    script = tmp_path / 'worker.py'
+    script.write_text(WORKER.format(root=ROOT))
+    url = 'sqlite:///' + str(tmp_path / 'app.db')
+    workers = [subprocess.Popen([sys.executable, str(script), url], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True) for _ in range(4)]
+    results = [worker.communicate(timeout=60) + (worker.returncode,) for worker in workers]
+    for out, err, code in results:
+        assert code == 0, err
+        assert out.splitlines()[-1] == 'version 2'
+    output = ''.join(out for out, _, _ in results)
+    assert output.count('Applied schema migration 1') == 1
+    assert output.count('Applied schema migration 2') == 1
@@ -0,0 +1,127 @@
+"""Socket.IO call signaling in app.py."""
+from ice_coalescer import IceCoalescer
+
+
+def events(client, name):
+    return [event['args'][0] for event in client.get_received() if event['name'] == name]
+
+
+def test_register_requires_a_login(app_module):
+    anonymous = app_module.socketio.test_client(app_module.app)
+    anonymous.emit('register', {'mobile': '7770000071'})
+    assert events(anonymous, 'register-failed')
+    assert not app_module.online_users.is_online('7770000071')
+    anonymous.disconnect()
+
+
+def test_register_cannot_claim_another_number(app_module, login):
+    socket = app_module.socketio.test_client(app_module.app, flask_test_client=login('7770000081'))
+    socket.emit('register', {'mobile': '7770000082'})
+    assert events(socket, 'register-failed')
+    assert not app_module.online_users.is_online('7770000082')
+    assert not app_module.online_users.is_online('7770000081')
+
+    socket.emit('register', {})  # no number: the account's own
+    assert app_module.online_users.is_online('7770000081')
+    socket.disconnect()
+
+
+def test_call_rings_every_device_of_the_callee(connect):
+    caller = connect('7770000001')
+    phone, laptop = connect('7770000002'), connect('7770000002')
+    caller.emit('call-user', {'caller_mobile': '7770000001', 'target_mobile': '7770000002', 'offer': {'sdp': 'o'}})
+    rings = [events(device, 'incoming-call') for device in (phone, laptop)]
+    call_id = rings[0][0]['call_id']
+    assert rings == [[{'from': '7770000001', 'offer': {'sdp': 'o'}, 'call_id': call_id}]] * 2
+
+    phone.emit('answer-call', {'target_mobile': '7770000001', 'answer': {'sdp': 'a'}, 'call_id': call_id})
+    assert events(caller, 'call-answered') == [{'answer': {'sdp': 'a'}}]
+    caller.emit('ice-candidate', {'target_mobile': '7770000002', 'candidate': {'c': 1}})
+    assert events(phone, 'ice-candidate') == [{'candidate': {'c': 1}}]
+    caller.emit('hang-up', {'target_mobile': '7770000002'})
+    assert events(phone, 'hang-up') == [{}]
+
+
+def test_call_to_an_offline_number_fails(connect):
+    caller = connect('7770000011')
+    caller.emit('call-user', {'caller_mobile': '7770000011', 'target_mobile': '7770000019', 'offer': {}})
+    (failed,) = events(caller, 'call-failed')
+    assert '7770000019' in failed['message']
+
+
+def test_disconnect_takes_the_device_offline(app_module, connect):
+    device = connect('7770000021')
+    assert app_module.online_users.is_online('7770000021')
+    device.disconnect()
+    assert not app_module.online_users.is_online('7770000021')
+
+
+def test_coalesced_candidates_arrive_as_one_frame(app_module, connect, monkeypatch):
+    coalescer = IceCoalescer(0.02, app_module.flush_ice_candidates,
+                             app_module.socketio.start_background_task, app_module.socketio.sleep)
+    monkeypatch.setattr(app_module, 'ice_coalescer', coalescer)
+    caller, callee = connect('7770000031'), connect('7770000032')
+    for i in range(3):
+        caller.emit('ice-candidate', {'target_mobile': '7770000032', 'candidate': {'c': i}})
+    caller.emit('ice-candidate', {'target_mobile': '7770000032', 'candidate': None})
+    assert events(callee, 'ice-candidates') == [{'candidates': [{'c': 0}, {'c': 1}, {'c': 2}]}]
+    app_module.socketio.sleep(0.05)
+    assert events(callee, 'ice-candidates') == []
+
+
+def test_end_of_candidates_is_not_relayed_uncoalesced(connect):
+    caller, callee = connect('7770000041'), connect('7770000042')
+    caller.emit('ice-candidate', {'target_mobile': '7770000042', 'candidate': None})
+    assert events(callee, 'ice-candidate') == []
+
+
+def test_hang_up_writes_history_for_account_holders(app_module, user, connect):
+    client, user_id = user
+    with app_module.app.app_context():
+        mobile = app_module.db.session.get(app_module.User, user_id).mobile
+    caller, callee = connect(mobile), connect('7770000052')
+    caller.emit('call-user', {'caller_mobile': mobile, 'target_mobile': '7770000052', 'offer': {}})
+    (ring,) = events(callee, 'incoming-call')
+    callee.emit('answer-call', {'target_mobile': mobile, 'answer': {}, 'call_id': ring['call_id']})
+    callee.emit('hang-up', {'target_mobile': mobile})
+    assert len(app_module.call_sessions) == 0
+    app_module.socketio.sleep(app_module.app.config['CALL_HISTORY_FLUSH_INTERVAL'] * 3)
+    (row,) = client.get('/api/call-history').get_json()
+    assert (row['caller_mobile'], row['receiver_mobile'], row['status']) == (mobile, '7770000052', 'outgoing')
+
+
+def test_last_device_leaving_ends_the_call(app_module, connect):
+    caller, callee = connect('7770000061'), connect('7770000062')
+    caller.emit('call-user', {'caller_mobile': '7770000061', 'target_mobile': '7770000062', 'offer': {}})
+    (ring,) = events(callee, 'incoming-call')
+    callee.disconnect()
+    assert events(caller, 'hang-up') == [{'call_id': ring['call_id']}]
+    assert app_module.call_sessions.find('7770000061', '7770000062') is None
+
+
+def test_unregistered_socket_cannot_place_calls(app_module, connect):
+    offers = app_module.call_sessions.stats()['offered']
+    callee = connect('7770000032')
+    intruder = app_module.socketio.test_client(app_module.app)
+    intruder.emit('call-user', {'caller_mobile': '7770000031', 'target_mobile': '7770000032', 'offer': {}})
+    assert events(intruder, 'call-failed')
+    assert events(callee, 'incoming-call') == []
+    assert app_module.call_sessions.stats()['offered'] == offers
+    intruder.disconnect()
+
+
+def test_caller_is_the_registered_number(app_module, connect):
+    caller, callee = connect('7770000041'), connect('7770000042')
+    caller.emit('call-user', {'caller_mobile': '7770000099', 'target_mobile': '7770000042', 'offer': {}})
+    (incoming,) = events(callee, 'incoming-call')
+    assert incoming['from'] == '7770000041'
+    session = app_module.call_sessions.get(incoming['call_id'])
+    assert (session.caller, session.callee) == ('7770000041', '7770000042')
+
+    # Only the callee's answer connects the call
+    caller.emit('answer-call', {'target_mobile': '7770000042', 'answer': {}, 'call_id': session.call_id})
+    assert app_module.call_sessions.get(session.call_id).state == 'ringing'
+    callee.emit('answer-call', {'target_mobile': '7770000041', 'answer': {}, 'call_id': session.call_id})
+    assert app_module.call_sessions.get(session.call_id).state == 'active'
+    caller.emit('hang-up', {'target_mobile': '7770000042'})
+    assert app_module.call_sessions.get(session.call_id) is None
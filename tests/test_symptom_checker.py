@@ -0,0 +1,150 @@
+"""POST /api/symptom-Checker: the classifier for profiles, the LLM for free text."""
+import json
+
+import pytest
+
+
+PROFILE = {
+    'Fever': 'Yes', 'Cough': 'No', 'Fatigue': 'Yes', 'Difficulty Breathing': 'No',
+    'Age': 42, 'Gender': 'Male', 'Blood Pressure': 'High', 'Cholesterol Level': 'Normal'
+}
+
+
+def test_profile_is_answered_by_the_classifier(user):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'profile': PROFILE})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['source'] == 'classifier'
+    assert len(data['predictions']) == 3
+    assert data['result'] == data['predictions'][0]['disease']
+
+
+def test_invalid_profile_is_a_400(user):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'profile': dict(PROFILE, Fever='maybe')})
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Fever must be one of: No, Yes'}
+
+
+def test_empty_request_is_a_400(user):
+    client, _ = user
+    assert client.post('/api/symptom-Checker', json={}).status_code == 400
+
+
+def test_free_text_needs_the_fallback(user):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'symptoms': 'fever, cough'})
+    assert response.status_code == 400
+    assert 'disabled' in response.get_json()['message']
+
+
+def test_free_text_is_off_without_an_api_key(app_module, user, monkeypatch):
+    assert app_module.app.config['OPENROUTER_API_KEY'] is None and app_module.llm_client is None
+    monkeypatch.setitem(app_module.app.config, 'SYMPTOM_LLM_FALLBACK', True)
+    client, _ = user
+    for path in ('/api/symptom-Checker', '/api/symptom-Checker/stream'):
+        response = client.post(path, json={'symptoms': 'fever, cough'})
+        assert response.status_code == 400
+        assert 'disabled' in response.get_json()['message']
+
+
+@pytest.mark.parametrize('body', [b'["fever"]', b'"fever"', b'42'])
+def test_body_must_be_an_object(user, body):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Expected a JSON object.'}
+
+
+@pytest.mark.parametrize('symptoms', [['fever', 'cough'], {'fever': True}, 42])
+def test_symptoms_must_be_a_string(user, stub_llm, symptoms):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'symptoms': symptoms})
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Symptoms must be a string.'}
+    assert stub_llm.requests == 0
+
+
+def test_free_text_goes_to_the_llm(user, stub_llm):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'symptoms': 'fever, cough'})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['source'] == 'llm'
+    assert data['result'].startswith('Stub diagnosis for')
+    assert stub_llm.requests == 1
+
+
+def test_llm_timeout_is_a_504(app_module, user, stub_llm, monkeypatch):
+    client, _ = user
+    stub_llm.delay = 0.5
+    monkeypatch.setattr(app_module.llm_client, 'timeout', 0.1)
+    response = client.post('/api/symptom-Checker', json={'symptoms': 'fever, cough'})
+    assert response.status_code == 504
+    assert response.get_json()['success'] is False
+
+
+def test_repeated_symptoms_are_served_from_the_cache(user, stub_llm):
+    client, _ = user
+    first = client.post('/api/symptom-Checker', json={'symptoms': 'fever, cough'}).get_json()
+    again = client.post('/api/symptom-Checker', json={'symptoms': 'Cough and fever'}).get_json()
+    assert first['cached'] is False and again['cached'] is True
+    assert again['result'] == first['result']
+    assert stub_llm.requests == 1
+
+
+def test_batch_accepts_a_list_an_object_or_ndjson(user):
+    client, _ = user
+    profiles = [PROFILE, dict(PROFILE, Age=7, Cough='Yes')]
+    ndjson = '\n'.join(json.dumps(p) for p in profiles) + '\n'
+    responses = [
+        client.post('/api/symptom-Checker/batch', json=profiles),
+        client.post('/api/symptom-Checker/batch', json={'profiles': profiles}),
+        client.post('/api/symptom-Checker/batch', data=ndjson, content_type='application/x-ndjson'),
+    ]
+    single = client.post('/api/symptom-Checker', json={'profile': profiles[1]}).get_json()
+    for response in responses:
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert len(results) == 2
+        assert results[1]['result'] == single['result']
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'{"profiles": "Fever"}', 'Expected a list of profiles.'),
+    (json.dumps([PROFILE, {}]).encode(), 'Row 1: Missing field: Fever'),
+])
+def test_batch_errors(user, body, message):
+    client, _ = user
+    response = client.post('/api/symptom-Checker/batch', data=body, content_type='application/json')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': message}
+
+
+@pytest.mark.parametrize('content_type', ['application/json', 'text/plain', 'application/x-ndjson'])
+def test_batch_rejects_malformed_json(user, content_type):
+    client, _ = user
+    response = client.post('/api/symptom-Checker/batch', data=b'{not json', content_type=content_type)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Malformed JSON.'}
+
+
+def test_batch_size_is_capped(app_module, user, monkeypatch):
+    client, _ = user
+    monkeypatch.setitem(app_module.app.config, 'SYMPTOM_BATCH_MAX_ROWS', 2)
+    response = client.post('/api/symptom-Checker/batch', json=[PROFILE] * 3)
+    assert response.status_code == 413
+
+
+def test_login_is_required(app_module):
+    response = app_module.app.test_client().post('/api/symptom-Checker', json={'profile': PROFILE})
+    assert response.status_code in (302, 401)
+
+
+@pytest.mark.parametrize('age', ['nan', 'inf', -1, 121, True])
+def test_out_of_range_age_is_a_400(user, age):
+    client, _ = user
+    response = client.post('/api/symptom-Checker', json={'profile': dict(PROFILE, Age=age)})
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Age must be a number from 0 to 120.'}
@@ -0,0 +1,257 @@
+"""SymptomClassifier against the notebook's sklearn pipeline, and its .npz artifact."""
+import csv
+import hashlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import build_model
+from build_model import ParityError, build, profile_grid, verify_encoder, verify_index
+from symptom_model import (DATASET_PATH, FEATURES, MODEL_PATH, PredictionIndex, ProfileEncoder, ProfileError,
+                           SymptomClassifier, load_classifier)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILE = {
+    'Fever': 'Yes', 'Cough': 'No', 'Fatigue': 'Yes', 'Difficulty Breathing': 'No',
+    'Age': 42, 'Gender': 'Male', 'Blood Pressure': 'High', 'Cholesterol Level': 'Normal'
+}
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return SymptomClassifier.train()
+
+
+def test_scores_match_sklearn_predict_proba(classifier):
+    pd = pytest.importorskip('pandas')
+    from sklearn.linear_model import LogisticRegression
+
+    rows = pd.read_csv(DATASET_PATH)[FEATURES]
+    X = pd.get_dummies(rows).reindex(columns=classifier.columns, fill_value=0).to_numpy(dtype=np.float64)
+    model = LogisticRegression()
+    model.coef_, model.intercept_, model.classes_ = classifier.coef, classifier.intercept, classifier.classes
+    encoded = np.array([classifier.encode(row) for row in rows.to_dict('records')])
+    assert (encoded == X).all()
+    assert np.allclose(classifier.scores(encoded), model.predict_proba(X), rtol=1e-9, atol=1e-12)
+
+
+def test_predict_returns_top_k_best_first(classifier):
+    predictions = classifier.predict(PROFILE, top_k=5)
+    assert len(predictions) == 5
+    probabilities = [p for _, p in predictions]
+    assert probabilities == sorted(probabilities, reverse=True)
+    best = np.argmax(classifier.scores(classifier.encode(PROFILE)[np.newaxis, :])[0])
+    assert predictions[0][0] == str(classifier.classes[best])
+
+
+def test_levels_are_matched_case_insensitively(classifier):
+    assert (classifier.encode(dict(PROFILE, Fever='yes', Gender=' male ')) == classifier.encode(PROFILE)).all()
+    assert (classifier.encode(dict(PROFILE, Age='42')) == classifier.encode(PROFILE)).all()
+
+
+@pytest.mark.parametrize('profile, message', [
+    ({k: v for k, v in PROFILE.items() if k != 'Cough'}, 'Missing field: Cough'),
+    (dict(PROFILE, Fever='maybe'), 'Fever must be one of'),
+    (dict(PROFILE, Age='forty'), 'Age must be a number'),
+    (['Fever'], 'Profile must be an object'),
+])
+def test_invalid_profiles_are_rejected(classifier, profile, message):
+    with pytest.raises(ProfileError, match=message):
+        classifier.predict(profile)
+
+def test_encoder_matches_get_dummies(classifier):
+    pytest.importorskip('pandas')
+    assert verify_encoder(classifier.columns) > 0
+
+
+def test_encoder_check_runs_under_optimize(tmp_path):
+    pytest.importorskip('pandas')
+    # Same data with two feature columns swapped: the encoder check must refuse it even under -O
+    with open(DATASET_PATH, newline='') as f:
+        rows = list(csv.reader(f))
+    a, b = rows[0].index('Fever'), rows[0].index('Cough')
+    for row in rows:
+        row[a], row[b] = row[b], row[a]
+    csv_path = tmp_path / 'swapped.csv'
+    with open(csv_path, 'w', newline='') as f:
+        csv.writer(f).writerows(rows)
+    out_path = tmp_path / 'model.npz'
+    result = subprocess.run([sys.executable, '-O', 'build_model.py', '--csv', str(csv_path), '--out', str(out_path)],
+                            cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 1
+    assert 'CSV header no longer matches' in result.stderr and 'was not written' in result.stderr
+    assert not out_path.exists()
+
+
+def test_encoder_takes_the_feature_order_from_the_csv(classifier):
+    encoder = ProfileEncoder.from_csv_header(classifier.columns)
+    assert encoder.features == FEATURES
+    with pytest.raises(ValueError, match='Smoker'):
+        ProfileEncoder(classifier.columns, FEATURES + ['Smoker'])
+
+
+def test_predict_reuses_its_scratch_row_cleanly(classifier):
+    other = dict(PROFILE, Fever='No', Cough='Yes', Gender='Female', Age=7)
+    first = classifier.predict(PROFILE)
+    assert classifier.predict(other) != first
+    assert classifier.predict(PROFILE) == first
+    expected = classifier.scores(classifier.encode(other)[np.newaxis, :])[0]
+    assert classifier.predict(other, top_k=1)[0][1] == pytest.approx(expected.max())
+
+
+def test_predict_batch_matches_predict(classifier):
+    profiles = [dict(PROFILE, Age=age, Fever=fever) for age in (5, 42, 80) for fever in ('Yes', 'No')]
+    batch = classifier.predict_batch(profiles, top_k=4)
+    assert len(batch) == len(profiles)
+    for profile, predictions in zip(profiles, batch):
+        single = classifier.predict(profile, top_k=4)
+        assert [d for d, _ in predictions] == [d for d, _ in single]
+        assert np.allclose([p for _, p in predictions], [p for _, p in single])
+    assert classifier.predict_batch([]) == []
+
+
+def test_predict_batch_names_the_bad_row(classifier):
+    with pytest.raises(ProfileError, match='Row 1: Missing field: Age'):
+        classifier.predict_batch([PROFILE, {k: v for k, v in PROFILE.items() if k != 'Age'}])
+
+
+def test_artifact_round_trip(classifier, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    classifier.save(path)
+    loaded = SymptomClassifier.load(path)
+    assert (loaded.coef == classifier.coef).all() and (loaded.intercept == classifier.intercept).all()
+    assert list(loaded.classes) == [str(c) for c in classifier.classes]
+    assert loaded.columns == classifier.columns
+    assert loaded.metadata == classifier.metadata
+    assert loaded.predict_model(PROFILE) == classifier.predict(PROFILE)
+
+
+def test_other_artifact_formats_are_refused(classifier, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    classifier.save(path)
+    with np.load(path) as artifact:
+        arrays = dict(artifact)
+    arrays['format'] = np.asarray(arrays['format'] + 1)
+    np.savez(path, **arrays)
+    with pytest.raises(ValueError, match='artifact format'):
+        SymptomClassifier.load(path)
+
+
+def test_missing_artifact_falls_back_to_training(tmp_path):
+    classifier = load_classifier(str(tmp_path / 'missing.npz'))
+    assert classifier.predict(PROFILE)
+
+
+def test_shipped_artifact_matches_the_dataset():
+    with open(DATASET_PATH, 'rb') as f:
+        dataset_sha256 = hashlib.sha256(f.read()).hexdigest()
+    assert SymptomClassifier.load(MODEL_PATH).metadata['dataset_sha256'] == dataset_sha256
+
+
+def test_build_writes_a_loadable_artifact(tmp_path):
+    path = str(tmp_path / 'model.npz')
+    built = build(out_path=path)
+    assert SymptomClassifier.load(path).version == built.version
+
+
+def test_failed_build_keeps_the_previous_artifact(tmp_path, monkeypatch):
+    path = tmp_path / 'model.npz'
+    path.write_bytes(b'previous artifact')
+
+    def mismatch(*args):
+        raise ParityError('encoder mismatch')
+
+    monkeypatch.setattr(build_model, 'verify_encoder', mismatch)
+    with pytest.raises(ParityError):
+        build(out_path=str(path))
+    assert path.read_bytes() == b'previous artifact'
+    assert [p.name for p in tmp_path.iterdir()] == ['model.npz']
+
+
+@pytest.fixture(scope='module')
+def indexed():
+    return load_classifier()
+
+
+def top_classes(predictions):
+    return [disease for disease, _ in predictions]
+
+
+def test_index_matches_model(indexed):
+    grid, agreement, index_accuracy, model_accuracy = verify_index(indexed)
+    assert grid == len(indexed.index)
+    assert agreement == 1.0
+    assert index_accuracy == model_accuracy
+
+
+def test_index_mismatch_is_a_parity_error():
+    classifier = load_classifier()
+    top = classifier.index.top_classes
+    top[7, [0, 1]] = top[7, [1, 0]]
+    with pytest.raises(ParityError, match='top-3 mismatch'):
+        verify_index(classifier)
+
+
+@pytest.mark.parametrize('age_step', [5, 7])
+def test_coarse_index_matches_model_at_scoring_ages(indexed, age_step):
+    index = PredictionIndex.build(indexed, age_step=age_step)
+    ages = index.scoring_ages()
+    # 121 ages in 7-year buckets: the last one runs past 120 and is scored at 120
+    assert max(ages) <= index.age_max
+    for profile in profile_grid(indexed.encoder, ages):
+        assert top_classes(index.lookup(index.key(profile))) == top_classes(indexed.predict_model(profile))
+
+
+def test_index_answers_only_whole_ages(indexed):
+    index = indexed.index
+    assert index.key(PROFILE) is not None
+    assert index.key(dict(PROFILE, Age='42', Fever='yes')) == index.key(PROFILE)
+    assert index.key(dict(PROFILE, Age=42.5)) is None
+    fractional = dict(PROFILE, Age=42.5)
+    assert indexed.predict(fractional) == indexed.predict_model(fractional)
+    assert top_classes(indexed.predict(PROFILE)) == top_classes(indexed.predict_model(PROFILE))
+    assert len(indexed.predict(PROFILE, top_k=5)) == 5
+    batch = indexed.predict_batch([PROFILE, fractional])
+    assert [top_classes(p) for p in batch] == [top_classes(indexed.predict_model(p)) for p in (PROFILE, fractional)]
+
+
+@pytest.mark.parametrize('field, value', [
+    ('Age', 'nan'), ('Age', float('nan')), ('Age', 'inf'), ('Age', -1), ('Age', 121), ('Age', 1e308),
+    ('Age', True), ('Age', 'forty'), ('Fever', True), ('Fever', 1), ('Fever', 0), ('Fever', 'maybe'),
+    ('Gender', None),
+])
+def test_invalid_values_are_rejected(indexed, field, value):
+    profile = dict(PROFILE, **{field: value})
+    for predict in (indexed.predict, indexed.predict_model, lambda p: indexed.predict_batch([p])):
+        with pytest.raises(ProfileError):
+            predict(profile)
+
+
+def test_save_writes_a_fresh_index(indexed, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    indexed.save(path)
+    loaded = SymptomClassifier.load(path)
+    assert loaded.index.model_version == loaded.version
+    assert (loaded.index.top_classes == indexed.index.top_classes).all()
+
+
+def test_stale_index_is_rebuilt(indexed, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    indexed.save(path)
+    with np.load(path) as artifact:
+        arrays = dict(artifact)
+    arrays['index_model_version'] = np.asarray('some-other-model')
+    arrays['index_top_classes'] = np.zeros_like(arrays['index_top_classes'])
+    np.savez(path, **arrays)
+    with pytest.warns(RuntimeWarning, match='prediction index is for model some-other-model'):
+        assert SymptomClassifier.load(path).index is None
+    with pytest.warns(RuntimeWarning):
+        rebuilt = load_classifier(path)
+    assert rebuilt.index.model_version == rebuilt.version
+    assert top_classes(rebuilt.predict(PROFILE)) == top_classes(rebuilt.predict_model(PROFILE))
+    with pytest.warns(RuntimeWarning):
+        assert load_classifier(path, use_index=False).index is None
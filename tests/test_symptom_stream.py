@@ -0,0 +1,91 @@
+"""/api/symptom-Checker/stream against benchmarks/stub_llm.py: SSE relay, cache, and slots freed on early exit."""
+import json
+
+import pytest
+
+from werkzeug.test import EnvironBuilder
+
+
+def parse_events(body):
+    """[(event, data)] from a text/event-stream body."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+def wait_for(condition, app_module, timeout=2.0):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return True
+        app_module.socketio.sleep(0.02)
+    return condition()
+
+
+def test_stream_relays_every_token_then_caches(app_module, user, stub_llm):
+    stub_llm.token_delay = 0.0
+    client, _ = user
+    response = client.post('/api/symptom-Checker/stream', json={'symptoms': 'headache'})
+    assert response.mimetype == 'text/event-stream' and response.headers['Cache-Control'] == 'no-cache'
+    events = parse_events(response.get_data(as_text=True))
+    tokens = [data['text'] for event, data in events if event == 'token']
+    assert len(tokens) == stub_llm.tokens and events[-1] == ('done', {'result': ''.join(tokens), 'cached': False})
+    assert app_module.llm_client.active == 0 and app_module.llm_client.stats()['streams_cancelled'] == 0
+
+    again = parse_events(client.get('/api/symptom-Checker/stream?symptoms=headache').get_data(as_text=True))
+    assert again == [('token', {'text': ''.join(tokens)}), ('done', {'result': ''.join(tokens), 'cached': True})]
+    assert stub_llm.requests == 1
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'symptoms': ['fever', 'cough']}, 'Symptoms must be a string.'),
+    ({'symptoms': 42}, 'Symptoms must be a string.'),
+    (['fever'], 'Expected a JSON object.'),
+])
+def test_bad_input_is_a_json_400(user, stub_llm, body, message):
+    client, _ = user
+    response = client.post('/api/symptom-Checker/stream', json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': message}
+    assert stub_llm.requests == 0
+
+
+def test_upstream_timeout_is_a_json_504(app_module, user, stub_llm, monkeypatch):
+    client, _ = user
+    stub_llm.delay = 0.5
+    monkeypatch.setattr(app_module.llm_client, 'timeout', 0.1)
+    response = client.post('/api/symptom-Checker/stream', json={'symptoms': 'fever'})
+    assert response.status_code == 504 and response.get_json()['success'] is False
+    assert app_module.llm_client.active == 0
+
+
+def test_client_leaving_mid_stream_stops_generation(app_module, user, stub_llm):
+    stub_llm.token_delay = 0.2
+    client, _ = user
+    # The test client would read the whole body, so drive the WSGI app directly
+    environ = EnvironBuilder('/api/symptom-Checker/stream', method='POST', json={'symptoms': 'rash'},
+                             headers={'Cookie': f"session={client.get_cookie('session').value}"}).get_environ()
+    body = app_module.app(environ, lambda status, headers, exc_info=None: None)
+    first = next(iter(body))
+    assert parse_events(first.decode())[0][0] == 'token'
+    body.close()  # what the server does once a write to the gone client fails
+
+    llm = app_module.llm_client
+    assert llm.active == 0 and llm.stats()['streams_cancelled'] == 1
+    assert wait_for(lambda: stub_llm.streams_cancelled == 1, app_module)
+    assert stub_llm.tokens_sent < stub_llm.tokens
+
+
+def test_client_leaving_before_the_first_token_frees_the_slot(app_module, user, stub_llm):
+    stub_llm.token_delay = 0.2
+    client, _ = user
+    environ = EnvironBuilder('/api/symptom-Checker/stream', method='POST', json={'symptoms': 'cough'},
+                             headers={'Cookie': f"session={client.get_cookie('session').value}"}).get_environ()
+    body = app_module.app(environ, lambda status, headers, exc_info=None: None)
+    llm = app_module.llm_client
+    assert llm.active == 1
+    body.close()  # generate() never started, so only the response's close hook can release the stream
+
+    assert llm.active == 0 and llm.stats()['streams_cancelled'] == 1
+    assert wait_for(lambda: stub_llm.streams_cancelled == 1, app_module)
@@ -0,0 +1,103 @@
+"""TEST/app.py publishes presence to contact rooms, not to every connected client."""
+import importlib.util
+import itertools
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_numbers = itertools.count(2025550100)
+
+
+@pytest.fixture(scope='module')
+def test_app(tmp_path_factory, monkeypatch_module):
+    monkeypatch_module.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path_factory.mktemp('test-app') / 'test.db'))
+    monkeypatch_module.setenv('SECRET_KEY', 'test')
+    spec = importlib.util.spec_from_file_location('test_app', os.path.join(ROOT, 'TEST', 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch_module.setitem(sys.modules, 'test_app', module)
+    spec.loader.exec_module(module)
+    yield module
+    module.history_writer.close()
+
+
+@pytest.fixture(scope='module')
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as patch:
+        yield patch
+
+
+@pytest.fixture
+def make_user(test_app):
+    """make_user(*contacts) -> (logged-in HTTP client, number), saving `contacts` as theirs."""
+    def make(*contacts):
+        number = f'+1{next(_numbers)}'
+        with test_app.app.app_context():
+            user = test_app.User(name='Test', mobile_number=number, password_hash='x', is_verified=True)
+            user.contacts = [test_app.Contact(name=c, mobile_number=c) for c in contacts]
+            test_app.db.session.add(user)
+            test_app.db.session.commit()
+            user_id = user.id
+        http = test_app.app.test_client()
+        with http.session_transaction() as session:
+            session['user_id'] = user_id
+        return http, number
+    return make
+
+
+@pytest.fixture
+def connect(test_app):
+    sockets = []
+
+    def connect(http):
+        sockets.append(test_app.socketio.test_client(test_app.app, flask_test_client=http))
+        return sockets[-1]
+    yield connect
+    for socket in sockets:
+        if socket.is_connected():
+            socket.disconnect()
+
+
+def statuses(socket):
+    return [(e['args'][0]['mobile_number'], e['args'][0]['status'])
+            for e in socket.get_received() if e['name'] == 'user_status']
+
+
+def test_status_reaches_only_watchers(make_user, connect):
+    http_a, a = make_user()
+    http_b, b = make_user(a)
+    http_c, _ = make_user()
+    watcher, stranger = connect(http_b), connect(http_c)
+    watcher.get_received(), stranger.get_received()
+
+    device = connect(http_a)
+    assert statuses(watcher) == [(a, 'online')] and statuses(stranger) == []
+    device.disconnect()
+    assert statuses(watcher) == [(a, 'offline')] and statuses(stranger) == []
+
+
+def test_newcomer_gets_only_online_contacts(make_user, connect):
+    http_a, a = make_user()
+    http_b, _ = make_user()
+    http_c, _ = make_user(a, '+12025550000')
+    connect(http_a), connect(http_b)
+    newcomer = connect(http_c)
+    (snapshot,) = [e['args'][0] for e in newcomer.get_received() if e['name'] == 'online_users_list']
+    assert snapshot == [{'mobile_number': a, 'status': 'online'}]
+
+
+def test_added_and_deleted_contacts_change_open_sockets(test_app, make_user, connect):
+    http_a, a = make_user()
+    http_b, _ = make_user()
+    watcher = connect(http_b)
+    http_b.post('/add_contact', data={'contact_name': 'A', 'contact_mobile_number': a})
+    device = connect(http_a)
+    assert statuses(watcher) == [(a, 'online')]
+
+    with test_app.app.app_context():
+        (contact,) = test_app.Contact.query.filter_by(mobile_number=a).all()
+        contact_id = contact.id
+    http_b.post(f'/delete_contact/{contact_id}')
+    device.disconnect()
+    assert statuses(watcher) == []